@@ -0,0 +1,424 @@
+"""Pluggable room assignment engines (greedy first-fit and exact optimal)."""
+import logging
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.booking_record import BookingRecord
+from app.decision_trace import DecisionTrace
+from app.room_schedule import RoomSchedule
+
+logger = logging.getLogger(__name__)
+
+# Priority for COUPLE appointments
+COUPLE_PRIORITY = ['5', '6', '02D']
+
+# Priority for SINGLE appointments
+SINGLE_PRIORITY = ['1', '3', '4', '2', '0', '6', '5']
+
+Placement = Tuple[str, Optional[str]]
+
+
+def find_available_room(
+    record: BookingRecord,
+    schedule: RoomSchedule,
+    trace: Optional[DecisionTrace] = None
+) -> Placement:
+    """
+    Find the first free room for a booking in priority order.
+
+    Nothing is logged or formatted per room check; pass a trace to record
+    which rooms were tried and what blocked them. A reason string is only
+    built when the booking cannot be placed.
+
+    Returns:
+        Tuple of (room, reason) where reason is None if assigned successfully
+    """
+    start_ts = record.start
+    end_ts = record.end
+
+    if record.is_couple:
+        # COUPLE priority: 5 -> 6 -> 02D
+        # 02D is a HARD RULE: both 0 and 2 must be free for the entire duration
+        candidates = COUPLE_PRIORITY
+    else:
+        # SINGLE priority: 1 -> 3 -> 4 -> 2 -> 0 -> 6 -> 5
+        candidates = SINGLE_PRIORITY
+
+    for room in candidates:
+        blocking = schedule.blocking_interval(room, start_ts, end_ts)
+        if blocking is None:
+            return room, None
+        if trace is not None:
+            trace.rejected(record, room, blocking)
+
+    # Build detailed reason for failure
+    if record.is_couple:
+        reasons = [busy_reason(schedule, room, start_ts, end_ts) for room in ['5', '6', '0', '2']]
+        reasons = [reason for reason in reasons if reason]
+        return 'UNASSIGNED', f"No double room available. {'; '.join(reasons)}"
+    reasons = [busy_reason(schedule, room, start_ts, end_ts) for room in SINGLE_PRIORITY]
+    return 'UNASSIGNED', f"No room available. {'; '.join(reasons)}"
+
+
+def busy_reason(schedule: RoomSchedule, room: str, start: int, end: int) -> Optional[str]:
+    """Describe why room cannot take [start, end), or None if it is free."""
+    blocking = schedule.blocking_interval(room, start, end)
+    if blocking is None:
+        return None
+    busy_from = datetime.fromtimestamp(blocking[0]).strftime('%H:%M')
+    busy_to = datetime.fromtimestamp(blocking[1]).strftime('%H:%M')
+    return f"Room {room} busy {busy_from}-{busy_to}"
+
+
+def placement_cost(records: List[BookingRecord], placements: List[Placement]) -> Tuple[int, int]:
+    """
+    Score placements as (UNASSIGNED count, priority cost).
+
+    The priority cost of a placed booking is the index of its room in the
+    couple or single priority list, so lower is better on both counts.
+    """
+    unassigned = 0
+    cost = 0
+    for record, (room, _) in zip(records, placements):
+        if room == 'UNASSIGNED':
+            unassigned += 1
+        else:
+            priority = COUPLE_PRIORITY if record.is_couple else SINGLE_PRIORITY
+            cost += priority.index(room) if room in priority else len(priority)
+    return unassigned, cost
+
+
+class AssignmentEngine:
+    """
+    Places bookings that have no manager override into rooms.
+
+    Engines receive the auto bookings sorted by start time and a schedule that
+    already holds the manager placements. They return one (room, reason) per
+    booking and leave every placed booking marked busy in the schedule.
+    """
+
+    name = 'base'
+
+    # Whether planning is heavy enough to be worth a worker process per day
+    cpu_bound = False
+
+    def place(
+        self,
+        records: List[BookingRecord],
+        schedule: RoomSchedule,
+        trace: Optional[DecisionTrace] = None
+    ) -> List[Placement]:
+        """Assign rooms to records around the fixed placements in schedule."""
+        raise NotImplementedError
+
+
+class GreedyEngine(AssignmentEngine):
+    """First-fit in start-time order over the couple/single priority lists."""
+
+    name = 'greedy'
+
+    def place(
+        self,
+        records: List[BookingRecord],
+        schedule: RoomSchedule,
+        trace: Optional[DecisionTrace] = None
+    ) -> List[Placement]:
+        placements = []
+        for record in records:
+            room, reason = find_available_room(record, schedule, trace)
+            if room != 'UNASSIGNED':
+                schedule.mark_busy(room, record.start, record.end)
+            if trace is not None:
+                trace.decided(record, self.name, room, reason)
+            placements.append((room, reason))
+        return placements
+
+
+class BudgetExceeded(Exception):
+    """Raised when the optimal engine runs out of its time budget."""
+
+
+class OptimalEngine(AssignmentEngine):
+    """
+    Exact assignment that minimises UNASSIGNED count, then priority cost.
+
+    Bookings are split into clusters of transitively overlapping intervals,
+    which can be solved independently around the fixed manager placements.
+    Each cluster is solved by a branch-and-bound depth-first search in
+    start-time order, seeded with the greedy placement. Because every
+    booking placed earlier in the cluster started no later than the current
+    one, the state is just "before which upcoming booking does each physical
+    room become free", so states that differ only in end times between the
+    same two starts are searched once.
+
+    A cluster that exceeds the time budget (or is too large to search) keeps
+    the best placement found so far, which is never worse than greedy;
+    clusters already solved keep their optimal placements.
+    """
+
+    name = 'optimal'
+    cpu_bound = True
+
+    # Clusters larger than this are not searched (recursion depth and state space)
+    MAX_CLUSTER_SIZE = 400
+
+    def __init__(self, time_budget_ms: int = 200):
+        """Create an optimal engine with a time budget per place() call."""
+        self.time_budget_ms = time_budget_ms
+
+    def place(
+        self,
+        records: List[BookingRecord],
+        schedule: RoomSchedule,
+        trace: Optional[DecisionTrace] = None
+    ) -> List[Placement]:
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        rooms = []
+        unsolved = 0
+        for cluster in self._clusters(records):
+            cluster_rooms, solved = self._solve_cluster(cluster, schedule, deadline)
+            rooms.extend(cluster_rooms)
+            if not solved:
+                unsolved += len(cluster)
+        if unsolved:
+            logger.warning(
+                f"Optimal room assignment exceeded {self.time_budget_ms} ms: {unsolved} of "
+                f"{len(records)} bookings keep the best placement found (at least as good as greedy)"
+            )
+
+        for record, room in zip(records, rooms):
+            if room != 'UNASSIGNED':
+                schedule.mark_busy(room, record.start, record.end)
+
+        # Explain unassigned bookings against the final room state
+        placements = []
+        for record, room in zip(records, rooms):
+            if room == 'UNASSIGNED':
+                room, reason = find_available_room(record, schedule, trace)
+                if room != 'UNASSIGNED':
+                    schedule.mark_busy(room, record.start, record.end)
+                placements.append((room, reason))
+            else:
+                if trace is not None:
+                    self._trace_skipped_rooms(record, room, schedule, trace)
+                placements.append((room, None))
+            if trace is not None:
+                trace.decided(record, self.name, *placements[-1])
+        return placements
+
+    @staticmethod
+    def _trace_skipped_rooms(
+        record: BookingRecord,
+        room: str,
+        schedule: RoomSchedule,
+        trace: DecisionTrace
+    ):
+        """Record what blocks the higher priority rooms record did not get."""
+        priority = COUPLE_PRIORITY if record.is_couple else SINGLE_PRIORITY
+        for candidate in priority[:priority.index(room)]:
+            blocking = schedule.blocking_interval(candidate, record.start, record.end)
+            if blocking is not None:
+                trace.rejected(record, candidate, blocking)
+
+    @staticmethod
+    def _clusters(records: List[BookingRecord]) -> List[List[BookingRecord]]:
+        """Split start-sorted records into groups of transitively overlapping intervals."""
+        clusters = []
+        current = []
+        current_end = None
+        for record in records:
+            if current and record.start >= current_end:
+                clusters.append(current)
+                current = []
+            if not current:
+                current_end = record.end
+            current.append(record)
+            current_end = max(current_end, record.end)
+        if current:
+            clusters.append(current)
+        return clusters
+
+    @staticmethod
+    def _max_packed(records: List[BookingRecord], tracks: int) -> int:
+        """
+        Most of the start-sorted records that fit on tracks interchangeable rooms.
+
+        Exchange argument: keep every booking that finds a free room, and
+        when none is free drop whichever running booking ends last.
+        """
+        running: List[int] = []
+        packed = 0
+        for record in records:
+            running = [end for end in running if end > record.start]
+            if len(running) < tracks:
+                running.append(record.end)
+                packed += 1
+            else:
+                latest = max(running)
+                if latest > record.end:
+                    running.remove(latest)
+                    running.append(record.end)
+        return packed
+
+    def _lower_bounds(
+        self,
+        cluster: List[BookingRecord],
+        deadline: float
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Lower bounds for bookings i onwards on an empty schedule, per index i.
+
+        Returns (unassigned, cost). unassigned packs the bookings onto the 7
+        rooms, and couples onto their 3 rooms next to singles on all 7. cost
+        charges bookings that start together with others of their kind the
+        distinct priority slots they would need; a booking past the end of
+        its list is charged the highest single cost (an UNASSIGNED booking
+        costs more than any room).
+        """
+        size = len(cluster)
+        unassigned = []
+        for i in range(size + 1):
+            if time.perf_counter() > deadline:
+                raise BudgetExceeded()
+            suffix = cluster[i:]
+            packed = min(
+                self._max_packed(suffix, len(RoomSchedule.PHYSICAL_ROOMS)),
+                self._max_packed([record for record in suffix if record.is_couple], len(COUPLE_PRIORITY))
+                + self._max_packed([record for record in suffix if not record.is_couple], len(SINGLE_PRIORITY))
+            )
+            unassigned.append(size - i - packed)
+
+        cost = [0] * (size + 1)
+        for i in range(size - 1, -1, -1):
+            record = cluster[i]
+            later = 0
+            for other in cluster[i + 1:]:
+                if other.start != record.start:
+                    break
+                later += other.is_couple == record.is_couple
+            priority = COUPLE_PRIORITY if record.is_couple else SINGLE_PRIORITY
+            cost[i] = cost[i + 1] + (later if later < len(priority) else len(SINGLE_PRIORITY) - 1)
+        return unassigned, cost
+
+    def _solve_cluster(
+        self,
+        cluster: List[BookingRecord],
+        schedule: RoomSchedule,
+        deadline: float
+    ) -> Tuple[List[str], bool]:
+        """
+        Return the best room per booking of one cluster found within the deadline.
+
+        The flag is True when the search finished, i.e. the rooms are optimal.
+        """
+        rooms = RoomSchedule.PHYSICAL_ROOMS
+        room_index = {room: i for i, room in enumerate(rooms)}
+        size = len(cluster)
+
+        # Index of the first booking that starts at or after each booking's end
+        starts = [record.start for record in cluster]
+        ends = [bisect_left(starts, record.end) for record in cluster]
+
+        # Rooms each booking may use given the fixed placements, in priority order
+        options = []
+        for record in cluster:
+            priority = COUPLE_PRIORITY if record.is_couple else SINGLE_PRIORITY
+            options.append([
+                (
+                    room,
+                    cost,
+                    tuple(room_index[physical] for physical in RoomSchedule.physical_rooms(room))
+                )
+                for cost, room in enumerate(priority)
+                if schedule.is_free(room, record.start, record.end)
+            ])
+
+        # Score a placement as one number: any UNASSIGNED outweighs all priority costs
+        unplaced = len(SINGLE_PRIORITY) * size + 1
+
+        # Greedy first-fit is the first complete placement to beat
+        best_rooms = []
+        state = [0] * len(rooms)
+        best_score = 0
+        for i in range(size):
+            for room, room_cost, physical in options[i]:
+                if all(state[p] <= i for p in physical):
+                    for p in physical:
+                        state[p] = ends[i]
+                    best_rooms.append(room)
+                    best_score += room_cost
+                    break
+            else:
+                best_rooms.append('UNASSIGNED')
+                best_score += unplaced
+        if size > self.MAX_CLUSTER_SIZE or time.perf_counter() > deadline:
+            return best_rooms, False
+
+        # Cheapest score seen on the way into each state; getting there again costs no less
+        seen: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+        chosen: List[str] = [''] * size
+        counter = [0]
+
+        def search(i: int, free_at: Tuple[int, ...], score: int):
+            """Extend chosen from booking i onwards, recording complete placements that beat the best."""
+            nonlocal best_score
+            if i == size:
+                if score < best_score:
+                    best_score = score
+                    best_rooms[:] = chosen
+                return
+
+            counter[0] += 1
+            if counter[0] & 0x3F == 0 and time.perf_counter() > deadline:
+                raise BudgetExceeded()
+
+            if score + bound[i] >= best_score:
+                return
+            # Rooms that became free before this booking are simply free
+            state = tuple(t if t > i else 0 for t in free_at)
+            key = (i, state)
+            if key in seen and seen[key] <= score:
+                return
+            seen[key] = score
+
+            for room, room_cost, physical in options[i]:
+                if any(state[p] for p in physical):
+                    continue
+                next_state = list(state)
+                for p in physical:
+                    next_state[p] = ends[i]
+                chosen[i] = room
+                search(i + 1, tuple(next_state), score + room_cost)
+            chosen[i] = 'UNASSIGNED'
+            search(i + 1, state, score + unplaced)
+
+        try:
+            unassigned_bound, cost_bound = self._lower_bounds(cluster, deadline)
+            # An UNASSIGNED booking already pays its highest room cost in cost_bound
+            bound = [
+                unassigned * (unplaced - len(SINGLE_PRIORITY) + 1) + cost
+                for unassigned, cost in zip(unassigned_bound, cost_bound)
+            ]
+            search(0, tuple(0 for _ in rooms), 0)
+        except BudgetExceeded:
+            return best_rooms, False
+        return best_rooms, True
+
+
+ENGINES = {
+    GreedyEngine.name: GreedyEngine,
+    OptimalEngine.name: OptimalEngine,
+}
+
+
+def get_engine(name: str = 'greedy', time_budget_ms: int = 200) -> AssignmentEngine:
+    """Build an engine by name ('greedy' or 'optimal'); unknown names use greedy."""
+    engine_class = ENGINES.get((name or 'greedy').lower())
+    if engine_class is None:
+        logger.warning(f"Unknown room assignment engine '{name}', using greedy")
+        engine_class = GreedyEngine
+    if engine_class is OptimalEngine:
+        return OptimalEngine(time_budget_ms=time_budget_ms)
+    return engine_class()
@@ -0,0 +1,59 @@
+"""Compact pre-parsed booking record used by the room assigner."""
+import sys
+from datetime import datetime
+from typing import Dict
+
+
+def parse_timestamp(value: str) -> int:
+    """Parse an ISO 8601 datetime string (with or without 'Z') to epoch seconds."""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+class BookingRecord:
+    """
+    A booking as the assigner sees it.
+
+    Times are parsed once into epoch seconds when the record is built, so the
+    assignment pipeline never touches the ISO strings again. The original
+    booking dict is kept in ``data`` so results can be written back to it.
+    """
+
+    __slots__ = ('booking_id', 'start', 'end', 'is_couple', 'therapist', 'data')
+
+    def __init__(
+        self,
+        booking_id: str,
+        start: int,
+        end: int,
+        is_couple: bool,
+        therapist: str,
+        data: Dict
+    ):
+        self.booking_id = booking_id
+        self.start = start
+        self.end = end
+        self.is_couple = is_couple
+        self.therapist = therapist
+        self.data = data
+
+    @classmethod
+    def from_dict(cls, booking: Dict) -> 'BookingRecord':
+        """Build a record from a booking dict with start_at, end_at, type, etc."""
+        return cls(
+            booking['booking_id'],
+            parse_timestamp(booking['start_at']),
+            parse_timestamp(booking['end_at']),
+            booking.get('type', 'single') == 'couple',
+            sys.intern(booking.get('therapist') or ''),
+            booking
+        )
+
+    @property
+    def type(self) -> str:
+        """Booking type label ('couple' or 'single')."""
+        return 'couple' if self.is_couple else 'single'
+
+    def __repr__(self) -> str:
+        return f"BookingRecord({self.booking_id!r}, {self.start}-{self.end}, {self.type})"
@@ -0,0 +1,142 @@
+"""Short-lived per-date snapshots of converted Square bookings (stale-while-revalidate)."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BookingSnapshots:
+    """
+    Converted bookings per date, shared by every request for that date.
+
+    A snapshot younger than ``fresh_seconds`` is served as is. An older one,
+    up to ``max_stale_seconds``, is still served immediately while a single
+    background refresh replaces it. Without a usable snapshot the caller
+    waits, but concurrent callers for the same date share one fetch. So the
+    number of Square fetches per date stays about one per freshness window,
+    however many dashboards are open.
+
+    ``invalidate`` drops a date after a local write; a refresh that was
+    already running when the date was invalidated does not store its result.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[List[Dict]]],
+        fresh_seconds: float = 15,
+        max_stale_seconds: float = 300,
+        max_dates: int = 62
+    ):
+        """
+        Create a snapshot cache.
+
+        Args:
+            fetch: Coroutine function returning the converted bookings for a
+                date; it should raise on failure rather than return []
+            fresh_seconds: Age up to which a snapshot is served without refresh
+            max_stale_seconds: Age up to which a stale snapshot is served while refreshing
+            max_dates: Number of dates kept (least recently used are dropped)
+        """
+        self._fetch = fetch
+        self.fresh_seconds = fresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.max_dates = max_dates
+        self._snapshots: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    async def get(self, date: str) -> List[Dict]:
+        """
+        Return the bookings for date, fetching or refreshing as needed.
+
+        Raises:
+            Exception: Whatever the fetch raised, when there is no snapshot
+                to fall back on (a failed fetch is never served as [])
+        """
+        snapshot = self._snapshots.get(date)
+        if snapshot is not None:
+            fetched_at, bookings = snapshot
+            age = time.monotonic() - fetched_at
+            if age < self.fresh_seconds:
+                self.fresh_hits += 1
+                self._snapshots.move_to_end(date)
+                return bookings
+            if age < self.max_stale_seconds:
+                self.stale_hits += 1
+                self._snapshots.move_to_end(date)
+                self._refresh(date)
+                return bookings
+
+        self.misses += 1
+        try:
+            return await asyncio.shield(self._refresh(date))
+        except Exception as e:
+            if snapshot is not None:
+                logger.warning(f"Refreshing bookings for {date} failed ({e}), serving a snapshot from {age:.0f}s ago")
+                return snapshot[1]
+            logger.error(f"Error fetching bookings for {date}: {e}")
+            raise
+
+    def store(self, date: str, bookings: List[Dict]):
+        """Store bookings fetched elsewhere (e.g. by a range request) as the snapshot for date."""
+        self._snapshots[date] = (time.monotonic(), bookings)
+        self._snapshots.move_to_end(date)
+        while len(self._snapshots) > self.max_dates:
+            self._snapshots.popitem(last=False)
+
+    def invalidate(self, date: Optional[str] = None):
+        """Drop the snapshot for date (all dates if None) so the next get fetches again."""
+        dates = set(self._snapshots) | set(self._inflight) if date is None else {date}
+        for stale_date in dates:
+            self._snapshots.pop(stale_date, None)
+            # A fetch started before the write may miss it: let the next get start a new one
+            self._inflight.pop(stale_date, None)
+            self._generations[stale_date] = self._generations.get(stale_date, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return snapshot counters as a JSON-friendly dict."""
+        return {
+            'dates': len(self._snapshots),
+            'fresh_seconds': self.fresh_seconds,
+            'max_stale_seconds': self.max_stale_seconds,
+            'fresh_hits': self.fresh_hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'fetches': self.fetches,
+            'fetch_errors': self.fetch_errors,
+            'refreshing': len(self._inflight)
+        }
+
+    def _refresh(self, date: str) -> asyncio.Task:
+        """Return the running fetch for date, starting one if there is none."""
+        task = self._inflight.get(date)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(date))
+            self._inflight[date] = task
+            task.add_done_callback(lambda done: self._finished(date, done))
+        return task
+
+    async def _fetch_and_store(self, date: str) -> List[Dict]:
+        """Fetch date and store it, unless the date was invalidated meanwhile."""
+        generation = self._generations.get(date, 0)
+        self.fetches += 1
+        bookings = await self._fetch(date)
+        if self._generations.get(date, 0) == generation:
+            self.store(date, bookings)
+        return bookings
+
+    def _finished(self, date: str, task: asyncio.Task):
+        """Forget the finished fetch; log failures nobody is waiting for."""
+        if self._inflight.get(date) is task:
+            del self._inflight[date]
+        if not task.cancelled() and task.exception() is not None:
+            self.fetch_errors += 1
+            logger.warning(f"Background refresh of bookings for {date} failed: {task.exception()}")
@@ -0,0 +1,241 @@
+"""Prefetched index of the catalog's service variations, refreshed incrementally."""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from square_models import CatalogObject
+
+logger = logging.getLogger(__name__)
+
+# Returns (catalog ITEM objects, latest_time); given a begin_time, only the
+# items changed since then (e.g. SquareBookingsClient.search_catalog_items)
+CatalogLoader = Callable[[Optional[str]], Tuple[List[CatalogObject], Optional[str]]]
+
+
+class CatalogVariation(NamedTuple):
+    """One bookable service variation and the item it belongs to."""
+
+    variation_id: str
+    item_id: str
+    item_name: str
+    variation_name: str
+    is_couple: bool
+
+    @property
+    def name(self) -> str:
+        """Service name shown for bookings: the variation name, else the item name."""
+        return self.variation_name or self.item_name
+
+
+class CatalogIndex:
+    """
+    All service variations sold at a location, indexed by variation id.
+
+    The index is built from one paginated catalog search the first time it is
+    used (or at startup), so converting a day of bookings never looks up
+    catalog objects one by one. Once the index is older than ``ttl_seconds``,
+    or an unknown variation id is looked up, a background refresh fetches only
+    the items changed since the last search and patches them in; readers keep
+    using the current index until the patched copy is swapped in.
+
+    ``snapshot``/``restore`` let the index be saved across restarts, keeping
+    the last catalog search time so the first refresh is still incremental;
+    if ``listener`` is set it is called after every successful load.
+    """
+
+    def __init__(
+        self,
+        loader: CatalogLoader,
+        location_id: str = '',
+        couple_pattern: str = '',
+        couple_variation_id: str = '',
+        ttl_seconds: float = 900,
+        min_refresh_interval: float = 60
+    ):
+        """
+        Create an index.
+
+        Args:
+            loader: Fetches catalog items, optionally only those changed since a time
+            location_id: Only index items and variations present at this location
+                (empty indexes everything)
+            couple_pattern: Case-insensitive text in the item or variation name
+                that marks a couple service
+            couple_variation_id: Variation id that is always a couple service
+            ttl_seconds: Age after which the index is refreshed in the background
+            min_refresh_interval: Minimum seconds between refreshes triggered by
+                unknown variation ids
+        """
+        self._loader = loader
+        self.location_id = location_id
+        self.couple_pattern = (couple_pattern or '').lower()
+        self.couple_variation_id = couple_variation_id
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self._variations: Dict[str, CatalogVariation] = {}
+        self._variation_ids_by_item: Dict[str, List[str]] = {}
+        self._latest_time: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._load_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.listener: Optional[Callable[[], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._variations)
+
+    def get(self, variation_id: str) -> Optional[CatalogVariation]:
+        """Return the variation with this id, or None if it is not in the index."""
+        self.ensure_loaded()
+        variation = self._variations.get(variation_id)
+        if variation is None and variation_id:
+            # Possibly a service added since the last refresh
+            if time.monotonic() - (self._loaded_at or 0) >= self.min_refresh_interval:
+                self.refresh_in_background()
+        return variation
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Update the index now.
+
+        Args:
+            full: Rebuild from the whole catalog instead of only recent changes
+
+        Returns:
+            Number of variations in the index after the refresh
+        """
+        with self._load_lock:
+            self._load(full)
+        return len(self._variations)
+
+    def refresh_in_background(self):
+        """Start a refresh in a daemon thread unless one is already running."""
+        with self._thread_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self.refresh, name='catalog-index-refresh', daemon=True
+            )
+            self._refresh_thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the index as JSON-friendly data for restore()."""
+        return {
+            'latest_time': self._latest_time,
+            'variations': [
+                [v.variation_id, v.item_id, v.item_name, v.variation_name]
+                for v in self._variations.values()
+            ]
+        }
+
+    def restore(self, data: Dict[str, Any], age_seconds: float = 0) -> bool:
+        """
+        Use a saved snapshot instead of a full catalog search, unless already loaded.
+
+        Couple classification is recomputed with the current settings.
+
+        Args:
+            data: Output of snapshot()
+            age_seconds: How long ago the snapshot was taken; it counts
+                towards ttl_seconds, so an old snapshot is refreshed soon
+
+        Returns:
+            True if the snapshot was used
+        """
+        rows = data.get('variations') or []
+        with self._load_lock:
+            if self._loaded_at is not None or not rows:
+                return False
+            variations = {}
+            variation_ids_by_item: Dict[str, List[str]] = {}
+            for variation_id, item_id, item_name, variation_name in rows:
+                variations[variation_id] = CatalogVariation(
+                    variation_id=variation_id,
+                    item_id=item_id,
+                    item_name=item_name,
+                    variation_name=variation_name,
+                    is_couple=self._is_couple(variation_id, item_name, variation_name)
+                )
+                variation_ids_by_item.setdefault(item_id, []).append(variation_id)
+            self._variations = variations
+            self._variation_ids_by_item = variation_ids_by_item
+            self._latest_time = data.get('latest_time')
+            self._loaded_at = time.monotonic() - max(age_seconds, 0)
+        logger.info(f"Catalog index restored {len(variations)} variations from snapshot")
+        return True
+
+    def ensure_loaded(self):
+        """Load synchronously on first use, refresh in the background when stale."""
+        if self._loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self._load(full=True)
+        elif time.monotonic() - self._loaded_at >= self.ttl_seconds:
+            self.refresh_in_background()
+
+    def _load(self, full: bool):
+        """Fetch (changed) items and swap in the updated index (caller holds _load_lock)."""
+        begin_time = None if full else self._latest_time
+        try:
+            items, latest_time = self._loader(begin_time)
+        except Exception as e:
+            # Keep serving the previous index; the next refresh tries again
+            logger.error(f"Error loading catalog index: {e}")
+            self._loaded_at = time.monotonic()
+            return
+
+        if begin_time is None:
+            variations = {}
+            variation_ids_by_item = {}
+        else:
+            variations = dict(self._variations)
+            variation_ids_by_item = dict(self._variation_ids_by_item)
+
+        for item in items or []:
+            if not item.id:
+                continue
+            for variation_id in variation_ids_by_item.pop(item.id, []):
+                variations.pop(variation_id, None)
+            if item.is_deleted or not self._at_location(item):
+                continue
+
+            variation_ids = []
+            for variation in item.variations:
+                if not variation.id or variation.is_deleted or not self._at_location(variation):
+                    continue
+                variations[variation.id] = CatalogVariation(
+                    variation_id=variation.id,
+                    item_id=item.id,
+                    item_name=item.name,
+                    variation_name=variation.name,
+                    is_couple=self._is_couple(variation.id, item.name, variation.name)
+                )
+                variation_ids.append(variation.id)
+            if variation_ids:
+                variation_ids_by_item[item.id] = variation_ids
+
+        self._variations = variations
+        self._variation_ids_by_item = variation_ids_by_item
+        self._latest_time = latest_time or self._latest_time
+        self._loaded_at = time.monotonic()
+        mode = 'full' if begin_time is None else 'incremental'
+        logger.info(f"Catalog index {mode} load: {len(items or [])} items, {len(variations)} variations")
+        if self.listener is not None:
+            self.listener()
+
+    def _at_location(self, obj: CatalogObject) -> bool:
+        """Whether a catalog object is sold at the configured location."""
+        if not self.location_id:
+            return True
+        if obj.present_at_all_locations:
+            return self.location_id not in obj.absent_at_location_ids
+        return self.location_id in obj.present_at_location_ids
+
+    def _is_couple(self, variation_id: str, item_name: str, variation_name: str) -> bool:
+        """Classify a variation as a couple service by id or name pattern."""
+        if self.couple_variation_id and variation_id == self.couple_variation_id:
+            return True
+        if not self.couple_pattern:
+            return False
+        return self.couple_pattern in item_name.lower() or self.couple_pattern in variation_name.lower()
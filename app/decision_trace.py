@@ -0,0 +1,77 @@
+"""Optional per-booking record of how the room assigner placed each booking."""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.booking_record import BookingRecord
+
+
+class DecisionTrace:
+    """
+    Collects, per booking, the rooms that were tried and what blocked them.
+
+    Only raw values (room labels and epoch-second intervals) are stored while
+    assigning; nothing is formatted until ``to_list`` is called, so tracing
+    adds no string work to the assignment itself. Code that assigns rooms
+    takes an optional trace and skips all of this when it is None.
+    """
+
+    __slots__ = ('_entries',)
+
+    def __init__(self):
+        """Create an empty trace."""
+        self._entries: Dict[str, List] = {}
+
+    def _entry(self, record: BookingRecord) -> List:
+        """Return the raw entry for record: [record, source, tried, room, reason]."""
+        entry = self._entries.get(record.booking_id)
+        if entry is None:
+            entry = [record, None, [], None, None]
+            self._entries[record.booking_id] = entry
+        return entry
+
+    def rejected(self, record: BookingRecord, room: str, blocking: Optional[Tuple[int, int]]):
+        """Note that room was tried for record and is busy during blocking."""
+        self._entry(record)[2].append((room, blocking))
+
+    def decided(self, record: BookingRecord, source: str, room: str, reason: Optional[str] = None):
+        """
+        Note the final room for record.
+
+        Args:
+            record: Booking that was placed
+            source: What decided the room ('manager', 'greedy', 'optimal' or 'conflict')
+            room: Room the booking ended up in (or UNASSIGNED)
+            reason: Reason stored with the booking, if any
+        """
+        entry = self._entry(record)
+        entry[1] = source
+        entry[3] = room
+        entry[4] = reason
+
+    def to_list(self) -> List[Dict]:
+        """Format the trace as JSON-friendly dicts, ordered by booking start time."""
+        entries = sorted(self._entries.values(), key=lambda entry: entry[0].start)
+        return [
+            {
+                'booking_id': record.booking_id,
+                'type': record.type,
+                'start_at': record.data.get('start_at'),
+                'end_at': record.data.get('end_at'),
+                'decided_by': source,
+                'rejected': [
+                    {'room': room, 'busy': self._format_interval(blocking)}
+                    for room, blocking in tried
+                ],
+                'room': room,
+                'reason': reason
+            }
+            for record, source, tried, room, reason in entries
+        ]
+
+    @staticmethod
+    def _format_interval(interval: Optional[Tuple[int, int]]) -> Optional[str]:
+        """Format an epoch-second interval as HH:MM-HH:MM."""
+        if interval is None:
+            return None
+        start, end = interval
+        return f"{datetime.fromtimestamp(start).strftime('%H:%M')}-{datetime.fromtimestamp(end).strftime('%H:%M')}"
@@ -0,0 +1,187 @@
+"""Write-behind persistence of lookup caches, so a restart starts warm."""
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models import LookupCacheEntry
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Key under which snapshots (team directory, catalog index) are stored
+SNAPSHOT_KEY = ''
+
+
+class LookupStore:
+    """
+    Keeps lookup caches in the ``lookup_cache`` table across restarts.
+
+    ``attach`` fills a TTLCache from the table (skipping expired rows, with
+    the remaining TTL of each entry) and then records every new entry.
+    ``attach_snapshot`` does the same for objects with ``snapshot()`` /
+    ``restore()`` such as the team directory and catalog index, whose age
+    is restored so their refresh schedule still applies.
+
+    Changes are written behind: they collect in memory and a daemon thread
+    writes them in one transaction every ``flush_interval`` seconds, or
+    sooner once ``batch_size`` entries are pending. Lookups never wait on
+    the database.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        flush_interval: float = 5.0,
+        batch_size: int = 500
+    ):
+        """
+        Create a store.
+
+        Args:
+            session_factory: Returns a new database session (e.g. SessionLocal)
+            flush_interval: Maximum seconds a change waits before it is written
+            batch_size: Pending entries that trigger an early write
+        """
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[Tuple[str, str], Tuple[str, float, Optional[float]]] = {}
+        self._dirty_snapshots: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, cache: TTLCache) -> int:
+        """
+        Load cache's saved entries and persist its future ones.
+
+        Returns:
+            Number of entries restored
+        """
+        now = time.time()
+        restored = 0
+        with self._session_factory() as db:
+            rows = db.query(LookupCacheEntry).filter(
+                LookupCacheEntry.cache == cache.name,
+                LookupCacheEntry.key != SNAPSHOT_KEY
+            ).order_by(LookupCacheEntry.stored_at).all()
+            for row in rows:
+                if row.expires_at is not None and row.expires_at <= now:
+                    continue
+                ttl_seconds = row.expires_at - now if row.expires_at is not None else None
+                cache.set(row.key, json.loads(row.value), ttl_seconds=ttl_seconds)
+                restored += 1
+        cache.listener = self._cache_changed
+        logger.info(f"Lookup store restored {restored} entries into {cache.name}")
+        return restored
+
+    def attach_snapshot(self, name: str, obj: Any) -> bool:
+        """
+        Restore obj from its saved snapshot and persist it after every load.
+
+        Args:
+            name: Row name for the snapshot
+            obj: Object with snapshot(), restore(data, age_seconds) and a listener attribute
+
+        Returns:
+            True if a saved snapshot was restored
+        """
+        restored = False
+        with self._session_factory() as db:
+            row = db.get(LookupCacheEntry, (name, SNAPSHOT_KEY))
+            if row is not None:
+                restored = obj.restore(json.loads(row.value), age_seconds=time.time() - row.stored_at)
+        obj.listener = lambda: self._snapshot_changed(name, obj)
+        return restored
+
+    def flush(self) -> int:
+        """
+        Write all pending changes now.
+
+        Returns:
+            Number of rows written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                snapshots, self._dirty_snapshots = self._dirty_snapshots, {}
+
+            now = time.time()
+            rows = [
+                {'cache': cache, 'key': key, 'value': value, 'stored_at': stored_at, 'expires_at': expires_at}
+                for (cache, key), (value, stored_at, expires_at) in pending.items()
+            ]
+            for name, obj in snapshots.items():
+                rows.append({
+                    'cache': name,
+                    'key': SNAPSHOT_KEY,
+                    'value': json.dumps(obj.snapshot()),
+                    'stored_at': now,
+                    'expires_at': None
+                })
+            if not rows:
+                return 0
+
+            try:
+                with self._session_factory() as db:
+                    stmt = sqlite_insert(LookupCacheEntry)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[LookupCacheEntry.cache, LookupCacheEntry.key],
+                        set_={
+                            'value': stmt.excluded.value,
+                            'stored_at': stmt.excluded.stored_at,
+                            'expires_at': stmt.excluded.expires_at
+                        }
+                    )
+                    db.execute(stmt, rows)
+                    db.execute(delete(LookupCacheEntry).where(LookupCacheEntry.expires_at <= now))
+                    db.commit()
+            except Exception as e:
+                logger.error(f"Error writing lookup cache: {e}")
+                with self._lock:
+                    # Put the changes back unless newer ones arrived meanwhile
+                    for entry_key, entry in pending.items():
+                        self._pending.setdefault(entry_key, entry)
+                    for name, obj in snapshots.items():
+                        self._dirty_snapshots.setdefault(name, obj)
+                return 0
+            return len(rows)
+
+    def _cache_changed(self, cache: TTLCache, key: Hashable, value: Any, ttl_seconds: Optional[float]):
+        """TTLCache listener: queue the entry for the next write."""
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._pending[(cache.name, str(key))] = (json.dumps(value), now, expires_at)
+            pending = len(self._pending)
+        self._schedule(pending)
+
+    def _snapshot_changed(self, name: str, obj: Any):
+        """Snapshot listener: write the object's new snapshot on the next write."""
+        with self._lock:
+            self._dirty_snapshots[name] = obj
+        self._schedule(0)
+
+    def _schedule(self, pending: int):
+        """Start the writer thread if needed; wake it early for a full batch."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='lookup-store-writer', daemon=True)
+                    self._thread.start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        """Writer thread: flush every flush_interval, or when woken for a full batch."""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
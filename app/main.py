@@ -5,14 +5,22 @@ from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
+import asyncio
+import atexit
+import functools
 import os
 
-from app.database import init_db, get_db
-from app.schemas import DayResponse, Event, UpdateRoomRequest
+from app.database import init_db, get_db, SessionLocal
+from app.schemas import DayResponse, Event, RangeResponse, UpdateRoomRequest
 from app.models import RoomAssignment
 from app.room_assigner import RoomAssigner
+from app.assignment_engines import get_engine
 from app.square_service import SquareService
+from app.lookup_store import LookupStore
+from app.booking_snapshots import BookingSnapshots
 from app.mock_square import MockSquareService
+from request_scheduler import SquareRequestError
+from ttl_cache import cache_stats
 import logging
 
 # Allowed therapists list (case-insensitive matching)
@@ -90,6 +98,37 @@ def filter_allowed_therapists(therapists: List[str]) -> List[str]:
             allowed_set.add(allowed)
     return sorted(list(allowed_set))
 
+def booking_to_event(booking: dict) -> Event:
+    """Convert an assigned booking dict to the Event schema."""
+    return Event(
+        booking_id=booking['booking_id'],
+        therapist=booking['therapist'],
+        start_at=booking['start_at'],
+        end_at=booking['end_at'],
+        customer=booking['customer'],
+        service=booking['service'],
+        type=booking['type'],
+        room=booking['room'],
+        reason=booking.get('reason')
+    )
+
+
+def to_assignment_bookings(bookings: List[dict]) -> List[dict]:
+    """Convert Square/mock bookings to the dicts the room assigner expects."""
+    return [
+        {
+            'booking_id': booking['id'],
+            'therapist': booking['therapist'],
+            'start_at': booking['start_at'],
+            'end_at': booking['end_at'],
+            'customer': booking['customer'],
+            'service': booking['service'],
+            'type': booking['type'],
+            'version': booking.get('version')
+        }
+        for booking in bookings
+    ]
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -106,11 +145,21 @@ init_db()
 square_service = SquareService()
 mock_square = MockSquareService()  # Keep as fallback
 
+# Resolved names, team and catalog survive restarts in the lookup_cache table
+lookup_store = LookupStore(SessionLocal)
+# Write lookups still waiting for the write-behind thread when the server stops
+atexit.register(lookup_store.flush)
+
 # Log initialization status
 if square_service.client:
     logger.info("=" * 60)
     logger.info("Square API: CONNECTED (Using Real API)")
     logger.info("=" * 60)
+    # Start from the lookups saved by the last run, then refresh them in the background
+    square_service.warm_start(lookup_store)
+    # Load the team directory and catalog index now so the first request doesn't wait for them
+    square_service.team_directory.refresh_in_background()
+    square_service.catalog_index.refresh_in_background()
 else:
     logger.warning("=" * 60)
     logger.warning("Square API: NOT CONFIGURED (Using Mock Data)")
@@ -118,6 +167,41 @@ else:
     logger.warning("=" * 60)
 
 
+async def fetch_square_bookings(date: str) -> List[dict]:
+    """Fetch one day's converted bookings from Square (raises on Square errors)."""
+    return await get_square_service().get_bookings_for_date_async(date, raise_errors=True)
+
+
+def get_booking_snapshots() -> BookingSnapshots:
+    """Build the per-date booking snapshot cache (BOOKING_SNAPSHOT_* settings)."""
+    try:
+        from config import Config
+        return BookingSnapshots(
+            fetch_square_bookings,
+            fresh_seconds=Config.BOOKING_SNAPSHOT_FRESH_SECONDS,
+            max_stale_seconds=Config.BOOKING_SNAPSHOT_MAX_STALE_SECONDS
+        )
+    except ImportError:
+        return BookingSnapshots(fetch_square_bookings)
+
+
+# Dashboards open on the same date share one Square fetch per freshness window
+booking_snapshots = get_booking_snapshots()
+
+
+def get_assignment_engine():
+    """Build the configured room assignment engine (ROOM_ASSIGNMENT_ENGINE)."""
+    try:
+        from config import Config
+        return get_engine(Config.ROOM_ASSIGNMENT_ENGINE, Config.ROOM_ASSIGNMENT_TIME_BUDGET_MS)
+    except ImportError:
+        return get_engine('greedy')
+
+
+assignment_engine = get_assignment_engine()
+logger.info(f"Room assignment engine: {assignment_engine.name}")
+
+
 def get_square_service():
     """Get Square service, re-initializing if needed."""
     # Re-check configuration if client is None
@@ -140,7 +224,9 @@ def get_square_service():
             if new_service.client:
                 # Update the global service
                 square_service.client = new_service.client
-                square_service._team_members_cache = new_service._team_members_cache
+                square_service.team_directory = new_service.team_directory
+                square_service.catalog_index = new_service.catalog_index
+                square_service.warm_start(lookup_store)
                 logger.info("Square API: Successfully re-initialized!")
                 logger.info("=" * 60)
                 logger.info("Square API: CONNECTED (Using Real API)")
@@ -153,6 +239,19 @@ def get_square_service():
     return square_service
 
 
+def square_unavailable(error: SquareRequestError) -> HTTPException:
+    """503 for a Square fetch that failed, so it is not shown as a day without bookings."""
+    logger.error(f"Square bookings unavailable: {error}")
+    return HTTPException(status_code=503, detail=f"Square bookings unavailable: {error}")
+
+
+async def get_team_member_names(current_service) -> set:
+    """Get the names of all Square team members (empty when Square is not configured)."""
+    if not current_service.client:
+        return set()
+    return set(await current_service.run_io(current_service.team_directory.names))
+
+
 @app.get("/api/status")
 async def get_status():
     """Get API status - whether using real Square API or mock data."""
@@ -178,9 +277,30 @@ async def get_status():
     }
 
 
+@app.post("/api/team/refresh")
+async def refresh_team_directory():
+    """Reload the team member directory from Square now."""
+    current_service = get_square_service()
+    if not current_service.client:
+        raise HTTPException(status_code=503, detail="Square API not configured")
+    count = await current_service.run_io(current_service.team_directory.refresh)
+    return {"success": True, "team_members": count}
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Size, hit/miss and eviction counters of the in-process lookup caches."""
+    return {
+        "caches": cache_stats(),
+        "booking_snapshots": booking_snapshots.stats(),
+        "square_requests": square_service.request_stats()
+    }
+
+
 @app.get("/api/day")
 async def get_day(
     date: str = Query(..., description="Date in YYYY-MM-DD format"),
+    trace: bool = Query(False, description="Include a per-booking decision trace"),
     db: Session = Depends(get_db)
 ) -> DayResponse:
     """
@@ -203,15 +323,23 @@ async def get_day(
     current_service = get_square_service()
     
     # Fetch bookings from Square API (or use mock if not configured)
+    # Team members are fetched at the same time; neither blocks the event loop
     if current_service.client:
         logger.info(f"[REAL API] Fetching Square bookings for {date}")
-        bookings = current_service.get_bookings_for_date(date)
+        try:
+            bookings, team_member_names = await asyncio.gather(
+                booking_snapshots.get(date),
+                get_team_member_names(current_service)
+            )
+        except SquareRequestError as e:
+            raise square_unavailable(e)
         logger.info(f"[REAL API] Found {len(bookings)} bookings from Square")
         if len(bookings) == 0:
             logger.info(f"[REAL API] No bookings found for {date} - this is normal if there are no appointments")
     else:
         logger.warning(f"[MOCK DATA] Square API not configured, using mock data for {date}")
         bookings = mock_square.get_bookings_for_date(date)
+        team_member_names = set()
         logger.info(f"[MOCK DATA] Generated {len(bookings)} mock bookings")
     
     # Get all therapists - show ALL team members, not just those with bookings
@@ -219,30 +347,7 @@ async def get_day(
     therapists_from_bookings = set(b['therapist'] for b in bookings)
     
     # Also get all team members from Square
-    all_therapists = set(therapists_from_bookings)
-    if current_service.client:
-        try:
-            team_members = current_service.client.get_team_members()
-            for member in team_members:
-                # Get team member name
-                if isinstance(member, dict):
-                    member_id = member.get('id', '')
-                    given = member.get('given_name', '')
-                    family = member.get('family_name', '')
-                    display = member.get('display_name', '')
-                else:
-                    member_id = getattr(member, 'id', '') or ''
-                    given = getattr(member, 'given_name', '') or ''
-                    family = getattr(member, 'family_name', '') or ''
-                    display = getattr(member, 'display_name', '') or ''
-                
-                name = f"{given} {family}".strip() or display or member_id
-                if name:
-                    all_therapists.add(name)
-        except Exception as e:
-            logger.warning(f"Could not fetch all team members: {e}")
-            # Fallback to just therapists from bookings
-            pass
+    all_therapists = therapists_from_bookings | team_member_names
     
     # Filter to only allowed therapists
     therapists = filter_allowed_therapists(list(all_therapists))
@@ -251,52 +356,163 @@ async def get_day(
     bookings = [b for b in bookings if is_allowed_therapist(b.get('therapist', ''))]
     
     # Convert bookings to event format for room assignment
-    bookings_for_assignment = []
-    for booking in bookings:
-        bookings_for_assignment.append({
-            'booking_id': booking['id'],
-            'therapist': booking['therapist'],
-            'start_at': booking['start_at'],
-            'end_at': booking['end_at'],
-            'customer': booking['customer'],
-            'service': booking['service'],
-            'type': booking['type']
-        })
+    bookings_for_assignment = to_assignment_bookings(bookings)
     
     # Assign rooms
-    assigner = RoomAssigner(db)
-    assigned_bookings = assigner.assign_rooms(bookings_for_assignment, date)
+    assigner = RoomAssigner(db, engine=assignment_engine)
+    assigned_bookings = assigner.assign_rooms(bookings_for_assignment, date, trace=trace)
     
     # Convert to Event schema
-    events = []
-    for booking in assigned_bookings:
-        event = Event(
-            booking_id=booking['booking_id'],
-            therapist=booking['therapist'],
-            start_at=booking['start_at'],
-            end_at=booking['end_at'],
-            customer=booking['customer'],
-            service=booking['service'],
-            type=booking['type'],
-            room=booking['room'],
-            reason=booking.get('reason')
-        )
-        events.append(event)
+    events = [booking_to_event(booking) for booking in assigned_bookings]
     
     return DayResponse(
         date=date,
         therapists=therapists,
-        events=events
+        events=events,
+        trace=assigner.traces.get(date) if trace else None
     )
 
 
+# Longest range served per request (the client splits it into Square's 31-day windows)
+MAX_RANGE_DAYS = 31
+
+
+@app.get("/api/range")
+async def get_range(
+    start: str = Query(..., description="First date in YYYY-MM-DD format"),
+    end: str = Query(..., description="Last date in YYYY-MM-DD format (inclusive)"),
+    trace: bool = Query(False, description="Include a per-booking decision trace"),
+    db: Session = Depends(get_db)
+) -> RangeResponse:
+    """
+    Get bookings with room assignments for every day from start to end.
+    
+    Bookings for the whole range are fetched in one call, every day is
+    assigned with the same rules as /api/day and all assignments are saved
+    in one transaction.
+    """
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d')
+        end_date = datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    
+    num_days = (end_date - start_date).days + 1
+    if num_days < 1:
+        raise HTTPException(status_code=400, detail="End date must not be before start date")
+    if num_days > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range too long. Maximum is {MAX_RANGE_DAYS} days")
+    
+    current_service = get_square_service()
+    
+    if current_service.client:
+        logger.info(f"[REAL API] Fetching Square bookings for {start} to {end}")
+        try:
+            bookings_by_date, team_member_names = await asyncio.gather(
+                current_service.get_bookings_for_range_async(start, end, raise_errors=True),
+                get_team_member_names(current_service)
+            )
+        except SquareRequestError as e:
+            raise square_unavailable(e)
+        # The range fetch succeeded and is as fresh as a single-day one; share it with /api/day
+        for date, bookings in bookings_by_date.items():
+            booking_snapshots.store(date, bookings)
+    else:
+        logger.warning(f"[MOCK DATA] Square API not configured, using mock data for {start} to {end}")
+        bookings_by_date = mock_square.get_bookings_for_range(start, end)
+        team_member_names = set()
+    
+    therapists_by_date = {}
+    bookings_for_assignment = {}
+    for date, bookings in bookings_by_date.items():
+        therapists_from_bookings = set(b['therapist'] for b in bookings)
+        therapists_by_date[date] = filter_allowed_therapists(list(therapists_from_bookings | team_member_names))
+        bookings = [b for b in bookings if is_allowed_therapist(b.get('therapist', ''))]
+        bookings_for_assignment[date] = to_assignment_bookings(bookings)
+    
+    # Assign rooms for all days (one load, one commit); planning a month with
+    # the optimal engine takes a while, so keep it off the event loop
+    assigner = RoomAssigner(db, engine=assignment_engine)
+    assigned_by_date = await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(assigner.assign_range, bookings_for_assignment, trace=trace)
+    )
+    
+    return RangeResponse(
+        start=start,
+        end=end,
+        days=[
+            DayResponse(
+                date=date,
+                therapists=therapists_by_date[date],
+                events=[booking_to_event(booking) for booking in assigned_bookings],
+                trace=assigner.traces.get(date) if trace else None
+            )
+            for date, assigned_bookings in assigned_by_date.items()
+        ]
+    )
+
+
+async def recalculate_day(db: Session, date: str) -> List[dict]:
+    """
+    Wipe the date's auto assignments and recompute the whole day from Square.
+    
+    Used when there is no current assignment state to repair incrementally.
+    
+    Raises:
+        HTTPException: 503 when Square bookings cannot be fetched (the
+            existing assignments are then left untouched)
+    """
+    # Fetch first, so a Square failure doesn't leave the day without assignments
+    current_service = get_square_service()
+    if current_service.client:
+        try:
+            bookings = await booking_snapshots.get(date)
+        except SquareRequestError as e:
+            raise square_unavailable(e)
+    else:
+        bookings = mock_square.get_bookings_for_date(date)
+    
+    # IMPORTANT: Clear all auto-assignments for this date before recalculating
+    # This prevents conflicts when manually changing rooms
+    # Only keep manager (manual) assignments
+    auto_assignments = db.query(RoomAssignment).filter(
+        RoomAssignment.date == date,
+        RoomAssignment.assigned_by == 'auto'
+    ).all()
+    
+    for auto_assignment in auto_assignments:
+        db.delete(auto_assignment)
+    
+    db.commit()
+    # The cached result for the date relies on the rows just deleted
+    RoomAssigner.clear_cache(date)
+    logger.info(f"Cleared {len(auto_assignments)} auto-assignments for {date} before recalculating")
+    
+    # Recalculate all assignments for this date
+    # This will respect all manager assignments (including the one we just updated)
+    # Manager assignments have priority - conflicts will be resolved by making other bookings unassigned
+    # Filter to only allowed therapists
+    bookings = [b for b in bookings if is_allowed_therapist(b.get('therapist', ''))]
+    
+    # Convert to assignment format
+    bookings_for_assignment = to_assignment_bookings(bookings)
+    
+    # Reassign all rooms (this will preserve all manager assignments including the one we just updated)
+    assigner = RoomAssigner(db, engine=assignment_engine)
+    return assigner.assign_rooms(bookings_for_assignment, date)
+
+
 @app.put("/api/room")
 async def update_room(
     request: UpdateRoomRequest,
     db: Session = Depends(get_db)
 ):
     """
-    Update a room assignment and recalculate all assignments for the date.
+    Update a room assignment and repair the assignments for the date.
+    
+    When the repair is incremental, the response lists every event whose
+    room changed so the dashboard can patch its view; after a full
+    recalculation the list is empty and the dashboard reloads the day.
     """
     try:
         # Validate room number
@@ -334,56 +550,34 @@ async def update_room(
         
         db.commit()
         
-        # IMPORTANT: Clear all auto-assignments for this date before recalculating
-        # This prevents conflicts when manually changing rooms
-        # Only keep manager (manual) assignments
-        auto_assignments = db.query(RoomAssignment).filter(
-            RoomAssignment.date == request.date,
-            RoomAssignment.assigned_by == 'auto'
-        ).all()
-        
-        for auto_assignment in auto_assignments:
-            db.delete(auto_assignment)
+        # The manager may be reacting to bookings we haven't seen yet
+        booking_snapshots.invalidate(request.date)
         
-        db.commit()
-        logger.info(f"Cleared {len(auto_assignments)} auto-assignments for {request.date} before recalculating")
+        # Repair the current assignment for the date in place when we have it:
+        # only bookings that collide with the override are moved
+        assigner = RoomAssigner(db, engine=assignment_engine)
+        changed_bookings = assigner.apply_override(request.date, request.booking_id, request.room)
+        incremental = changed_bookings is not None
         
-        # Recalculate all assignments for this date
-        # This will respect all manager assignments (including the one we just updated)
-        # Manager assignments have priority - conflicts will be resolved by making other bookings unassigned
-        current_service = get_square_service()
-        if current_service.client:
-            bookings = current_service.get_bookings_for_date(request.date)
+        if not incremental:
+            # Every room may have moved; the dashboard reloads the whole day
+            await recalculate_day(db, request.date)
+            changed_bookings = []
+            logger.info(f"Updated room assignment: {request.booking_id} -> {request.room}, recalculated all assignments")
         else:
-            bookings = mock_square.get_bookings_for_date(request.date)
-        
-        # Filter to only allowed therapists
-        bookings = [b for b in bookings if is_allowed_therapist(b.get('therapist', ''))]
-        
-        # Convert to assignment format
-        bookings_for_assignment = []
-        for booking in bookings:
-            bookings_for_assignment.append({
-                'booking_id': booking['id'],
-                'therapist': booking['therapist'],
-                'start_at': booking['start_at'],
-                'end_at': booking['end_at'],
-                'customer': booking['customer'],
-                'service': booking['service'],
-                'type': booking['type']
-            })
-        
-        # Reassign all rooms (this will preserve all manager assignments including the one we just updated)
-        assigner = RoomAssigner(db)
-        assigned_bookings = assigner.assign_rooms(bookings_for_assignment, request.date)
-        
-        logger.info(f"Updated room assignment: {request.booking_id} -> {request.room}, recalculated all assignments")
+            logger.info(f"Updated room assignment: {request.booking_id} -> {request.room}, {len(changed_bookings)} events changed")
         
         return {
             "success": True,
-            "message": f"Room updated to {request.room} and all assignments recalculated",
+            "message": (
+                f"Room updated to {request.room}"
+                if incremental else
+                f"Room updated to {request.room} and all assignments recalculated"
+            ),
             "updated_booking_id": request.booking_id,
-            "new_room": request.room
+            "new_room": request.room,
+            "incremental": incremental,
+            "changed_events": [booking_to_event(booking) for booking in changed_bookings]
         }
         
     except HTTPException:
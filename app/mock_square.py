@@ -90,6 +90,73 @@ class MockSquareService:
         
         return bookings
     
+    def get_bookings_for_range(self, start_date: str, end_date: str) -> Dict[str, List[Dict]]:
+        """
+        Get mock bookings for every date from start_date to end_date (inclusive).
+        
+        Returns:
+            Dict of date -> list of booking dicts
+        """
+        first_day = datetime.strptime(start_date, '%Y-%m-%d')
+        last_day = datetime.strptime(end_date, '%Y-%m-%d')
+        dates = [
+            (first_day + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range((last_day - first_day).days + 1)
+        ]
+        return {date: self.get_bookings_for_date(date) for date in dates}
+    
+    def generate_bookings(
+        self,
+        date: str,
+        count: int,
+        couple_ratio: float = 0.3,
+        seed: int = 0,
+        open_hour: int = 9,
+        close_hour: int = 21
+    ) -> List[Dict]:
+        """
+        Generate a reproducible synthetic day of bookings.
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+            count: Number of bookings to generate
+            couple_ratio: Fraction of bookings that are couple's services
+            seed: Random seed (same seed and arguments give the same day)
+            open_hour: Earliest start hour
+            close_hour: Latest end hour
+            
+        Returns:
+            List of booking dicts in the same format as get_bookings_for_date
+        """
+        rng = random.Random(seed)
+        date_obj = datetime.strptime(date, '%Y-%m-%d')
+        couple_services = [s for s in self.SERVICES if 'couple' in s.lower()]
+        single_services = [s for s in self.SERVICES if 'couple' not in s.lower()]
+        
+        bookings = []
+        for i in range(count):
+            duration = rng.choice([60, 90])
+            latest_start = (close_hour - open_hour) * 60 - duration
+            start_dt = date_obj.replace(hour=open_hour) + timedelta(
+                minutes=rng.randrange(0, latest_start + 1, 15)
+            )
+            end_dt = start_dt + timedelta(minutes=duration)
+            is_couple = rng.random() < couple_ratio
+            
+            bookings.append({
+                'id': f"booking_{date.replace('-', '')}_{i:05d}",
+                'start_at': start_dt.isoformat(),
+                'end_at': end_dt.isoformat(),
+                'therapist': rng.choice(self.THERAPISTS),
+                'service': rng.choice(couple_services if is_couple else single_services),
+                'customer': rng.choice(self.CUSTOMERS),
+                'type': 'couple' if is_couple else 'single',
+                'status': 'ACCEPTED'
+            })
+        
+        bookings.sort(key=lambda b: b['start_at'])
+        return bookings
+    
     def get_therapists(self) -> List[str]:
         """Get list of all therapists."""
         return self.ALLOWED_THERAPISTS.copy()
@@ -1,5 +1,5 @@
 """SQLAlchemy models for room assignments."""
-from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy import Column, String, DateTime, Text, Float
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -15,3 +15,13 @@ class RoomAssignment(Base):
     date = Column(String, nullable=False)  # YYYY-MM-DD format
     reason = Column(Text, nullable=True)  # Reason if unassigned
 
+
+class LookupCacheEntry(Base):
+    """Persisted lookup cache entry (resolved names, team/catalog snapshots)."""
+    __tablename__ = "lookup_cache"
+
+    cache = Column(String, primary_key=True)  # Cache name, e.g. "square.customer_names"
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)  # JSON
+    stored_at = Column(Float, nullable=False)  # Unix time the value was resolved
+    expires_at = Column(Float, nullable=True)  # Unix time it expires (NULL: cache default)
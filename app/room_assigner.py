@@ -1,9 +1,229 @@
 """Room assignment logic with priority rules."""
-from typing import List, Dict, Optional, Tuple
-from datetime import datetime, timedelta
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
+from datetime import datetime
+from operator import attrgetter, itemgetter
+from app.assignment_engines import (
+    COUPLE_PRIORITY,
+    SINGLE_PRIORITY,
+    AssignmentEngine,
+    GreedyEngine,
+)
+from app.booking_record import BookingRecord
+from app.decision_trace import DecisionTrace
 from app.models import RoomAssignment
+from app.room_schedule import RoomSchedule, find_room_conflicts
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
+# Worker processes that plan several days at once, started on first use and
+# kept for the life of the process. They are spawned rather than forked: the
+# server runs background threads (lookup store writer, team refresh, Square
+# I/O pool) whose locks a forked child could inherit in a held state.
+_planning_pool: Optional[ProcessPoolExecutor] = None
+_planning_pool_lock = threading.Lock()
+
+
+def planning_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return the shared planning pool, starting it with max_workers (default: CPU count) if needed."""
+    global _planning_pool
+    with _planning_pool_lock:
+        if _planning_pool is None:
+            _planning_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _planning_pool
+
+
+def discard_planning_pool(pool: ProcessPoolExecutor):
+    """Shut down pool and forget it if it is still the shared one (e.g. after a worker died)."""
+    global _planning_pool
+    with _planning_pool_lock:
+        if _planning_pool is pool:
+            _planning_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _shutdown_planning_pool():
+    """Stop the worker processes when the interpreter exits."""
+    if _planning_pool is not None:
+        _planning_pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(_shutdown_planning_pool)
+
+
+def plan_day(
+    bookings: List[Dict],
+    manager_rooms: Dict[str, Tuple[str, Optional[str]]],
+    engine: AssignmentEngine,
+    date: str,
+    trace: bool = False
+) -> Tuple[List[BookingRecord], Set[str], Optional[DecisionTrace]]:
+    """
+    Compute the room plan for one day without touching the database.
+    
+    Kept at module level (and free of session state) so days can be planned
+    in worker processes.
+    
+    Args:
+        bookings: List of booking dicts with start_at, end_at, type, etc.
+        manager_rooms: Manager overrides for the date as {booking_id: (room, reason)}
+        engine: Engine that places the bookings without an override
+        date: Date string in YYYY-MM-DD format (for logging)
+        trace: Record a DecisionTrace of how every booking was placed
+        
+    Returns:
+        Tuple of (records sorted by start time with room and reason set on
+        their data, ids of bookings that lost a room conflict, the trace or
+        None)
+    """
+    trace = DecisionTrace() if trace else None
+    
+    # Track busy intervals for each physical room (02D blocks both 0 and 2)
+    schedule = RoomSchedule()
+    
+    # Parse every booking once and sort by start time
+    records = sorted(
+        (BookingRecord.from_dict(booking) for booking in bookings),
+        key=attrgetter('start')
+    )
+    # IMPORTANT: First pass - apply all manual assignments and mark rooms as busy
+    # This ensures manual assignments are respected and rooms are properly blocked
+    # Also validate that manual assignments don't conflict with each other
+    # Validate manual assignments don't conflict with each other
+    manual_conflicts = [
+        {
+            'booking1_id': record1.booking_id,
+            'booking2_id': record2.booking_id,
+            'room': manager_rooms[record1.booking_id][0],
+            'time1': f"{record1.data['start_at']} - {record1.data['end_at']}",
+            'time2': f"{record2.data['start_at']} - {record2.data['end_at']}"
+        }
+        for _, record1, record2 in find_room_conflicts(
+            (manager_rooms[record.booking_id][0], record)
+            for record in records
+            if record.booking_id in manager_rooms
+        )
+    ]
+    
+    if manual_conflicts:
+        conflict_msg = "; ".join([
+            f"Bookings {c['booking1_id'][:10]}... and {c['booking2_id'][:10]}... both use room {c['room']} at overlapping times ({c['time1']} vs {c['time2']})"
+            for c in manual_conflicts
+        ])
+        logger.error(f"Manual assignment conflicts detected for {date}: {conflict_msg}")
+        # Don't raise error - just log it, as we still want to proceed with assignment
+    
+    # Apply manual assignments and mark rooms as busy
+    for record in records:
+        # Check if there's a manual assignment
+        if record.booking_id in manager_rooms:
+            room, reason = manager_rooms[record.booking_id]
+            record.data['room'] = room
+            record.data['reason'] = reason
+            if trace is not None:
+                trace.decided(record, 'manager', room, reason)
+            # Mark room as busy BEFORE auto-assigning others (skip UNASSIGNED)
+            if room != 'UNASSIGNED':
+                schedule.mark_busy(room, record.start, record.end)
+    
+    # Second pass - let the engine place bookings without manual assignments
+    auto_records = [record for record in records if record.booking_id not in manager_rooms]
+    placements = engine.place(auto_records, schedule, trace)
+    
+    unassigned_count = 0
+    for record, (room, reason) in zip(auto_records, placements):
+        record.data['room'] = room
+        record.data['reason'] = reason
+        if room == 'UNASSIGNED':
+            unassigned_count += 1
+    
+    if unassigned_count > 0:
+        logger.warning(
+            f"Room assignment completed with {unassigned_count} unassigned bookings for {date}. "
+            f"This may indicate a capacity issue or algorithm problem (use ?trace=1 for details)."
+        )
+    
+    # Validate: Check for room conflicts (overbooking)
+    # Sweep each physical room for overlapping bookings
+    conflicts = [
+        {'room': r, 'booking1': b1, 'booking2': b2}
+        for r, b1, b2 in find_room_conflicts(
+            (record.data['room'], record)
+            for record in records
+            if record.data.get('room')
+        )
+    ]
+    
+    conflict_losers = set()
+    if conflicts:
+        logger.warning(f"Room assignment conflicts detected for {date}:")
+        for conflict in conflicts:
+            r1 = conflict['booking1']
+            r2 = conflict['booking2']
+            b1 = r1.data
+            b2 = r2.data
+            booking1_id = r1.booking_id
+            booking2_id = r2.booking_id
+            # An earlier resolution may already have unassigned one side
+            if b1['room'] == 'UNASSIGNED' or b2['room'] == 'UNASSIGNED':
+                continue
+            logger.warning(f"  Room {conflict['room']} overbooked: {booking1_id[:20]}... and {booking2_id[:20]}...")
+            logger.warning(f"    Times: {b1['start_at']} - {b1['end_at']} vs {b2['start_at']} - {b2['end_at']}")
+            
+            # Fix conflicts: Manager assignments have priority
+            # If one is manager-assigned and the other is auto-assigned, unassign the auto one
+            b1_is_manager = booking1_id in manager_rooms
+            b2_is_manager = booking2_id in manager_rooms
+            
+            # Priority rule: Manager assignments > Auto assignments
+            # If both are manager-assigned, keep the first one (booking1) and unassign booking2
+            # If one is manager and one is auto, unassign the auto one
+            # If both are auto, unassign the second one (booking2)
+            
+            if b1_is_manager and b2_is_manager:
+                # Both are manager-assigned: keep booking1, unassign booking2
+                logger.warning(f"  Both are manager-assigned: keeping {booking1_id[:20]}..., unassigning {booking2_id[:20]}...")
+                conflict_losers.add(booking2_id)
+                b2['room'] = 'UNASSIGNED'
+                b2['reason'] = f"Conflict with manager-assigned booking {booking1_id[:20]}..."
+            elif b1_is_manager:
+                # booking1 is manager-assigned, booking2 is auto: unassign booking2
+                logger.info(f"  Manager assignment priority: keeping {booking1_id[:20]}..., unassigning auto-assigned {booking2_id[:20]}...")
+                conflict_losers.add(booking2_id)
+                b2['room'] = 'UNASSIGNED'
+                b2['reason'] = f"Conflict with manager-assigned booking {booking1_id[:20]}..."
+            elif b2_is_manager:
+                # booking2 is manager-assigned, booking1 is auto: unassign booking1
+                logger.info(f"  Manager assignment priority: keeping {booking2_id[:20]}..., unassigning auto-assigned {booking1_id[:20]}...")
+                conflict_losers.add(booking1_id)
+                b1['room'] = 'UNASSIGNED'
+                b1['reason'] = f"Conflict with manager-assigned booking {booking2_id[:20]}..."
+            else:
+                # Both are auto-assigned: unassign booking2 (the later one)
+                logger.info(f"  Both are auto-assigned: keeping {booking1_id[:20]}..., unassigning {booking2_id[:20]}...")
+                conflict_losers.add(booking2_id)
+                b2['room'] = 'UNASSIGNED'
+                b2['reason'] = f"Conflict with auto-assigned booking {booking1_id[:20]}..."
+    
+    if trace is not None:
+        for booking_id in conflict_losers:
+            loser = next(record for record in records if record.booking_id == booking_id)
+            trace.decided(loser, 'conflict', loser.data['room'], loser.data['reason'])
+    
+    return records, conflict_losers, trace
+
 
 class RoomAssigner:
     """Handles automatic room assignment based on priority rules."""
@@ -14,443 +234,526 @@ class RoomAssigner:
     CONVERTIBLE_ROOMS = ['0', '2']  # Can be single or merged into "02D"
     
     # Priority for COUPLE appointments
-    COUPLE_PRIORITY = ['5', '6', '02D']
+    COUPLE_PRIORITY = COUPLE_PRIORITY
     
     # Priority for SINGLE appointments
-    SINGLE_PRIORITY = ['1', '3', '4', '2', '0', '6', '5']
+    SINGLE_PRIORITY = SINGLE_PRIORITY
     
-    def __init__(self, db: Session):
-        """Initialize room assigner with database session."""
+    # Last computed assignment per date, reused while the inputs are unchanged
+    MAX_CACHED_DAYS = 64
+    _day_cache: "OrderedDict[str, Dict]" = OrderedDict()
+    _day_cache_lock = threading.Lock()
+    
+    def __init__(self, db: Session, engine: Optional[AssignmentEngine] = None):
+        """
+        Initialize room assigner with database session.
+        
+        Args:
+            db: Database session
+            engine: Engine that places non-manager bookings (greedy by default)
+        """
         self.db = db
+        self.engine = engine or GreedyEngine()
+        # Decision trace per date from the last traced call (see assign_range)
+        self.traces: Dict[str, List[Dict]] = {}
     
     def assign_rooms(
         self, 
         bookings: List[Dict], 
-        date: str
+        date: str,
+        trace: bool = False
     ) -> List[Dict]:
         """
-        Assign rooms to bookings using greedy algorithm.
+        Assign rooms to bookings using the configured engine.
         
         Args:
             bookings: List of booking dicts with start_at, end_at, type, etc.
             date: Date string in YYYY-MM-DD format
+            trace: Record how each booking was placed in self.traces[date]
             
         Returns:
             List of bookings with room assignments added
         """
-        # Get existing manual assignments (don't overwrite)
-        existing_assignments = {
-            row.booking_id: row
-            for row in self.db.query(RoomAssignment).filter(
-                RoomAssignment.date == date,
-                RoomAssignment.assigned_by == 'manager'
-            ).all()
-        }
+        return self.assign_range({date: bookings}, trace=trace)[date]
+    
+    def assign_range(
+        self,
+        bookings_by_date: Dict[str, List[Dict]],
+        max_workers: Optional[int] = None,
+        trace: bool = False
+    ) -> Dict[str, List[Dict]]:
+        """
+        Assign rooms for several dates at once.
         
-        # Track busy times for each room (timestamp when room becomes free)
-        busy_until = {
-            '0': 0.0, '1': 0.0, '2': 0.0, '3': 0.0, 
-            '4': 0.0, '5': 0.0, '6': 0.0
-        }
+        Stored assignments for every date are loaded with one query and all
+        changes are written in one transaction. Days whose inputs are
+        unchanged reuse their cached result; the rest are planned with
+        plan_day, fanned out over the shared planning pool when the engine is CPU
+        bound (the optimal engine) and more than one day needs planning.
         
-        # Sort bookings by start time
-        def get_start_time(booking):
-            start_str = booking['start_at']
-            if start_str.endswith('Z'):
-                start_str = start_str.replace('Z', '+00:00')
-            return datetime.fromisoformat(start_str)
-        
-        sorted_bookings = sorted(bookings, key=get_start_time)
-        
-        # IMPORTANT: First pass - apply all manual assignments and mark rooms as busy
-        # This ensures manual assignments are respected and rooms are properly blocked
-        # Also validate that manual assignments don't conflict with each other
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # Validate manual assignments don't conflict with each other
-        manual_conflicts = []
-        for i, booking1 in enumerate(sorted_bookings):
-            booking1_id = booking1['booking_id']
-            if booking1_id not in existing_assignments:
-                continue
-            
-            room1 = existing_assignments[booking1_id].room
-            if room1 == 'UNASSIGNED':
-                continue
-            
-            start1 = get_start_time(booking1)
-            end1 = datetime.fromisoformat(booking1['end_at'].replace('Z', '+00:00') if booking1['end_at'].endswith('Z') else booking1['end_at'])
-            
-            # Check against other manual assignments
-            for booking2 in sorted_bookings[i+1:]:
-                booking2_id = booking2['booking_id']
-                if booking2_id not in existing_assignments:
-                    continue
-                
-                room2 = existing_assignments[booking2_id].room
-                if room2 == 'UNASSIGNED':
-                    continue
-                
-                # Check if same physical room
-                check_rooms = set([room1])
-                if room1 == '02D':
-                    check_rooms = {'0', '2'}
-                elif room2 == '02D':
-                    check_rooms = {'0', '2'}
-                
-                if room2 in check_rooms or (room2 == '02D' and room1 in {'0', '2'}):
-                    start2 = get_start_time(booking2)
-                    end2 = datetime.fromisoformat(booking2['end_at'].replace('Z', '+00:00') if booking2['end_at'].endswith('Z') else booking2['end_at'])
-                    
-                    # Check for time overlap
-                    if not (end1 <= start2 or end2 <= start1):
-                        manual_conflicts.append({
-                            'booking1_id': booking1_id,
-                            'booking2_id': booking2_id,
-                            'room': room1,
-                            'time1': f"{start1} - {end1}",
-                            'time2': f"{start2} - {end2}"
-                        })
-        
-        if manual_conflicts:
-            conflict_msg = "; ".join([
-                f"Bookings {c['booking1_id'][:10]}... and {c['booking2_id'][:10]}... both use room {c['room']} at overlapping times ({c['time1']} vs {c['time2']})"
-                for c in manual_conflicts
-            ])
-            logger.error(f"Manual assignment conflicts detected for {date}: {conflict_msg}")
-            # Don't raise error - just log it, as we still want to proceed with assignment
-        
-        # Apply manual assignments and mark rooms as busy
-        for booking in sorted_bookings:
-            booking_id = booking['booking_id']
+        Args:
+            bookings_by_date: Booking dicts per date (YYYY-MM-DD)
+            max_workers: Worker processes for planning (default: CPU count,
+                1 plans every day in this process); only the call that
+                starts the shared planning pool sizes it
+            trace: Plan every date (even unchanged ones) and keep a decision
+                trace per date in self.traces
             
-            # Check if there's a manual assignment
-            if booking_id in existing_assignments:
-                existing = existing_assignments[booking_id]
-                booking['room'] = existing.room
-                booking['reason'] = existing.reason
-                # Mark room as busy BEFORE auto-assigning others (skip UNASSIGNED)
-                if existing.room != 'UNASSIGNED':
-                    self._mark_room_busy(
-                        existing.room,
-                        booking['start_at'],
-                        booking['end_at'],
-                        busy_until
-                    )
+        Returns:
+            Dict of date -> bookings with room assignments added, sorted by
+            start time
+        """
+        dates = list(bookings_by_date)
+        if not dates:
+            return {}
         
-        # Second pass - assign rooms for bookings without manual assignments
-        import logging
-        logger = logging.getLogger(__name__)
+        # Load every stored assignment for these dates in one query
+        stored_by_date: Dict[str, Dict[str, RoomAssignment]] = {date: {} for date in dates}
+        for row in self.db.query(RoomAssignment).filter(RoomAssignment.date.in_(dates)).all():
+            stored_by_date[row.date][row.booking_id] = row
         
-        unassigned_count = 0
-        for booking in sorted_bookings:
-            booking_id = booking['booking_id']
-            
-            # Skip if already manually assigned
-            if booking_id in existing_assignments:
-                continue
-            
-            # Try to assign room automatically
-            room, reason = self._find_available_room(
-                booking,
-                busy_until
+        # Existing manual assignments (don't overwrite)
+        manager_by_date = {
+            date: {
+                booking_id: row
+                for booking_id, row in stored.items()
+                if row.assigned_by == 'manager'
+            }
+            for date, stored in stored_by_date.items()
+        }
+        
+        results: Dict[str, List[Dict]] = {}
+        losers_by_date: Dict[str, Set[str]] = {}
+        fingerprints: Dict[str, str] = {}
+        to_plan = []
+        for date in dates:
+            # Nothing changed since the last run for this date: reuse its result
+            fingerprint = self._fingerprint(
+                bookings_by_date[date], self._manager_rooms(manager_by_date[date]), self.engine.name
             )
-            
-            booking['room'] = room
-            booking['reason'] = reason
-            
-            if room == 'UNASSIGNED':
-                unassigned_count += 1
-                start_time = get_start_time(booking)
-                logger.warning(
-                    f"Could not assign room for booking {booking_id[:20]}... "
-                    f"(type: {booking.get('type', 'single')}, "
-                    f"time: {start_time}, reason: {reason})"
-                )
-                # Log current busy_until state for debugging
-                busy_state_str = ", ".join([
-                    f"Room {r}: {'free' if t <= start_time.timestamp() else datetime.fromtimestamp(t).strftime('%H:%M')}"
-                    for r, t in sorted(busy_until.items())
-                ])
-                logger.warning(f"  Busy state at {start_time.strftime('%H:%M')}: {busy_state_str}")
-                
-                # Double-check: Is room 5 actually free?
-                room5_busy_until = busy_until.get('5', 0.0)
-                if room5_busy_until <= start_time.timestamp():
-                    logger.error(f"  ⚠ CRITICAL BUG: Room 5 is FREE (busy until {datetime.fromtimestamp(room5_busy_until).strftime('%H:%M') if room5_busy_until > 0 else 'never'}) but booking was marked UNASSIGNED!")
-                    logger.error(f"  This suggests a bug in _find_available_room - it should have found room 5")
-                
-                # Don't mark UNASSIGNED as busy - it doesn't block any room
-                continue
-            
-            # Mark room as busy
-            self._mark_room_busy(room, booking['start_at'], booking['end_at'], busy_until)
-            
-            # Save to database (only if not already exists or is auto-assigned)
-            existing = self.db.query(RoomAssignment).filter(
-                RoomAssignment.booking_id == booking_id
-            ).first()
-            
-            if not existing:
-                assignment = RoomAssignment(
-                    booking_id=booking_id,
-                    room=room,
-                    assigned_by='auto',
-                    date=date,
-                    reason=reason
-                )
-                self.db.add(assignment)
-            elif existing.assigned_by == 'auto':
-                # Update auto-assignment
-                existing.room = room
-                existing.reason = reason
-                existing.updated_at = datetime.now()
+            cached = None if trace else self._get_cached_day(date, fingerprint)
+            if cached is not None:
+                results[date] = self._apply_cached_day(bookings_by_date[date], cached)
+                losers_by_date[date] = cached['losers']
+            else:
+                fingerprints[date] = fingerprint
+                to_plan.append(date)
         
-        self.db.commit()
+        records_by_date = self._plan_days(
+            {date: bookings_by_date[date] for date in to_plan},
+            {date: self._manager_rooms(manager_by_date[date]) for date in to_plan},
+            max_workers,
+            trace
+        )
+        self.traces = {}
+        for date, (records, conflict_losers, day_trace) in records_by_date.items():
+            results[date] = self._apply_planned_day(bookings_by_date[date], records)
+            losers_by_date[date] = conflict_losers
+            if day_trace is not None:
+                self.traces[date] = day_trace.to_list()
         
-        if unassigned_count > 0:
-            logger.warning(
-                f"Room assignment completed with {unassigned_count} unassigned bookings for {date}. "
-                f"This may indicate a capacity issue or algorithm problem."
+        auto_rows = []
+        stale_rows = []
+        for date in dates:
+            day_auto_rows, day_stale_rows = self._collect_writes(
+                date, results[date], stored_by_date[date], manager_by_date[date], losers_by_date[date]
             )
+            auto_rows.extend(day_auto_rows)
+            stale_rows.extend(day_stale_rows)
+        self._write_rows(auto_rows, stale_rows)
         
-        # Validate: Check for room conflicts (overbooking)
-        # Group bookings by room and check for time overlaps
-        room_bookings = {}
-        for booking in sorted_bookings:
-            room = booking.get('room')
-            if room and room != 'UNASSIGNED':
-                if room not in room_bookings:
-                    room_bookings[room] = []
-                room_bookings[room].append(booking)
-        
-        # Check for overlaps in each room
-        conflicts = []
-        for room, bookings in room_bookings.items():
-            if room == '02D':
-                # For 02D, check both room 0 and 2
-                room_list = ['0', '2']
-            else:
-                room_list = [room]
+        for date, (records, conflict_losers, _) in records_by_date.items():
+            self._store_cached_day(date, fingerprints[date], records, conflict_losers)
+        
+        return {date: results[date] for date in dates}
+    
+    def _plan_days(
+        self,
+        bookings_by_date: Dict[str, List[Dict]],
+        manager_rooms_by_date: Dict[str, Dict[str, Tuple[str, Optional[str]]]],
+        max_workers: Optional[int],
+        trace: bool = False
+    ) -> Dict[str, Tuple[List[BookingRecord], Set[str], Optional[DecisionTrace]]]:
+        """Run plan_day for each date, in worker processes when worthwhile."""
+        dates = list(bookings_by_date)
+        if len(dates) > 1 and self.engine.cpu_bound and max_workers != 1:
+            pool = planning_pool(max_workers)
+            try:
+                futures = {
+                    date: pool.submit(
+                        plan_day, bookings_by_date[date], manager_rooms_by_date[date], self.engine, date, trace
+                    )
+                    for date in dates
+                }
+                return {date: future.result() for date, future in futures.items()}
+            except (OSError, RuntimeError) as e:
+                # BrokenProcessPool is a RuntimeError; start a new pool next time and plan in this process
+                logger.warning(f"Could not plan {len(dates)} days in parallel, planning sequentially: {e}")
+                discard_planning_pool(pool)
+        
+        return {
+            date: plan_day(bookings_by_date[date], manager_rooms_by_date[date], self.engine, date, trace)
+            for date in dates
+        }
+    
+    @staticmethod
+    def _manager_rooms(existing_assignments: Dict[str, RoomAssignment]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Reduce manager rows to {booking_id: (room, reason)}."""
+        return {
+            booking_id: (row.room, row.reason)
+            for booking_id, row in existing_assignments.items()
+        }
+    
+    @staticmethod
+    def _apply_planned_day(bookings: List[Dict], records: List[BookingRecord]) -> List[Dict]:
+        """
+        Copy planned rooms onto the caller's bookings, in start-time order.
+        
+        Records planned in a worker process carry copies of the booking dicts,
+        so results are always written back by booking id.
+        """
+        by_id = {booking['booking_id']: booking for booking in bookings}
+        sorted_bookings = []
+        for record in records:
+            booking = by_id[record.booking_id]
+            booking['room'] = record.data['room']
+            booking['reason'] = record.data['reason']
+            record.data = booking
+            sorted_bookings.append(booking)
+        return sorted_bookings
+    
+    def apply_override(
+        self,
+        date: str,
+        booking_id: str,
+        room: str
+    ) -> Optional[List[Dict]]:
+        """
+        Repair the cached assignment for date after a manager override.
+        
+        The override must already be saved as a manager row. Starting from the
+        last computed state for the date, only the bookings that now collide
+        with the override are evicted; they (and any bookings that were
+        unassigned before, in case the move freed a room) are re-placed by
+        the configured engine around the bookings that stay put, so the
+        result can differ from what a full recalculation would choose.
+        Manager-vs-manager collisions follow the same rule as assign_rooms:
+        the earlier booking keeps its room.
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+            booking_id: Booking the manager moved
+            room: New room for the booking
             
-            for r in room_list:
-                # Get all bookings that use this physical room
-                relevant_bookings = []
-                for b in sorted_bookings:
-                    b_room = b.get('room')
-                    if b_room == r or (b_room == '02D' and r in ['0', '2']):
-                        relevant_bookings.append(b)
-                
-                # Check for time overlaps
-                for i, b1 in enumerate(relevant_bookings):
-                    start1 = get_start_time(b1)
-                    end1 = datetime.fromisoformat(b1['end_at'].replace('Z', '+00:00') if b1['end_at'].endswith('Z') else b1['end_at'])
-                    for j, b2 in enumerate(relevant_bookings[i+1:], i+1):
-                        start2 = get_start_time(b2)
-                        end2 = datetime.fromisoformat(b2['end_at'].replace('Z', '+00:00') if b2['end_at'].endswith('Z') else b2['end_at'])
-                        
-                        # Check if times overlap
-                        if not (end1 <= start2 or end2 <= start1):
-                            conflicts.append({
-                                'room': r,
-                                'booking1': b1['booking_id'],
-                                'booking2': b2['booking_id'],
-                                'time1': f"{start1} - {end1}",
-                                'time2': f"{start2} - {end2}"
-                            })
-        
-        if conflicts:
-            logger.warning(f"Room assignment conflicts detected for {date}:")
-            for conflict in conflicts:
-                logger.warning(f"  Room {conflict['room']} overbooked: {conflict['booking1'][:20]}... and {conflict['booking2'][:20]}...")
-                logger.warning(f"    Times: {conflict['time1']} vs {conflict['time2']}")
-                
-                # Fix conflicts: Manager assignments have priority
-                # If one is manager-assigned and the other is auto-assigned, unassign the auto one
-                b1 = next((b for b in sorted_bookings if b['booking_id'] == conflict['booking1']), None)
-                b2 = next((b for b in sorted_bookings if b['booking_id'] == conflict['booking2']), None)
-                
-                if b1 and b2:
-                    # Check assignment types
-                    b1_assignment = self.db.query(RoomAssignment).filter(
-                        RoomAssignment.booking_id == conflict['booking1']
-                    ).first()
-                    b2_assignment = self.db.query(RoomAssignment).filter(
-                        RoomAssignment.booking_id == conflict['booking2']
-                    ).first()
-                    
-                    b1_is_manager = b1_assignment and b1_assignment.assigned_by == 'manager'
-                    b2_is_manager = b2_assignment and b2_assignment.assigned_by == 'manager'
-                    
-                    # Priority rule: Manager assignments > Auto assignments
-                    # If both are manager-assigned, keep the first one (booking1) and unassign booking2
-                    # If one is manager and one is auto, unassign the auto one
-                    # If both are auto, unassign the second one (booking2)
-                    
-                    if b1_is_manager and b2_is_manager:
-                        # Both are manager-assigned: keep booking1, unassign booking2
-                        logger.warning(f"  Both are manager-assigned: keeping {conflict['booking1'][:20]}..., unassigning {conflict['booking2'][:20]}...")
-                        if b2_assignment:
-                            self.db.delete(b2_assignment)
-                        b2['room'] = 'UNASSIGNED'
-                        b2['reason'] = f"Conflict with manager-assigned booking {conflict['booking1'][:20]}..."
-                    elif b1_is_manager:
-                        # booking1 is manager-assigned, booking2 is auto: unassign booking2
-                        logger.info(f"  Manager assignment priority: keeping {conflict['booking1'][:20]}..., unassigning auto-assigned {conflict['booking2'][:20]}...")
-                        if b2_assignment:
-                            self.db.delete(b2_assignment)
-                        b2['room'] = 'UNASSIGNED'
-                        b2['reason'] = f"Conflict with manager-assigned booking {conflict['booking1'][:20]}..."
-                    elif b2_is_manager:
-                        # booking2 is manager-assigned, booking1 is auto: unassign booking1
-                        logger.info(f"  Manager assignment priority: keeping {conflict['booking2'][:20]}..., unassigning auto-assigned {conflict['booking1'][:20]}...")
-                        if b1_assignment:
-                            self.db.delete(b1_assignment)
-                        b1['room'] = 'UNASSIGNED'
-                        b1['reason'] = f"Conflict with manager-assigned booking {conflict['booking2'][:20]}..."
+        Returns:
+            The bookings whose room or reason changed (including the moved
+            one), or None when there is no cached state for the date and the
+            caller has to recompute the whole day.
+        """
+        with self._day_cache_lock:
+            cached = self._day_cache.get(date)
+        if cached is None:
+            return None
+        
+        # Work on copies so the cache only changes once the repair succeeded
+        records = [
+            BookingRecord(r.booking_id, r.start, r.end, r.is_couple, r.therapist, dict(r.data))
+            for r in cached['records']
+        ]
+        position = {record.booking_id: i for i, record in enumerate(records)}
+        if booking_id not in position:
+            return None
+        target = records[position[booking_id]]
+        previous = {record.booking_id: (record.data['room'], record.data['reason']) for record in records}
+        
+        stored_assignments = {
+            row.booking_id: row
+            for row in self.db.query(RoomAssignment).filter(
+                RoomAssignment.date == date
+            ).all()
+        }
+        existing_assignments = {
+            stored_id: row
+            for stored_id, row in stored_assignments.items()
+            if row.assigned_by == 'manager'
+        }
+        
+        target.data['room'] = room
+        target.data['reason'] = None
+        conflict_losers = set()
+        evicted = []
+        
+        if room != 'UNASSIGNED':
+            colliding = [
+                second if first is target else first
+                for _, first, second in find_room_conflicts(
+                    (record.data['room'], record)
+                    for record in records
+                    if record.data['room'] != 'UNASSIGNED'
+                )
+                if first is target or second is target
+            ]
+            # Earlier manager bookings keep their room; the override loses
+            winner = next(
+                (
+                    other for other in colliding
+                    if other.booking_id in existing_assignments
+                    and position[other.booking_id] < position[booking_id]
+                ),
+                None
+            )
+            if winner is not None:
+                logger.warning(f"  Both are manager-assigned: keeping {winner.booking_id[:20]}..., unassigning {booking_id[:20]}...")
+                conflict_losers.add(booking_id)
+                target.data['room'] = 'UNASSIGNED'
+                target.data['reason'] = f"Conflict with manager-assigned booking {winner.booking_id[:20]}..."
+            else:
+                for other in colliding:
+                    if other.booking_id in existing_assignments:
+                        logger.warning(f"  Both are manager-assigned: keeping {booking_id[:20]}..., unassigning {other.booking_id[:20]}...")
+                        conflict_losers.add(other.booking_id)
+                        other.data['room'] = 'UNASSIGNED'
+                        other.data['reason'] = f"Conflict with manager-assigned booking {booking_id[:20]}..."
                     else:
-                        # Both are auto-assigned: unassign booking2 (the later one)
-                        logger.info(f"  Both are auto-assigned: keeping {conflict['booking1'][:20]}..., unassigning {conflict['booking2'][:20]}...")
-                        if b2_assignment:
-                            self.db.delete(b2_assignment)
-                        b2['room'] = 'UNASSIGNED'
-                        b2['reason'] = f"Conflict with auto-assigned booking {conflict['booking1'][:20]}..."
-            
-            self.db.commit()
+                        other.data['room'] = 'UNASSIGNED'
+                        evicted.append(other)
+        
+        # Rebuild the room state without the evicted bookings
+        schedule = RoomSchedule()
+        for record in records:
+            if record.data['room'] != 'UNASSIGNED':
+                self._mark_room_busy(record.data['room'], record, schedule)
+        
+        # Re-place evicted bookings, and retry anything the move may have freed
+        # a room for, with the configured engine around the bookings that stay put
+        displaced = [
+            record for record in records
+            if record.data['room'] == 'UNASSIGNED'
+            and record.booking_id not in existing_assignments
+            and record.booking_id not in conflict_losers
+        ]
+        for record, (new_room, reason) in zip(displaced, self.engine.place(displaced, schedule)):
+            record.data['room'] = new_room
+            record.data['reason'] = reason
         
+        sorted_bookings = [record.data for record in records]
+        self._save_assignments(
+            date, sorted_bookings, stored_assignments, existing_assignments, conflict_losers
+        )
+        
+        if conflict_losers:
+            # Deleted manager rows turn those bookings into auto bookings; let
+            # the next full run place them
+            self.clear_cache(date)
+        else:
+            fingerprint = self._fingerprint(
+                sorted_bookings, self._manager_rooms(existing_assignments), self.engine.name
+            )
+            self._store_cached_day(date, fingerprint, records, conflict_losers)
+        
+        changed = [
+            record.data for record in records
+            if (record.data['room'], record.data['reason']) != previous[record.booking_id]
+            or record is target
+        ]
+        logger.info(
+            f"Incremental repair for {date}: {booking_id[:20]}... -> {room}, "
+            f"{len(evicted)} evicted, {len(changed)} changed"
+        )
+        return changed
+    
+    @staticmethod
+    def _fingerprint(
+        bookings: List[Dict],
+        manager_rooms: Dict[str, Tuple[str, Optional[str]]],
+        engine_name: str
+    ) -> str:
+        """
+        Fingerprint everything the assignment depends on.
+        
+        Covers booking ids, times, types and Square versions, the manager
+        overrides for the date and the engine that placed the rest.
+        """
+        digest = hashlib.sha1(engine_name.encode())
+        for booking in sorted(bookings, key=itemgetter('booking_id')):
+            digest.update(repr((
+                booking['booking_id'],
+                booking['start_at'],
+                booking['end_at'],
+                booking.get('type', 'single'),
+                booking.get('version')
+            )).encode())
+        digest.update(b'|')
+        for booking_id in sorted(manager_rooms):
+            digest.update(repr((booking_id,) + tuple(manager_rooms[booking_id])).encode())
+        return digest.hexdigest()
+    
+    @classmethod
+    def _get_cached_day(cls, date: str, fingerprint: str) -> Optional[Dict]:
+        """Return the cached result for date if it was computed from the same inputs."""
+        with cls._day_cache_lock:
+            cached = cls._day_cache.get(date)
+            if cached is None or cached['fingerprint'] != fingerprint:
+                return None
+            cls._day_cache.move_to_end(date)
+            return cached
+    
+    @classmethod
+    def _store_cached_day(
+        cls,
+        date: str,
+        fingerprint: str,
+        records: List[BookingRecord],
+        conflict_losers: Set[str]
+    ):
+        """Remember the computed state for date (LRU-bounded)."""
+        with cls._day_cache_lock:
+            cls._day_cache[date] = {
+                'fingerprint': fingerprint,
+                'order': [record.booking_id for record in records],
+                'results': {
+                    record.booking_id: (record.data['room'], record.data['reason'])
+                    for record in records
+                },
+                'losers': frozenset(conflict_losers),
+                # Detached copies of the bookings for incremental repair
+                'records': [
+                    BookingRecord(r.booking_id, r.start, r.end, r.is_couple, r.therapist, dict(r.data))
+                    for r in records
+                ]
+            }
+            cls._day_cache.move_to_end(date)
+            while len(cls._day_cache) > cls.MAX_CACHED_DAYS:
+                cls._day_cache.popitem(last=False)
+    
+    @classmethod
+    def clear_cache(cls, date: Optional[str] = None):
+        """Forget cached results for one date, or for every date."""
+        with cls._day_cache_lock:
+            if date is None:
+                cls._day_cache.clear()
+            else:
+                cls._day_cache.pop(date, None)
+    
+    @staticmethod
+    def _apply_cached_day(bookings: List[Dict], cached: Dict) -> List[Dict]:
+        """Copy cached rooms onto the caller's bookings, in cached start-time order."""
+        by_id = {booking['booking_id']: booking for booking in bookings}
+        sorted_bookings = []
+        for booking_id in cached['order']:
+            booking = by_id[booking_id]
+            booking['room'], booking['reason'] = cached['results'][booking_id]
+            sorted_bookings.append(booking)
         return sorted_bookings
     
-    def _find_available_room(
+    def _save_assignments(
         self,
-        booking: Dict,
-        busy_until: Dict[str, float]
-    ) -> Tuple[str, Optional[str]]:
+        date: str,
+        sorted_bookings: List[Dict],
+        stored_assignments: Dict[str, RoomAssignment],
+        existing_assignments: Dict[str, RoomAssignment],
+        conflict_losers: Set[str]
+    ):
+        """Write changed auto assignments for one date back and commit."""
+        self._write_rows(*self._collect_writes(
+            date, sorted_bookings, stored_assignments, existing_assignments, conflict_losers
+        ))
+    
+    @staticmethod
+    def _collect_writes(
+        date: str,
+        sorted_bookings: List[Dict],
+        stored_assignments: Dict[str, RoomAssignment],
+        existing_assignments: Dict[str, RoomAssignment],
+        conflict_losers: Set[str]
+    ) -> Tuple[List[Dict], List[str]]:
         """
-        Find an available room for a booking.
+        Work out which rows of one date need writing.
+        
+        Only auto rows whose room or reason differ from what is stored are
+        upserted (manager rows are never overwritten). Stored rows of bookings
+        that lost a room conflict, and stale auto rows of bookings that are
+        now unassigned, are deleted.
         
         Returns:
-            Tuple of (room, reason) where reason is None if assigned successfully
+            Tuple of (rows to upsert, booking ids to delete)
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # Parse datetime, handling both with and without timezone
-        start_str = booking['start_at']
-        end_str = booking['end_at']
-        
-        if start_str.endswith('Z'):
-            start_str = start_str.replace('Z', '+00:00')
-        if end_str.endswith('Z'):
-            end_str = end_str.replace('Z', '+00:00')
-        
-        start_dt = datetime.fromisoformat(start_str)
-        end_dt = datetime.fromisoformat(end_str)
-        start_ts = start_dt.timestamp()
-        end_ts = end_dt.timestamp()
-        
-        booking_id = booking.get('booking_id', 'unknown')[:20]
-        booking_type = booking.get('type', 'single')
-        
-        logger.debug(f"Finding room for booking {booking_id} (type: {booking_type}, time: {start_dt.strftime('%H:%M')}-{end_dt.strftime('%H:%M')})")
-        logger.debug(f"Current busy_until state: {[(r, datetime.fromtimestamp(t).strftime('%H:%M') if t > 0 else 'free') for r, t in sorted(busy_until.items())]}")
-        
-        def is_free(room: str) -> bool:
-            """Check if room is free for the entire duration."""
-            # Room is free if it becomes available before or at the start time
-            room_busy_until = busy_until.get(room, 0.0)
-            is_available = room_busy_until <= start_ts
-            if not is_available:
-                busy_time = datetime.fromtimestamp(room_busy_until)
-                logger.debug(f"  Room {room} is BUSY until {busy_time.strftime('%H:%M')} (booking starts at {start_dt.strftime('%H:%M')})")
-            else:
-                logger.debug(f"  Room {room} is FREE (busy until: {datetime.fromtimestamp(room_busy_until).strftime('%H:%M') if room_busy_until > 0 else 'never'})")
-            return is_available
-        
-        def can_use_02d() -> bool:
-            """Check if 02D (merged room 0+2) can be used."""
-            # Both 0 and 2 must be free at the start time
-            # Also check that neither is blocked by an existing 02D assignment
-            # (which would have set both to the same end time)
-            return is_free('0') and is_free('2')
-        
-        if booking_type == 'couple':
-            # COUPLE priority: 5 -> 6 -> 02D
-            logger.debug(f"  Checking couple rooms in priority order: 5, 6, 02D")
-            for room in ['5', '6']:
-                if is_free(room):
-                    logger.info(f"  ✓ Assigned room {room} to couple booking {booking_id}")
-                    return room, None
-            
-            # Try merged room 0+2 (HARD RULE: both must be free for entire duration)
-            # If either 0 or 2 is used by a single, 02D CANNOT be used
-            if can_use_02d():
-                logger.info(f"  ✓ Assigned room 02D to couple booking {booking_id}")
-                return '02D', None
-            
-            # Build detailed reason for failure
-            reasons = []
-            if not is_free('5'):
-                busy_time = datetime.fromtimestamp(busy_until.get('5', 0))
-                reasons.append(f"Room 5 busy until {busy_time.strftime('%H:%M')}")
-            if not is_free('6'):
-                busy_time = datetime.fromtimestamp(busy_until.get('6', 0))
-                reasons.append(f"Room 6 busy until {busy_time.strftime('%H:%M')}")
-            if not is_free('0'):
-                busy_time = datetime.fromtimestamp(busy_until.get('0', 0))
-                reasons.append(f"Room 0 busy until {busy_time.strftime('%H:%M')}")
-            if not is_free('2'):
-                busy_time = datetime.fromtimestamp(busy_until.get('2', 0))
-                reasons.append(f"Room 2 busy until {busy_time.strftime('%H:%M')}")
-            
-            logger.warning(f"  ✗ Could not assign couple room to {booking_id}. Reasons: {'; '.join(reasons)}")
-            return 'UNASSIGNED', f"No double room available. {'; '.join(reasons)}"
-        
-        else:  # single
-            # SINGLE priority: 1 -> 3 -> 4 -> 2 -> 0 -> 6 -> 5
-            # Try each room in priority order
-            logger.debug(f"  Checking single rooms in priority order: {', '.join(self.SINGLE_PRIORITY)}")
-            for room in self.SINGLE_PRIORITY:
-                if is_free(room):
-                    logger.info(f"  ✓ Assigned room {room} to single booking {booking_id}")
-                    return room, None
-            
-            # If no room available, check if 02D is blocking 0 and 2
-            # If so, we might be able to use 6 or 5 (but they're already checked)
-            # Build detailed reason
-            reasons = []
-            for room in self.SINGLE_PRIORITY:
-                if not is_free(room):
-                    busy_time = datetime.fromtimestamp(busy_until.get(room, 0))
-                    reasons.append(f"Room {room} busy until {busy_time.strftime('%H:%M')}")
-            
-            logger.warning(f"  ✗ Could not assign single room to {booking_id}. Reasons: {'; '.join(reasons)}")
-            # Special check: if room 5 is actually free, log it prominently and FIX IT
-            if is_free('5'):
-                logger.error(f"  ⚠ BUG DETECTED: Room 5 is FREE but was not assigned! Start time: {start_dt.strftime('%H:%M')}, Room 5 busy until: {datetime.fromtimestamp(busy_until.get('5', 0)).strftime('%H:%M')}")
-                logger.error(f"  🔧 FIXING: Assigning room 5 to {booking_id}")
-                return '5', "Room 5 was available but not checked properly - fixed"
-            return 'UNASSIGNED', f"No room available. {'; '.join(reasons)}"
+        now = datetime.now()
+        auto_rows = []
+        for booking in sorted_bookings:
+            booking_id = booking['booking_id']
+            if (
+                booking_id in existing_assignments
+                or booking_id in conflict_losers
+                or booking['room'] == 'UNASSIGNED'
+            ):
+                continue
+            stored = stored_assignments.get(booking_id)
+            if (
+                stored is not None
+                and stored.assigned_by == 'auto'
+                and stored.room == booking['room']
+                and stored.reason == booking['reason']
+            ):
+                continue
+            auto_rows.append({
+                'booking_id': booking_id,
+                'room': booking['room'],
+                'assigned_by': 'auto',
+                'date': date,
+                'reason': booking['reason'],
+                'updated_at': now
+            })
+        
+        stale_rows = [booking_id for booking_id in conflict_losers if booking_id in stored_assignments]
+        stale_rows.extend(
+            booking['booking_id'] for booking in sorted_bookings
+            if booking['room'] == 'UNASSIGNED'
+            and booking['booking_id'] not in conflict_losers
+            and booking['booking_id'] in stored_assignments
+            and stored_assignments[booking['booking_id']].assigned_by == 'auto'
+        )
+        return auto_rows, stale_rows
+    
+    def _write_rows(self, auto_rows: List[Dict], stale_rows: List[str]):
+        """
+        Apply collected writes in a constant number of statements and one commit.
+        
+        Upserts go through a single executemany INSERT ... ON CONFLICT DO
+        UPDATE that skips manager rows, deletes through one DELETE. Nothing
+        is written or committed when both lists are empty.
+        """
+        if not auto_rows and not stale_rows:
+            return
+        
+        if auto_rows:
+            stmt = sqlite_insert(RoomAssignment)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[RoomAssignment.booking_id],
+                set_={
+                    'room': stmt.excluded.room,
+                    'date': stmt.excluded.date,
+                    'reason': stmt.excluded.reason,
+                    'updated_at': stmt.excluded.updated_at
+                },
+                where=RoomAssignment.assigned_by == 'auto'
+            )
+            self.db.execute(stmt, auto_rows)
+        
+        if stale_rows:
+            self.db.execute(
+                delete(RoomAssignment).where(RoomAssignment.booking_id.in_(stale_rows))
+            )
+        
+        self.db.commit()
     
     def _mark_room_busy(
         self,
         room: str,
-        start_at: str,
-        end_at: str,
-        busy_until: Dict[str, float]
+        record: BookingRecord,
+        schedule: RoomSchedule
     ):
-        """Mark room(s) as busy until end time."""
-        end_str = end_at
-        if end_str.endswith('Z'):
-            end_str = end_str.replace('Z', '+00:00')
-        end_dt = datetime.fromisoformat(end_str)
-        end_ts = end_dt.timestamp()
-        
-        if room == '02D':
-            # HARD RULE: Merged room blocks BOTH 0 and 2 until end time
-            # This ensures that if 02D is used, neither 0 nor 2 can be used by singles
-            busy_until['0'] = max(busy_until['0'], end_ts)
-            busy_until['2'] = max(busy_until['2'], end_ts)
-        elif room in busy_until:
-            busy_until[room] = max(busy_until[room], end_ts)
-
+        """Mark room(s) as busy for the booking's time range."""
+        # HARD RULE: Merged room 02D blocks BOTH 0 and 2 (handled by the schedule)
+        # Unknown rooms (e.g. UNASSIGNED) don't block anything
+        schedule.mark_busy(room, record.start, record.end)
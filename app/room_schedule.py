@@ -0,0 +1,111 @@
+"""Per-room busy interval index used by the room assigner."""
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from interval_list import IntervalList
+
+
+class RoomSchedule:
+    """
+    Tracks busy intervals for every physical room.
+
+    Each room keeps an IntervalList of disjoint [start, end) intervals
+    (overlapping or touching intervals are merged on insert), so "is this
+    room free for [start, end)" is answered with a binary search in O(log n).
+    The merged room 02D is not a physical room: it always reads and writes
+    both room 0 and room 2.
+    """
+
+    PHYSICAL_ROOMS = ('0', '1', '2', '3', '4', '5', '6')
+
+    def __init__(self):
+        """Create an empty schedule (every room free all day)."""
+        self._busy: Dict[str, IntervalList] = {room: IntervalList() for room in self.PHYSICAL_ROOMS}
+
+    @staticmethod
+    def physical_rooms(room: str) -> Tuple[str, ...]:
+        """Expand a room label to the physical rooms it occupies."""
+        if room == '02D':
+            return ('0', '2')
+        return (room,)
+
+    def blocking_interval(
+        self,
+        room: str,
+        start: float,
+        end: float
+    ) -> Optional[Tuple[float, float]]:
+        """
+        Return the busy interval that overlaps [start, end) in room, if any.
+
+        For 02D the first blocking interval of room 0 or room 2 is returned.
+        Unknown rooms never block.
+        """
+        for physical in self.physical_rooms(room):
+            busy = self._busy.get(physical)
+            if busy is None:
+                continue
+            blocking = busy.blocking(start, end)
+            if blocking is not None:
+                return blocking
+        return None
+
+    def is_free(self, room: str, start: float, end: float) -> bool:
+        """Check if room (or both halves of 02D) is free for [start, end)."""
+        return self.blocking_interval(room, start, end) is None
+
+    def mark_busy(self, room: str, start: float, end: float):
+        """Mark room (or both halves of 02D) as busy for [start, end)."""
+        for physical in self.physical_rooms(room):
+            busy = self._busy.get(physical)
+            if busy is not None:
+                busy.add(start, end)
+
+
+def find_room_conflicts(placements: Iterable[Tuple[str, Any]]) -> List[Tuple[str, Any, Any]]:
+    """
+    Find every pair of bookings that overlap in the same physical room.
+
+    Args:
+        placements: (room, booking) pairs; bookings need ``start`` and ``end``
+            attributes. 02D is expanded to rooms 0 and 2, UNASSIGNED and
+            unknown rooms are ignored.
+
+    Returns:
+        List of (physical_room, first, second) tuples, ordered by the first
+        booking's start time and then the second's. ``first`` started no later
+        than ``second``. A pair that collides in both room 0 and room 2 (two
+        02D bookings) is reported once.
+
+    Runs a sweep line over each room's intervals sorted by start time, keeping
+    the still-running bookings in a min-heap keyed on end time, so the cost is
+    O(n log n + k) for n placements and k reported conflicts.
+    """
+    # Sort once globally; per-room lists inherit the (start, input order) order
+    ordered = sorted(
+        enumerate(placements),
+        key=lambda item: (item[1][1].start, item[0])
+    )
+    by_room: Dict[str, List[Tuple[int, Any]]] = {}
+    for seq, (room, booking) in ordered:
+        for physical in RoomSchedule.physical_rooms(room):
+            if physical in RoomSchedule.PHYSICAL_ROOMS:
+                by_room.setdefault(physical, []).append((seq, booking))
+
+    conflicts = {}
+    for physical in RoomSchedule.PHYSICAL_ROOMS:
+        active: List[Tuple[float, int, Any]] = []
+        for seq, booking in by_room.get(physical, ()):
+            # Drop bookings that ended before this one starts
+            while active and active[0][0] <= booking.start:
+                heapq.heappop(active)
+            for _, other_seq, other in active:
+                if booking.end > other.start and (other_seq, seq) not in conflicts:
+                    conflicts[(other_seq, seq)] = (physical, other, booking)
+            heapq.heappush(active, (booking.end, seq, booking))
+
+    order = {seq: position for position, (seq, _) in enumerate(ordered)}
+    return [
+        conflicts[key]
+        for key in sorted(conflicts, key=lambda pair: (order[pair[0]], order[pair[1]]))
+    ]
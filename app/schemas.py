@@ -1,6 +1,6 @@
 """Pydantic schemas for API requests/responses."""
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 
@@ -37,6 +37,14 @@ class DayResponse(BaseModel):
     date: str  # YYYY-MM-DD
     therapists: List[str]
     events: List[Event]
+    trace: Optional[List[Dict[str, Any]]] = None  # Only with ?trace=1
+
+
+class RangeResponse(BaseModel):
+    """Response schema for GET /api/range."""
+    start: str  # YYYY-MM-DD
+    end: str  # YYYY-MM-DD
+    days: List[DayResponse]
 
 
 class UpdateRoomRequest(BaseModel):
@@ -1,6 +1,10 @@
 """Square API service adapter for FastAPI app."""
+import asyncio
+import functools
 import logging
-from typing import List, Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from dateutil import parser, tz as dateutil_tz
 
@@ -12,7 +16,7 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 try:
-    from square_client import SquareBookingsClient
+    from square_client import SquareBookingsClient, get_request_scheduler, get_single_flight
     from config import Config
     SQUARE_AVAILABLE = True
 except ImportError as e:
@@ -21,89 +25,229 @@ except ImportError as e:
     SquareBookingsClient = None
     Config = None
 
+from app.catalog_index import CatalogIndex
+from app.team_directory import TeamDirectory
+from square_models import Booking
+from ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+# Blocking Square SDK calls made for async endpoints run here, so they never
+# block the event loop and at most SQUARE_IO_WORKERS run at once
+_io_pool = ThreadPoolExecutor(
+    max_workers=Config.SQUARE_IO_WORKERS if Config else 8,
+    thread_name_prefix='square-io'
+)
+
+
+def location_timezone():
+    """Timezone whose days bookings are grouped by: LOCATION_TIMEZONE, else the server's."""
+    name = Config.LOCATION_TIMEZONE if Config else ''
+    if name:
+        tz = dateutil_tz.gettz(name)
+        if tz is not None:
+            return tz
+        logger.warning(f"Unknown LOCATION_TIMEZONE '{name}', using the server's timezone")
+    return dateutil_tz.tzlocal()
+
 
 class SquareService:
     """Service to fetch and convert Square bookings to our format."""
     
+    # Square's BulkRetrieveCustomers accepts up to 100 ids per request
+    CUSTOMER_BATCH_SIZE = 100
+    
+    # Parallel single-customer lookups when the bulk endpoint can't be used
+    CUSTOMER_LOOKUP_CONCURRENCY = 4
+    
+    # How long a customer that could not be resolved (not found, no
+    # permission) is not looked up again
+    CUSTOMER_MISS_TTL_SECONDS = 600
+    
     def __init__(self):
         """Initialize Square service."""
         if not SQUARE_AVAILABLE:
             logger.warning("Square client modules not available. Using mock data.")
             self.client = None
-            self._team_members_cache = {}
-            self._catalog_name_cache = {}
-            self._customer_name_cache = {}
+            self.team_directory = TeamDirectory(lambda: [])
+            self.catalog_index = CatalogIndex(lambda begin_time: ([], None))
+            self._init_caches()
             return
         
         try:
             Config.validate()
             self.client = SquareBookingsClient()
-            self._team_members_cache = {}
-            self._catalog_name_cache = {}
-            self._customer_name_cache = {}
+            self.team_directory = TeamDirectory(
+                self.client.get_team_member_models,
+                ttl_seconds=Config.TEAM_DIRECTORY_TTL_SECONDS
+            )
+            self.catalog_index = CatalogIndex(
+                self.client.search_catalog_items,
+                location_id=Config.SQUARE_LOCATION_ID,
+                couple_pattern=Config.COUPLES_MASSAGE_SERVICE_NAME_PATTERN,
+                couple_variation_id=Config.COUPLES_MASSAGE_SERVICE_ID,
+                ttl_seconds=Config.CATALOG_INDEX_TTL_SECONDS
+            )
+            self._init_caches()
             logger.info("Square API client initialized successfully")
         except (ValueError, AttributeError) as e:
             logger.warning(f"Square API not configured: {e}. Using mock data.")
             self.client = None
-            self._team_members_cache = {}
-            self._catalog_name_cache = {}
-            self._customer_name_cache = {}
+            self.team_directory = TeamDirectory(lambda: [])
+            self.catalog_index = CatalogIndex(lambda begin_time: ([], None))
+            self._init_caches()
+    
+    def _init_caches(self):
+        """Create the bounded name caches (NAME_CACHE_TTL_SECONDS / NAME_CACHE_MAX_ENTRIES)."""
+        ttl_seconds = Config.NAME_CACHE_TTL_SECONDS if Config else 3600
+        max_size = Config.NAME_CACHE_MAX_ENTRIES if Config else 5000
+        self._catalog_name_cache = TTLCache('square.catalog_names', max_size=max_size, ttl_seconds=ttl_seconds)
+        self._customer_name_cache = TTLCache('square.customer_names', max_size=max_size, ttl_seconds=ttl_seconds)
+        # Negative cache: customers that could not be resolved
+        self._customer_misses = TTLCache(
+            'square.customer_misses', max_size=max_size, ttl_seconds=self.CUSTOMER_MISS_TTL_SECONDS
+        )
+        self._customer_api_denied_until = 0.0
+    
+    def warm_start(self, store) -> None:
+        """
+        Restore names, team directory and catalog index saved by a previous run.
+        
+        Args:
+            store: app.lookup_store.LookupStore that also saves later changes
+        """
+        for cache in (self._customer_name_cache, self._catalog_name_cache, self._customer_misses):
+            store.attach(cache)
+        store.attach_snapshot('team_directory', self.team_directory)
+        store.attach_snapshot('catalog_index', self.catalog_index)
+    
+    @staticmethod
+    def request_stats() -> Dict[str, Any]:
+        """Rate limit, retry and throttle counters of the Square request scheduler, plus coalesced reads."""
+        if not SQUARE_AVAILABLE:
+            return {}
+        stats = get_request_scheduler().stats()
+        stats['single_flight'] = get_single_flight().stats()
+        return stats
     
     def get_team_member_name(self, team_member_id: str) -> str:
-        """Get team member name by ID, with caching."""
+        """Get team member name by ID from the shared team directory."""
         if not self.client:
             return team_member_id
         
-        if team_member_id in self._team_members_cache:
-            return self._team_members_cache[team_member_id]
+        return self.team_directory.get_name(team_member_id) or team_member_id
+    
+    def resolve_customer_names(self, bookings: Iterable[Booking]) -> int:
+        """
+        Resolve the customer names of many bookings up front.
         
+        Collects every customer_id not yet cached (or recently missed) and
+        fetches them with BulkRetrieveCustomers in chunks of
+        CUSTOMER_BATCH_SIZE. If the bulk call fails for any reason other than
+        permissions, falls back to single lookups with at most
+        CUSTOMER_LOOKUP_CONCURRENCY in flight. Customers that can't be
+        resolved are remembered as misses so get_customer_name goes straight
+        to its fallback instead of calling Square again.
+        
+        Args:
+            bookings: Normalized bookings
+            
+        Returns:
+            Number of customer names resolved
+        """
+        if not self.client or not getattr(self.client, 'customers_api', None):
+            return 0
+        if time.monotonic() < self._customer_api_denied_until:
+            return 0
+        
+        pending = []
+        seen = set()
+        for booking in bookings:
+            customer_id = booking.customer_id
+            if customer_id and customer_id not in seen and self._should_fetch_customer(customer_id):
+                seen.add(customer_id)
+                pending.append(customer_id)
+        
+        if not pending:
+            return 0
+        
+        customers = {}
+        for i in range(0, len(pending), self.CUSTOMER_BATCH_SIZE):
+            chunk = pending[i:i + self.CUSTOMER_BATCH_SIZE]
+            try:
+                customers.update(self.client.bulk_get_customers(chunk))
+            except Exception as e:
+                if self._is_permission_error(e):
+                    logger.warning(f"[CUSTOMER] Customer API permission denied, not retrying for {self.CUSTOMER_MISS_TTL_SECONDS}s: {e}")
+                    self._customer_api_denied_until = time.monotonic() + self.CUSTOMER_MISS_TTL_SECONDS
+                    for customer_id in pending:
+                        self._customer_misses[customer_id] = True
+                    return 0
+                logger.warning(f"[CUSTOMER] Bulk customer lookup failed ({e}), falling back to single lookups")
+                with ThreadPoolExecutor(max_workers=self.CUSTOMER_LOOKUP_CONCURRENCY) as pool:
+                    for customer_id, customer in zip(chunk, pool.map(self._get_customer_or_none, chunk)):
+                        if customer is not None:
+                            customers[customer_id] = customer
+        
+        resolved = 0
+        for customer_id in pending:
+            name = self._customer_display_name(customers.get(customer_id))
+            if name:
+                self._customer_name_cache[customer_id] = name
+                resolved += 1
+            else:
+                self._customer_misses[customer_id] = True
+        
+        logger.info(f"[CUSTOMER] Resolved {resolved} of {len(pending)} customer names in bulk")
+        return resolved
+    
+    def _get_customer_or_none(self, customer_id: str) -> Any:
+        """get_customer for the single-lookup fallback: a failed lookup counts as unresolved."""
         try:
-            team_members = self.client.get_team_members()
-            for member in team_members:
-                # Handle both dict and Square SDK object formats
-                if isinstance(member, dict):
-                    member_id = member.get('id', '')
-                    given = member.get('given_name', '')
-                    family = member.get('family_name', '')
-                    display = member.get('display_name', '')
-                else:
-                    # Square SDK object
-                    member_id = getattr(member, 'id', '') or ''
-                    given = getattr(member, 'given_name', '') or ''
-                    family = getattr(member, 'family_name', '') or ''
-                    display = getattr(member, 'display_name', '') or ''
-                
-                if member_id == team_member_id:
-                    name = f"{given} {family}".strip() or display or team_member_id
-                    self._team_members_cache[team_member_id] = name
-                    return name
+            return self.client.get_customer(customer_id)
         except Exception as e:
-            logger.error(f"Error fetching team member {team_member_id}: {e}")
-        
-        return team_member_id
+            logger.warning(f"[CUSTOMER] Lookup of {customer_id[:8]}... failed: {e}")
+            return None
     
-    def get_customer_name(self, booking: Dict) -> str:
+    def _should_fetch_customer(self, customer_id: str) -> bool:
+        """Whether customer_id is neither cached nor a recent miss."""
+        return customer_id not in self._customer_name_cache and customer_id not in self._customer_misses
+    
+    @staticmethod
+    def _is_permission_error(error: Exception) -> bool:
+        """Whether a Square error means the token may not read customers."""
+        return getattr(error, 'status_code', None) in (401, 403)
+    
+    @staticmethod
+    def _customer_display_name(customer: Any) -> str:
+        """Name for a Square customer: full name, else email, else phone ('' if none)."""
+        if customer is None:
+            return ""
+        # Customer is a Pydantic model object in new Square SDK
+        # In new SDK, email_address and phone_number are direct strings, not objects
+        given_name = getattr(customer, 'given_name', None) or ''
+        family_name = getattr(customer, 'family_name', None) or ''
+        name = f"{given_name} {family_name}".strip()
+        return name or getattr(customer, 'email_address', None) or getattr(customer, 'phone_number', None) or ''
+    
+    def get_customer_name(self, booking: Booking) -> str:
         """Extract customer name from booking, with caching."""
-        # Handle both dict and Square SDK object formats
-        if isinstance(booking, dict):
-            customer_id = booking.get('customer_id', '')
-            customer_note = booking.get('customer_note', '')
-        else:
-            customer_id = getattr(booking, 'customer_id', '') or ''
-            customer_note = getattr(booking, 'customer_note', '') or ''
+        customer_id = booking.customer_id
+        customer_note = booking.customer_note
         
         # Check cache first
-        if customer_id and customer_id in self._customer_name_cache:
+        cached = self._customer_name_cache.get(customer_id) if customer_id else None
+        if cached is not None:
             logger.debug(f"Using cached customer name for {customer_id[:8]}...")
-            return self._customer_name_cache[customer_id]
+            return cached
         
         # Log what we have
         logger.debug(f"[CUSTOMER] Processing booking - customer_id: {customer_id[:8] if customer_id else 'None'}..., customer_note: {customer_note[:20] if customer_note else 'None'}...")
         
         # Try to fetch customer name from Customer API if available
-        if customer_id and self.client:
+        # (skipped for customers that recently could not be resolved)
+        if customer_id and self.client and self._should_fetch_customer(customer_id) \
+                and time.monotonic() >= self._customer_api_denied_until:
             # Check if customer API is available
             if not hasattr(self.client, 'customers_api') or not self.client.customers_api:
                 logger.debug(f"[CUSTOMER] Customer API not available for {customer_id[:8]}... - will use fallback (customers_api={hasattr(self.client, 'customers_api')})")
@@ -147,37 +291,38 @@ class SquareService:
                         logger.warning(f"[CUSTOMER] Customer data retrieved but no name/email/phone found for {customer_id[:8]}...")
                     else:
                         logger.info(f"[CUSTOMER] Customer API returned None for {customer_id[:8]}... (may need CUSTOMERS_READ permission)")
+                    self._customer_misses[customer_id] = True
                         
                 except Exception as e:
                     # Customer API not available or failed - use fallback
                     logger.warning(f"[CUSTOMER] Exception fetching customer {customer_id[:8]}...: {e}")
+                    if self._is_permission_error(e):
+                        self._customer_api_denied_until = time.monotonic() + self.CUSTOMER_MISS_TTL_SECONDS
+                    self._customer_misses[customer_id] = True
                     import traceback
                     logger.debug(traceback.format_exc())
         
         # Fallback: use customer_note or customer_id
+        # (not cached for recent misses, so they are looked up again once the miss expires)
         if customer_note:
             result = customer_note
-            if customer_id:
+            if customer_id and customer_id not in self._customer_misses:
                 self._customer_name_cache[customer_id] = result
             logger.info(f"[CUSTOMER] Using customer_note: {customer_note[:30]}... for ID {customer_id[:8] if customer_id else 'None'}...")
             return result
         elif customer_id:
             result = f"Customer {customer_id[:8]}"
-            self._customer_name_cache[customer_id] = result
+            if customer_id not in self._customer_misses:
+                self._customer_name_cache[customer_id] = result
             logger.info(f"[CUSTOMER] Using fallback customer ID display for {customer_id[:8]}...")
             return result
         else:
             logger.warning("[CUSTOMER] No customer_id or customer_note found - using 'Unknown Customer'")
             return "Unknown Customer"
     
-    def get_service_name(self, booking: Dict) -> str:
+    def get_service_name(self, booking: Booking) -> str:
         """Extract service name(s) from booking. Returns all services if multiple."""
-        # Handle both dict and Square SDK object formats
-        if isinstance(booking, dict):
-            segments = booking.get('appointment_segments', [])
-        else:
-            # Pydantic object or Square SDK object
-            segments = getattr(booking, 'appointment_segments', []) or []
+        segments = booking.segments
         
         if not segments:
             logger.warning("No appointment_segments found in booking")
@@ -188,18 +333,8 @@ class SquareService:
         
         for segment_idx, segment in enumerate(segments):
             # 1) Try direct name on segment (if Square API returned it)
-            if isinstance(segment, dict):
-                service_name = segment.get('service_variation_name', '') or ''
-                service_variation_id = segment.get('service_variation_id', '') or ''
-            else:
-                # Pydantic object or SDK object - use attribute access first
-                service_name = getattr(segment, 'service_variation_name', '') or ''
-                service_variation_id = getattr(segment, 'service_variation_id', '') or ''
-                # If still empty, try model_dump() for Pydantic v2
-                if hasattr(segment, 'model_dump'):
-                    seg_dict = segment.model_dump()
-                    service_name = service_name or seg_dict.get('service_variation_name', '') or ''
-                    service_variation_id = service_variation_id or seg_dict.get('service_variation_id', '') or ''
+            service_name = segment.service_variation_name
+            service_variation_id = segment.service_variation_id
             
             logger.debug(f"[SERVICE NAME] Segment {segment_idx} has service_variation_name: '{service_name}', service_variation_id: '{service_variation_id}'")
             
@@ -238,268 +373,47 @@ class SquareService:
             return ""
         
         # Cache check
-        if variation_id in self._catalog_name_cache:
-            logger.debug(f"Returning cached service name for {variation_id}: {self._catalog_name_cache[variation_id]}")
-            return self._catalog_name_cache[variation_id]
+        cached = self._catalog_name_cache.get(variation_id)
+        if cached is not None:
+            logger.debug(f"Returning cached service name for {variation_id}: {cached}")
+            return cached
         
+        # Prefetched catalog index (one paginated search, not one call per variation)
+        variation = self.catalog_index.get(variation_id)
+        if variation is not None and variation.name:
+            return variation.name
+        
+        # Not in the index yet (e.g. created since the last refresh): fetch the object itself
         try:
-            # Access underlying Square SDK client
-            if not hasattr(self.client, 'client'):
-                logger.warning("Square client does not have 'client' attribute")
-                return ""
-            
-            if not hasattr(self.client.client, 'catalog'):
-                logger.warning("Square SDK client does not have 'catalog' API - CATALOG_READ permission may be missing")
-                return ""
-            
-            catalog_api = self.client.client.catalog
-            
-            # Helper function to extract attributes from objects/dicts
-            def get_attr(o, key, default=""):
-                if o is None:
-                    return default
-                if isinstance(o, dict):
-                    val = o.get(key, default)
-                    # If default is empty string and we got a dict/None, return empty string
-                    if isinstance(default, str) and default == "" and (val is None or isinstance(val, dict)):
-                        return default if val is None else val
-                    return val
-                val = getattr(o, key, default)
-                # Handle None values when default is empty string
-                if isinstance(default, str) and default == "" and val is None:
-                    return default
-                return val or default
-            
-            # Try to retrieve the catalog object with related objects included
-            # This helps when the variation references a parent item
-            result = None
-            try:
-                # Use catalog.object.get() - the correct Square SDK method
-                if hasattr(catalog_api, 'object') and hasattr(catalog_api.object, 'get'):
-                    result = catalog_api.object.get(object_id=variation_id, include_related_objects=True)
-                    logger.debug(f"Catalog API call successful with include_related_objects=True")
-                else:
-                    logger.error("Catalog API does not have object.get() method")
-                    return ""
-            except Exception as e:
-                try:
-                    # Try without include_related_objects
-                    result = catalog_api.object.get(object_id=variation_id)
-                    logger.debug(f"Catalog API call successful without include_related_objects")
-                except Exception as e2:
-                    logger.error(f"Catalog API call failed: {e}, {e2}")
-                    return ""
-                
-            if result is None:
-                logger.warning(f"Catalog API returned None for variation_id: {variation_id}")
-                return ""
-            
-            # Handle various response formats
-            obj = None
-            related_objects = []
-            
-            if hasattr(result, 'body'):
-                if isinstance(result.body, dict):
-                    obj = result.body.get('object')
-                    related_objects = result.body.get('related_objects', [])
-                else:
-                    # result.body might be an object with attributes
-                    obj = getattr(result.body, 'object', None)
-                    related_objects = getattr(result.body, 'related_objects', []) or []
-            elif hasattr(result, 'object'):
-                obj = result.object
-                related_objects = getattr(result, 'related_objects', []) or []
-            elif isinstance(result, dict):
-                obj = result.get('object')
-                related_objects = result.get('related_objects', [])
-            else:
-                # Try to access as if result itself is the object
-                logger.debug(f"[CATALOG DEBUG] Trying result as object directly")
-                obj = result
-            
-            # Log the raw result structure for debugging
-            if variation_id not in self._catalog_name_cache:
-                logger.info(f"[CATALOG DEBUG] Raw result type: {type(result)}")
-                if hasattr(result, '__dict__'):
-                    logger.info(f"[CATALOG DEBUG] Result attributes: {list(result.__dict__.keys())[:10]}")
-                if hasattr(result, 'body'):
-                    logger.debug(f"[CATALOG DEBUG] Result has 'body' attribute")
-                if hasattr(result, 'object'):
-                    logger.debug(f"[CATALOG DEBUG] Result has 'object' attribute directly")
-            
-            if obj is None:
-                logger.warning(f"[CATALOG DEBUG] Could not extract object from result for variation_id: {variation_id}")
-                # Try to log what we actually got
-                try:
-                    result_str = str(result)[:500]
-                    logger.warning(f"[CATALOG DEBUG] Result content (first 500 chars): {result_str}")
-                except:
-                    pass
-                return ""
-            
-            if obj:
-                    obj_type = get_attr(obj, 'type', '')
-                    logger.info(f"[CATALOG DEBUG] Retrieved object type: {obj_type} for variation_id: {variation_id}")
-                    
-                    # Log the full object structure for debugging (first time only)
-                    if variation_id not in self._catalog_name_cache:
-                        try:
-                            import json
-                            if isinstance(obj, dict):
-                                obj_str = json.dumps(obj, indent=2, default=str)
-                            else:
-                                # Try to convert object to dict
-                                obj_dict = {}
-                                for attr in dir(obj):
-                                    if not attr.startswith('_'):
-                                        try:
-                                            val = getattr(obj, attr)
-                                            if not callable(val):
-                                                obj_dict[attr] = str(val)[:100]  # Limit length
-                                        except:
-                                            pass
-                                obj_str = json.dumps(obj_dict, indent=2, default=str)
-                            logger.info(f"[CATALOG DEBUG] Full object structure:\n{obj_str[:1000]}")  # Limit to first 1000 chars
-                        except Exception as e:
-                            logger.debug(f"Could not serialize object for logging: {e}")
-                    
-                    # For ITEM_VARIATION, try to get name from variation data
-                    if obj_type == 'ITEM_VARIATION':
-                        # Get item_variation_data (can be dict or object)
-                        if isinstance(obj, dict):
-                            item_variation_data = obj.get('item_variation_data')
-                        else:
-                            item_variation_data = getattr(obj, 'item_variation_data', None)
-                        
-                        if item_variation_data:
-                            # Try variation name first
-                            if isinstance(item_variation_data, dict):
-                                name = item_variation_data.get('name', '')
-                            else:
-                                name = getattr(item_variation_data, 'name', '') or ''
-                            
-                            if name:
-                                self._catalog_name_cache[variation_id] = name
-                                logger.debug(f"Found service name from variation: {name}")
-                                return name
-                            
-                            # If no variation name, try to get parent item name
-                            if isinstance(item_variation_data, dict):
-                                item_id = item_variation_data.get('item_id', '')
-                            else:
-                                item_id = getattr(item_variation_data, 'item_id', '') or ''
-                            
-                            if item_id:
-                                # Look in related objects first
-                                for related_obj in related_objects:
-                                    related_id = get_attr(related_obj, 'id', '')
-                                    if related_id == item_id:
-                                        # Get item_data from related object
-                                        if isinstance(related_obj, dict):
-                                            item_data = related_obj.get('item_data')
-                                        else:
-                                            item_data = getattr(related_obj, 'item_data', None)
-                                        
-                                        if item_data:
-                                            if isinstance(item_data, dict):
-                                                item_name = item_data.get('name', '')
-                                            else:
-                                                item_name = getattr(item_data, 'name', '') or ''
-                                            
-                                            if item_name:
-                                                self._catalog_name_cache[variation_id] = item_name
-                                                logger.debug(f"Found service name from related item: {item_name}")
-                                                return item_name
-                                
-                                # If not in related objects, try to fetch the item directly
-                                try:
-                                    # Use catalog.object.get() - the correct Square SDK method
-                                    item_result = catalog_api.object.get(object_id=item_id)  # type: ignore
-                                    
-                                    item_obj = None
-                                    if hasattr(item_result, 'body'):
-                                        if isinstance(item_result.body, dict):
-                                            item_obj = item_result.body.get('object')
-                                        else:
-                                            item_obj = getattr(item_result.body, 'object', None)
-                                    elif hasattr(item_result, 'object'):
-                                        item_obj = item_result.object
-                                    elif isinstance(item_result, dict):
-                                        item_obj = item_result.get('object')
-                                    
-                                    if item_obj:
-                                        # Get item_data from fetched object
-                                        if isinstance(item_obj, dict):
-                                            item_data = item_obj.get('item_data')
-                                        else:
-                                            item_data = getattr(item_obj, 'item_data', None)
-                                        
-                                        if item_data:
-                                            if isinstance(item_data, dict):
-                                                item_name = item_data.get('name', '')
-                                            else:
-                                                item_name = getattr(item_data, 'name', '') or ''
-                                            
-                                            if item_name:
-                                                self._catalog_name_cache[variation_id] = item_name
-                                                logger.debug(f"Found service name from parent item: {item_name}")
-                                                return item_name
-                                except Exception as e:
-                                    logger.debug(f"Could not fetch parent item {item_id}: {e}")
-                    
-                    # For ITEM type, get name from item_data
-                    elif obj_type == 'ITEM':
-                        if isinstance(obj, dict):
-                            item_data = obj.get('item_data')
-                        else:
-                            item_data = getattr(obj, 'item_data', None)
-                        
-                        if item_data:
-                            if isinstance(item_data, dict):
-                                name = item_data.get('name', '')
-                            else:
-                                name = getattr(item_data, 'name', '') or ''
-                            
-                            if name:
-                                self._catalog_name_cache[variation_id] = name
-                                logger.debug(f"Found service name from item: {name}")
-                                return name
-                    
-                    # Fallback: try generic name field
-                    name = get_attr(obj, 'name', '')
-                    if name:
-                        self._catalog_name_cache[variation_id] = name
-                        return name
-                    
-                    # Last resort: try to get name from any related objects
-                    for related_obj in related_objects:
-                        related_type = get_attr(related_obj, 'type', '')
-                        if related_type == 'ITEM':
-                            if isinstance(related_obj, dict):
-                                item_data = related_obj.get('item_data')
-                            else:
-                                item_data = getattr(related_obj, 'item_data', None)
-                            
-                            if item_data:
-                                if isinstance(item_data, dict):
-                                    item_name = item_data.get('name', '')
-                                else:
-                                    item_name = getattr(item_data, 'name', '') or ''
-                                
-                                if item_name:
-                                    self._catalog_name_cache[variation_id] = item_name
-                                    logger.debug(f"Found service name from related object: {item_name}")
-                                    return item_name
+            obj, related_objects = self.client.get_catalog_object_model(variation_id, include_related_objects=True)
         except Exception as e:
             logger.error(f"Catalog lookup failed for variation {variation_id}: {e}")
-            # Log more details for debugging
-            logger.error(f"Exception type: {type(e).__name__}, message: {str(e)}")
-            import traceback
-            logger.debug(f"Traceback: {traceback.format_exc()}")
+            return ""
+        if obj is None:
+            logger.warning(f"Catalog API returned no object for variation_id: {variation_id}")
+            return ""
+        logger.debug(f"[CATALOG] Retrieved {obj.type} for variation_id: {variation_id}")
+        
+        name = obj.name
+        if not name and obj.item_id:
+            # Unnamed variation: use its parent item's name, fetching the item if it wasn't included
+            parent = next((related for related in related_objects if related.id == obj.item_id), None)
+            if parent is None:
+                try:
+                    parent, _ = self.client.get_catalog_object_model(obj.item_id)
+                except Exception as e:
+                    logger.debug(f"Could not fetch parent item {obj.item_id}: {e}")
+            name = parent.name if parent is not None else ''
+        if not name:
+            # Last resort: any related item's name
+            name = next((related.name for related in related_objects if related.type == 'ITEM' and related.name), '')
         
-        return ""
+        if name:
+            self._catalog_name_cache[variation_id] = name
+            logger.debug(f"Found service name from catalog: {name}")
+        return name
     
-    def get_booking_type(self, booking: Dict) -> str:
+    def get_booking_type(self, booking: Booking) -> str:
         """Determine if booking is couple or single."""
         if not self.client:
             return 'single'
@@ -508,6 +422,13 @@ class SquareService:
         if self.client.is_couples_massage(booking):
             return 'couple'
         
+        # Then the catalog index, which also knows the parent item's name
+        for segment in booking.segments:
+            variation_id = segment.service_variation_id
+            variation = self.catalog_index.get(variation_id) if variation_id else None
+            if variation is not None and variation.is_couple:
+                return 'couple'
+        
         # Also check the service name from catalog (in case segment name is empty)
         # This handles cases where service_variation_name is not in the segment
         # but we can get it from the catalog API
@@ -519,142 +440,237 @@ class SquareService:
         
         return 'single'
     
-    def get_bookings_for_date(self, date: str) -> List[Dict]:
+    def get_bookings_for_date(self, date: str, raise_errors: bool = False) -> List[Dict]:
         """
         Get Square bookings for a specific date and convert to our format.
         
         Args:
             date: Date string in YYYY-MM-DD format
+            raise_errors: Raise Square errors instead of returning an empty day
             
         Returns:
             List of booking dicts in our format
         """
+        return self.get_bookings_for_range(date, date, raise_errors=raise_errors).get(date, [])
+    
+    def get_bookings_for_range(
+        self,
+        start_date: str,
+        end_date: str,
+        raise_errors: bool = False
+    ) -> Dict[str, List[Dict]]:
+        """
+        Get Square bookings for every date from start_date to end_date (inclusive).
+        
+        The whole range is fetched with one paginated list call (or one per
+        31 days, Square's limit), converted a page at a time, and the
+        bookings are split by the day they start on in the location's
+        timezone (LOCATION_TIMEZONE).
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format
+            raise_errors: Raise Square errors (e.g. SquareRequestError when a
+                page still fails after retries) instead of returning the
+                days as empty or partly filled
+            
+        Returns:
+            Dict of date -> list of booking dicts in our format, sorted by
+            start time (every date in the range is present)
+        """
+        bookings_by_date, start_at_min, start_at_max = self._range_window(start_date, end_date)
+        
         if not self.client:
             logger.warning("Square API not configured, returning empty list")
-            return []
+            return bookings_by_date
         
         try:
-            # Parse date and create time range
-            # Convert the date to local timezone first, then to UTC
-            # This ensures we get all appointments for the local day
-            local_tz = dateutil_tz.tzlocal()
+            # Fetch bookings from Square
+            converted_bookings = []
+            for page in self.client.iter_booking_pages(start_at_min=start_at_min, start_at_max=start_at_max):
+                converted_bookings.extend(self._convert_bookings(page))
             
-            # Parse date as local date
-            date_obj = datetime.strptime(date, '%Y-%m-%d')
-            # Set to local timezone (start of day)
-            local_start = date_obj.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=local_tz)
-            local_end = local_start + timedelta(days=1)
+            self._split_by_day(converted_bookings, bookings_by_date)
             
-            # Convert to UTC for API query
-            start_at_min = local_start.astimezone(dateutil_tz.UTC).isoformat().replace('+00:00', 'Z')
-            start_at_max = local_end.astimezone(dateutil_tz.UTC).isoformat().replace('+00:00', 'Z')
+            logger.info(f"Fetched {len(converted_bookings)} bookings for {start_date} to {end_date}")
+            return bookings_by_date
             
-            # Fetch bookings from Square
-            square_bookings = self.client.list_bookings(
-                start_at_min=start_at_min,
-                start_at_max=start_at_max
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Error fetching bookings from Square: {e}", exc_info=True)
+            return bookings_by_date
+    
+    async def run_io(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Square call on the bounded I/O pool and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_io_pool, functools.partial(func, *args, **kwargs))
+    
+    async def get_bookings_for_date_async(self, date: str, raise_errors: bool = False) -> List[Dict]:
+        """get_bookings_for_date without blocking the event loop."""
+        bookings_by_date = await self.get_bookings_for_range_async(date, date, raise_errors=raise_errors)
+        return bookings_by_date.get(date, [])
+    
+    async def get_bookings_for_range_async(
+        self,
+        start_date: str,
+        end_date: str,
+        raise_errors: bool = False
+    ) -> Dict[str, List[Dict]]:
+        """
+        get_bookings_for_range without blocking the event loop.
+        
+        The first bookings page, the team directory and the catalog index are
+        independent, so they are fetched concurrently on the I/O pool. Each
+        page is then converted (with its bulk customer lookup) while the next
+        page is fetched.
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format
+            raise_errors: Raise Square errors instead of returning empty days
+                (for callers that cache the result)
+        """
+        bookings_by_date, start_at_min, start_at_max = self._range_window(start_date, end_date)
+        
+        if not self.client:
+            logger.warning("Square API not configured, returning empty list")
+            return bookings_by_date
+        
+        try:
+            pages = self.client.iter_booking_pages(start_at_min=start_at_min, start_at_max=start_at_max)
+            page, _, _ = await asyncio.gather(
+                self.run_io(next, pages, None),
+                self.run_io(self.team_directory.ensure_loaded),
+                self.run_io(self.catalog_index.ensure_loaded)
             )
             
-            # Filter out cancelled bookings (handle both dict and object formats)
-            active_bookings = []
-            for b in square_bookings:
-                if isinstance(b, dict):
-                    status = b.get('status', '')
-                else:
-                    status = getattr(b, 'status', '') or ''
-                
-                if status not in ['CANCELLED_BY_CUSTOMER', 'CANCELLED_BY_SELLER', 'DECLINED']:
-                    active_bookings.append(b)
-            
-            # Convert to our format
             converted_bookings = []
-            for booking in active_bookings:
-                try:
-                    # Handle both dict and Square SDK object formats
-                    if isinstance(booking, dict):
-                        booking_id = booking.get('id', '')
-                        start_at = booking.get('start_at', '')
-                        segments = booking.get('appointment_segments', [])
-                        customer_id = booking.get('customer_id', '')
-                        customer_note = booking.get('customer_note', '')
-                        status = booking.get('status', 'ACCEPTED')
-                    else:
-                        # Square SDK object
-                        booking_id = getattr(booking, 'id', '') or ''
-                        start_at = getattr(booking, 'start_at', '') or ''
-                        segments = getattr(booking, 'appointment_segments', []) or []
-                        customer_id = getattr(booking, 'customer_id', '') or ''
-                        customer_note = getattr(booking, 'customer_note', '') or ''
-                        status = getattr(booking, 'status', 'ACCEPTED') or 'ACCEPTED'
-                    
-                    if not segments:
-                        continue
-                    
-                    # Get segment info (handle both formats)
-                    # For multiple services, sum all durations
-                    segment = segments[0]
-                    if isinstance(segment, dict):
-                        team_member_id = segment.get('team_member_id', '')
-                        duration_minutes = segment.get('duration_minutes', 60)
-                    else:
-                        team_member_id = getattr(segment, 'team_member_id', '') or ''
-                        duration_minutes = getattr(segment, 'duration_minutes', 60) or 60
-                    
-                    # Sum durations from all segments (for multiple services)
-                    total_duration_minutes = duration_minutes
-                    if len(segments) > 1:
-                        for seg in segments[1:]:
-                            if isinstance(seg, dict):
-                                seg_duration = seg.get('duration_minutes', 0)
-                            else:
-                                seg_duration = getattr(seg, 'duration_minutes', 0) or 0
-                            total_duration_minutes += seg_duration
-                        logger.debug(f"Multiple services detected: {len(segments)} segments, total duration: {total_duration_minutes} minutes")
-                    
-                    # Parse times
-                    if not start_at:
-                        continue
-                    
-                    start_dt = parser.parse(str(start_at))
-                    end_dt = start_dt + timedelta(minutes=total_duration_minutes)
-                    
-                    # Get therapist name
-                    therapist_name = self.get_team_member_name(team_member_id)
-                    
-                    # Get customer name
-                    customer_name = self.get_customer_name(booking)
-                    
-                    # Get service name
-                    service_name = self.get_service_name(booking)
-                    
-                    # Determine type
-                    booking_type = self.get_booking_type(booking)
-                    
-                    converted_booking = {
-                        'id': booking_id,
-                        'start_at': start_dt.isoformat(),
-                        'end_at': end_dt.isoformat(),
-                        'therapist': therapist_name,
-                        'service': service_name,
-                        'customer': customer_name,
-                        'type': booking_type,
-                        'status': status
-                    }
-                    
-                    converted_bookings.append(converted_booking)
-                    
-                except Exception as e:
-                    booking_id_str = booking.get('id', 'Unknown') if isinstance(booking, dict) else getattr(booking, 'id', 'Unknown')
-                    logger.error(f"Error converting booking {booking_id_str}: {e}")
-                    continue
+            conversion = None
+            while page is not None:
+                # At most one page converting while the next is fetched
+                if conversion is not None:
+                    converted_bookings.extend(await conversion)
+                conversion = asyncio.ensure_future(self.run_io(self._convert_bookings, page))
+                page = await self.run_io(next, pages, None)
+            if conversion is not None:
+                converted_bookings.extend(await conversion)
             
-            # Sort by start time
-            converted_bookings.sort(key=lambda b: b['start_at'])
+            self._split_by_day(converted_bookings, bookings_by_date)
             
-            logger.info(f"Fetched {len(converted_bookings)} bookings for {date}")
-            return converted_bookings
+            logger.info(f"Fetched {len(converted_bookings)} bookings for {start_date} to {end_date}")
+            return bookings_by_date
             
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error fetching bookings from Square: {e}", exc_info=True)
-            return []
-
+            return bookings_by_date
+    
+    @staticmethod
+    def _range_window(start_date: str, end_date: str) -> Tuple[Dict[str, List[Dict]], str, str]:
+        """
+        Empty per-day lists for the range plus the UTC window to list bookings in.
+        
+        Returns:
+            Tuple of ({date: []} for every date, start_at_min, start_at_max)
+        """
+        first_day = datetime.strptime(start_date, '%Y-%m-%d')
+        last_day = datetime.strptime(end_date, '%Y-%m-%d')
+        bookings_by_date = {
+            (first_day + timedelta(days=offset)).strftime('%Y-%m-%d'): []
+            for offset in range((last_day - first_day).days + 1)
+        }
+        
+        # Parse dates and create time range
+        # Convert the dates to the location's timezone first, then to UTC
+        # This ensures we get all appointments for the location's days
+        local_tz = location_timezone()
+        
+        # Set to local timezone (start of first day, end of last day)
+        local_start = first_day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=local_tz)
+        local_end = last_day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=local_tz) + timedelta(days=1)
+        
+        # Convert to UTC for API query
+        start_at_min = local_start.astimezone(dateutil_tz.UTC).isoformat().replace('+00:00', 'Z')
+        start_at_max = local_end.astimezone(dateutil_tz.UTC).isoformat().replace('+00:00', 'Z')
+        return bookings_by_date, start_at_min, start_at_max
+    
+    @staticmethod
+    def _split_by_day(converted_bookings: List[Dict], bookings_by_date: Dict[str, List[Dict]]):
+        """Sort converted bookings by start time and append each to its day in the location's timezone."""
+        local_tz = location_timezone()
+        converted_bookings.sort(key=lambda b: b['start_at'])
+        for booking in converted_bookings:
+            local_date = parser.parse(booking['start_at']).astimezone(local_tz).strftime('%Y-%m-%d')
+            if local_date in bookings_by_date:
+                bookings_by_date[local_date].append(booking)
+    
+    def _convert_bookings(self, square_bookings: List[Booking]) -> List[Dict]:
+        """
+        Drop cancelled bookings and convert the rest to our format.
+        
+        Args:
+            square_bookings: Normalized bookings from SquareBookingsClient.list_booking_models
+            
+        Returns:
+            List of booking dicts in our format (in Square order)
+        """
+        # Filter out cancelled bookings
+        active_bookings = [b for b in square_bookings if not b.is_cancelled]
+        
+        # Convert to our format
+        # Look up all customers of these bookings together
+        self.resolve_customer_names(active_bookings)
+        
+        converted_bookings = []
+        for booking in active_bookings:
+            try:
+                segments = booking.segments
+                if not segments:
+                    continue
+                
+                # For multiple services, sum all durations
+                team_member_id = segments[0].team_member_id
+                total_duration_minutes = booking.duration_minutes
+                if len(segments) > 1:
+                    logger.debug(f"Multiple services detected: {len(segments)} segments, total duration: {total_duration_minutes} minutes")
+                
+                # Parse times
+                if not booking.start_at:
+                    continue
+                
+                start_dt = parser.parse(booking.start_at)
+                end_dt = start_dt + timedelta(minutes=total_duration_minutes)
+                
+                # Get therapist name
+                therapist_name = self.get_team_member_name(team_member_id)
+                
+                # Get customer name
+                customer_name = self.get_customer_name(booking)
+                
+                # Get service name
+                service_name = self.get_service_name(booking)
+                
+                # Determine type
+                booking_type = self.get_booking_type(booking)
+                
+                converted_booking = {
+                    'id': booking.id,
+                    'start_at': start_dt.isoformat(),
+                    'end_at': end_dt.isoformat(),
+                    'therapist': therapist_name,
+                    'service': service_name,
+                    'customer': customer_name,
+                    'type': booking_type,
+                    'status': booking.status,
+                    'version': booking.version
+                }
+                
+                converted_bookings.append(converted_booking)
+                
+            except Exception as e:
+                logger.error(f"Error converting booking {booking.id or 'Unknown'}: {e}")
+                continue
+        
+        return converted_bookings
@@ -0,0 +1,164 @@
+"""Shared Square team-member directory with TTL and background refresh."""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from square_models import TeamMember
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a person's name for lookups (lowercase, single spaces)."""
+    if not name:
+        return ""
+    return " ".join(name.lower().strip().split())
+
+
+class TeamDirectory:
+    """
+    All active team members, indexed by id and by normalized name.
+
+    The directory is loaded with one team search the first time it is used.
+    After that, lookups never wait on Square. Once the snapshot is older
+    than ``ttl_seconds``, or an unknown id is looked up, a refresh starts in
+    a background thread and readers keep using the current snapshot until
+    the new one is swapped in.
+
+    ``snapshot``/``restore`` let the directory be saved across restarts; if
+    ``listener`` is set it is called after every successful load.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[Any]],
+        ttl_seconds: float = 300,
+        min_refresh_interval: float = 30
+    ):
+        """
+        Create a directory.
+
+        Args:
+            loader: Returns the current team members (e.g. client.get_team_member_models)
+            ttl_seconds: Age after which the snapshot is refreshed in the background
+            min_refresh_interval: Minimum seconds between refreshes triggered by
+                unknown ids, so a stray id can't cause a team search per request
+        """
+        self._loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self._names_by_id: Dict[str, str] = {}
+        self._ids_by_name: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._load_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.listener: Optional[Callable[[], None]] = None
+
+    def get_name(self, member_id: str) -> Optional[str]:
+        """Return the display name for member_id, or None if it is not in the directory."""
+        self.ensure_loaded()
+        name = self._names_by_id.get(member_id)
+        if name is None and member_id:
+            # Possibly a new hire: look again soon, without blocking this request
+            if time.monotonic() - (self._loaded_at or 0) >= self.min_refresh_interval:
+                self.refresh_in_background()
+        return name
+
+    def find_id(self, name: str) -> Optional[str]:
+        """Return the id of the team member with this name (case/space-insensitive)."""
+        self.ensure_loaded()
+        return self._ids_by_name.get(normalize_name(name))
+
+    def names(self) -> List[str]:
+        """Return the display names of all team members."""
+        self.ensure_loaded()
+        return list(self._names_by_id.values())
+
+    def refresh(self) -> int:
+        """
+        Reload the directory now.
+
+        Returns:
+            Number of team members in the directory after the refresh
+        """
+        with self._load_lock:
+            self._load()
+        return len(self._names_by_id)
+
+    def refresh_in_background(self):
+        """Start a refresh in a daemon thread unless one is already running."""
+        with self._thread_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self.refresh, name='team-directory-refresh', daemon=True
+            )
+            self._refresh_thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the directory as JSON-friendly data for restore()."""
+        return {'names_by_id': dict(self._names_by_id)}
+
+    def restore(self, data: Dict[str, Any], age_seconds: float = 0) -> bool:
+        """
+        Use a saved snapshot instead of loading from Square, unless already loaded.
+
+        Args:
+            data: Output of snapshot()
+            age_seconds: How long ago the snapshot was taken; it counts
+                towards ttl_seconds, so an old snapshot is refreshed soon
+
+        Returns:
+            True if the snapshot was used
+        """
+        names_by_id = data.get('names_by_id') or {}
+        with self._load_lock:
+            if self._loaded_at is not None or not names_by_id:
+                return False
+            ids_by_name = {}
+            for member_id, name in names_by_id.items():
+                ids_by_name.setdefault(normalize_name(name), member_id)
+            self._names_by_id = dict(names_by_id)
+            self._ids_by_name = ids_by_name
+            self._loaded_at = time.monotonic() - max(age_seconds, 0)
+        logger.info(f"Team directory restored {len(names_by_id)} team members from snapshot")
+        return True
+
+    def ensure_loaded(self):
+        """Load synchronously on first use, refresh in the background when stale."""
+        if self._loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self._load()
+        elif time.monotonic() - self._loaded_at >= self.ttl_seconds:
+            self.refresh_in_background()
+
+    def _load(self):
+        """Fetch all team members and swap in new indexes (caller holds _load_lock)."""
+        try:
+            members = self._loader() or []
+        except Exception as e:
+            logger.error(f"Error loading team directory: {e}")
+            members = []
+
+        names_by_id = {}
+        ids_by_name = {}
+        for member in map(TeamMember.from_square, members):
+            if not member.id:
+                continue
+            name = member.name
+            names_by_id[member.id] = name
+            ids_by_name.setdefault(normalize_name(name), member.id)
+
+        if not names_by_id and self._names_by_id:
+            # A failed or empty load keeps the last good snapshot
+            logger.warning("Team directory refresh returned no members, keeping previous snapshot")
+        else:
+            self._names_by_id = names_by_id
+            self._ids_by_name = ids_by_name
+            logger.info(f"Team directory loaded {len(names_by_id)} team members")
+        self._loaded_at = time.monotonic()
+        if names_by_id and self.listener is not None:
+            self.listener()
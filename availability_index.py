@@ -0,0 +1,70 @@
+"""Per-team-member busy interval index built from one location-wide booking scan."""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable
+
+from dateutil import parser
+
+from interval_list import IntervalList
+from square_models import Booking
+
+
+class AvailabilityIndex:
+    """
+    Busy intervals of every team member between window_start and window_end.
+
+    Built from all of the location's bookings in the window (one paginated
+    list call), instead of one list call per candidate therapist. Each
+    appointment segment blocks its own team member for its own part of the
+    booking, so multi-service bookings handed between therapists are
+    tracked correctly. Like RoomSchedule, each member keeps an IntervalList
+    of merged [start, end) intervals, so is_free is a binary search.
+
+    ``mark_busy`` records bookings made after the scan (e.g. a secondary
+    block just created), so one index can serve several couple bookings.
+    """
+
+    def __init__(self, window_start: datetime, window_end: datetime):
+        """Create an empty index for [window_start, window_end)."""
+        self.window_start = window_start
+        self.window_end = window_end
+        self._busy: Dict[str, IntervalList] = {}
+
+    @classmethod
+    def from_bookings(
+        cls,
+        bookings: Iterable[Booking],
+        window_start: datetime,
+        window_end: datetime
+    ) -> 'AvailabilityIndex':
+        """Build an index for the window from normalized bookings."""
+        index = cls(window_start, window_end)
+        for booking in bookings:
+            index.add_booking(booking)
+        return index
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies inside the scanned window."""
+        return self.window_start <= start and end <= self.window_end
+
+    def add_booking(self, booking: Booking):
+        """Mark each segment's team member busy for that segment (cancelled bookings are skipped)."""
+        if booking.is_cancelled or not booking.start_at:
+            return
+        segment_start = parser.parse(booking.start_at)
+        for segment in booking.segments:
+            segment_end = segment_start + timedelta(minutes=segment.duration_minutes)
+            if segment.team_member_id:
+                self.mark_busy(segment.team_member_id, segment_start, segment_end)
+            segment_start = segment_end
+
+    def mark_busy(self, member_id: str, start: datetime, end: datetime):
+        """Mark member_id busy for [start, end), merging with touching intervals."""
+        busy = self._busy.get(member_id)
+        if busy is None:
+            busy = self._busy[member_id] = IntervalList()
+        busy.add(start.timestamp(), end.timestamp())
+
+    def is_free(self, member_id: str, start: datetime, end: datetime) -> bool:
+        """Whether member_id has no booking overlapping [start, end)."""
+        busy = self._busy.get(member_id)
+        return busy is None or busy.is_free(start.timestamp(), end.timestamp())
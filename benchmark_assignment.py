@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+"""
+Benchmark room assignment: app RoomAssigner vs the legacy RoomAssignment.
+
+Generates reproducible days (fixed seed) of 10 to 10,000 bookings with
+different couple/single mixes and manager-override ratios, and measures for
+each implementation:
+
+- throughput (bookings per second, median of --repeat runs)
+- peak memory allocated during the run (tracemalloc, separate run)
+- number of SQL statements executed
+
+Implementations:
+
+- app:           app.room_assigner.RoomAssigner.assign_rooms on in-memory SQLite
+- app_unchanged: the same call again with unchanged inputs (cached day path)
+- legacy:        room_assignment.RoomAssignment.assign_rooms (sqlite3, temp file)
+
+Results can be saved as a JSON baseline (--save-baseline) and later runs
+compared against it (--baseline); the script exits with status 1 when a case
+is slower or uses more memory than the baseline by more than --tolerance, or
+issues more SQL statements.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dateutil import parser as date_parser
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import database as legacy_database
+from app.assignment_engines import COUPLE_PRIORITY, SINGLE_PRIORITY
+from app.database import Base
+from app.mock_square import MockSquareService
+from app.models import RoomAssignment as AssignmentRow
+from app.room_assigner import RoomAssigner
+from room_assignment import RoomAssignment as LegacyRoomAssignment
+
+BENCHMARK_DATE = '2026-01-06'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+IMPLEMENTATIONS = ['app', 'app_unchanged', 'legacy']
+
+
+def generate_day(size, couple_ratio, manager_ratio, seed):
+    """
+    Generate one day of bookings plus the manager overrides for it.
+
+    Returns:
+        Tuple of (bookings in MockSquareService format, {booking_id: room})
+    """
+    bookings = MockSquareService().generate_bookings(
+        BENCHMARK_DATE, size, couple_ratio=couple_ratio, seed=seed
+    )
+    rng = random.Random(seed + 1)
+    overrides = {
+        booking['id']: rng.choice(COUPLE_PRIORITY if booking['type'] == 'couple' else SINGLE_PRIORITY)
+        for booking in bookings
+        if rng.random() < manager_ratio
+    }
+    return bookings, overrides
+
+
+class AppRunner:
+    """Runs app.room_assigner.RoomAssigner against a fresh in-memory database."""
+
+    # Warm-up runs allowed before an unchanged day must be served from the cache
+    MAX_SETTLE_RUNS = 5
+
+    def __init__(self, bookings, overrides, unchanged=False):
+        self.bookings = bookings
+        self.overrides = overrides
+        self.unchanged = unchanged
+        self.statements = 0
+
+    def setup(self):
+        """Create the database and manager rows; settle the day cache if needed."""
+        RoomAssigner.clear_cache()
+        engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        for booking_id, room in self.overrides.items():
+            self.db.add(AssignmentRow(
+                booking_id=booking_id, room=room, assigned_by='manager', date=BENCHMARK_DATE
+            ))
+        self.db.commit()
+        event.listen(engine, 'before_cursor_execute', self._count_statement)
+        if self.unchanged:
+            self._settle()
+        self.statements = 0
+        self.payload = self._assignment_bookings()
+
+    def _settle(self):
+        """
+        Assign until a run only reads (the cached day path).
+
+        The first run deletes manager rows that lose a conflict, which
+        changes the inputs, so one warm-up run is not always enough.
+        """
+        for _ in range(self.MAX_SETTLE_RUNS):
+            self.statements = 0
+            RoomAssigner(self.db).assign_rooms(self._assignment_bookings(), BENCHMARK_DATE)
+            if self.statements == 1:
+                return
+        raise RuntimeError(f"Day still writing after {self.MAX_SETTLE_RUNS} warm-up runs")
+
+    def _assignment_bookings(self):
+        return [
+            {
+                'booking_id': booking['id'],
+                'therapist': booking['therapist'],
+                'start_at': booking['start_at'],
+                'end_at': booking['end_at'],
+                'customer': booking['customer'],
+                'service': booking['service'],
+                'type': booking['type']
+            }
+            for booking in self.bookings
+        ]
+
+    def _count_statement(self, *args):
+        self.statements += 1
+
+    def run(self):
+        RoomAssigner(self.db).assign_rooms(self.payload, BENCHMARK_DATE)
+
+    def teardown(self):
+        self.db.close()
+        RoomAssigner.clear_cache()
+
+
+class LegacyRunner:
+    """Runs the legacy room_assignment.RoomAssignment against a temporary SQLite file."""
+
+    def __init__(self, bookings, overrides):
+        self.bookings = bookings
+        self.overrides = overrides
+        self.statements = 0
+
+    def setup(self):
+        """Point the legacy database module at a temp file and add manager rows."""
+        self.tmp_dir = tempfile.mkdtemp(prefix='room_benchmark_')
+        self.saved_path = legacy_database.DB_PATH
+        self.saved_connection = legacy_database.get_db_connection
+        legacy_database.DB_PATH = os.path.join(self.tmp_dir, 'room_assignments.db')
+        legacy_database.init_database()
+        for booking_id, room in self.overrides.items():
+            legacy_database.save_room_assignment(booking_id, room, 'manager', BENCHMARK_DATE)
+        legacy_database.get_db_connection = self._counting_connection
+        self.statements = 0
+        # Skip __init__: it builds a Square client that assign_rooms never uses
+        self.assigner = LegacyRoomAssignment.__new__(LegacyRoomAssignment)
+        self.payload = [
+            {
+                'id': booking['id'],
+                'start_at': booking['start_at'],
+                'start_dt': date_parser.parse(booking['start_at']),
+                'end_dt': date_parser.parse(booking['end_at']),
+                'type': booking['type']
+            }
+            for booking in self.bookings
+        ]
+
+    @contextmanager
+    def _counting_connection(self):
+        """database.get_db_connection with a statement counter attached."""
+        conn = sqlite3.connect(legacy_database.DB_PATH)
+        conn.row_factory = sqlite3.Row
+        conn.set_trace_callback(self._count_statement)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _count_statement(self, statement):
+        # COMMIT/ROLLBACK are traced too; count only real statements
+        if not statement.startswith(('COMMIT', 'ROLLBACK', 'BEGIN')):
+            self.statements += 1
+
+    def run(self):
+        self.assigner.assign_rooms([dict(booking) for booking in self.payload], BENCHMARK_DATE)
+
+    def teardown(self):
+        legacy_database.get_db_connection = self.saved_connection
+        legacy_database.DB_PATH = self.saved_path
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def make_runner(implementation, bookings, overrides):
+    if implementation == 'legacy':
+        return LegacyRunner(bookings, overrides)
+    return AppRunner(bookings, overrides, unchanged=(implementation == 'app_unchanged'))
+
+
+def measure(implementation, bookings, overrides, repeat):
+    """Time, trace memory and count statements for one implementation on one day."""
+    timings = []
+    statements = None
+    for _ in range(repeat):
+        runner = make_runner(implementation, bookings, overrides)
+        runner.setup()
+        try:
+            started = time.perf_counter()
+            runner.run()
+            timings.append(time.perf_counter() - started)
+            statements = runner.statements
+        finally:
+            runner.teardown()
+
+    # Separate run for memory: tracemalloc slows everything down
+    runner = make_runner(implementation, bookings, overrides)
+    runner.setup()
+    try:
+        tracemalloc.start()
+        runner.run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        runner.teardown()
+
+    seconds = statistics.median(timings)
+    return {
+        'bookings': len(bookings),
+        'seconds': round(seconds, 6),
+        'bookings_per_second': round(len(bookings) / seconds, 1) if seconds else None,
+        'peak_kib': round(peak / 1024, 1),
+        'sql_statements': statements
+    }
+
+
+def case_key(implementation, size, couple_ratio, manager_ratio):
+    return f"{implementation}/size={size}/couples={couple_ratio:.2f}/managers={manager_ratio:.2f}"
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions against baseline results."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions.append(
+                f"{key}: {current['seconds'] * 1000:.2f} ms vs baseline {previous['seconds'] * 1000:.2f} ms"
+            )
+        if current['peak_kib'] > previous['peak_kib'] * (1 + tolerance):
+            regressions.append(
+                f"{key}: peak {current['peak_kib']:.1f} KiB vs baseline {previous['peak_kib']:.1f} KiB"
+            )
+        if current['sql_statements'] > previous['sql_statements']:
+            regressions.append(
+                f"{key}: {current['sql_statements']} SQL statements vs baseline {previous['sql_statements']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Bookings per generated day')
+    parser.add_argument('--couple-ratios', type=float, nargs='+', default=[0.2, 0.5],
+                        help='Fraction of couple bookings')
+    parser.add_argument('--manager-ratios', type=float, nargs='+', default=[0.0, 0.1],
+                        help='Fraction of bookings with a manager override')
+    parser.add_argument('--implementations', nargs='+', choices=IMPLEMENTATIONS, default=IMPLEMENTATIONS,
+                        help='Implementations to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (median is reported)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for generated days')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown / memory growth before a case counts as a regression')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    # Assignment logs (unassigned summaries, override conflicts) would drown the table
+    logging.disable(logging.CRITICAL)
+
+    print("=" * 100)
+    print(f"Room assignment benchmark (seed {args.seed}, median of {args.repeat} runs)")
+    print("=" * 100)
+    print(f"{'implementation':<14} {'size':>6} {'couples':>8} {'managers':>9} | "
+          f"{'ms':>10} {'bookings/s':>12} {'peak KiB':>10} {'SQL':>7}")
+    print("-" * 100)
+
+    results = {}
+    for size in args.sizes:
+        for couple_ratio in args.couple_ratios:
+            for manager_ratio in args.manager_ratios:
+                bookings, overrides = generate_day(size, couple_ratio, manager_ratio, args.seed + size)
+                for implementation in args.implementations:
+                    result = measure(implementation, bookings, overrides, args.repeat)
+                    results[case_key(implementation, size, couple_ratio, manager_ratio)] = result
+                    print(f"{implementation:<14} {size:>6} {couple_ratio:>8.2f} {manager_ratio:>9.2f} | "
+                          f"{result['seconds'] * 1000:>10.2f} {result['bookings_per_second'] or 0:>12.0f} "
+                          f"{result['peak_kib']:>10.1f} {result['sql_statements']:>7}")
+    print("-" * 100)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (run with --save-baseline to create one)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get('results', {}), args.tolerance)
+    if regressions:
+        print(f"REGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,13 @@
 """Core logic for syncing couple's massage bookings."""
 import logging
-from typing import Optional, Dict
+from datetime import timedelta
+from typing import Optional
+from dateutil import parser
+from config import Config
+from request_scheduler import SquareRequestError
 from square_client import SquareBookingsClient
+from square_models import Booking
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +20,25 @@ class BookingSync:
         self.client = SquareBookingsClient()
         # Store mapping of original booking ID to secondary booking ID
         self.booking_mappings = {}
+        # Team member list, shared by all webhooks until it expires
+        self._team_members = TTLCache(
+            'booking_sync.team_members', max_size=1, ttl_seconds=Config.TEAM_DIRECTORY_TTL_SECONDS
+        )
+        # Optional AvailabilityIndex shared by the bookings of one poll cycle;
+        # without it each couple booking scans its own time slot
+        self.availability = None
     
-    def process_new_booking(self, booking_id: str) -> Optional[Dict]:
+    def get_team_members(self):
+        """Get all team members, from the cache when it is fresh."""
+        members = self._team_members.get('all')
+        if members is None:
+            members = self.client.get_team_member_models()
+            # Don't cache an empty team (the location may not be set up yet)
+            if members:
+                self._team_members.set('all', members)
+        return members
+    
+    def process_new_booking(self, booking_id: str) -> Optional[Booking]:
         """
         Process a new booking and create a secondary block if it's a couple's massage.
         
@@ -24,16 +47,21 @@ class BookingSync:
             
         Returns:
             The secondary booking if created, None otherwise
+        
+        Raises:
+            SquareRequestError: Square could not be read (e.g. the
+                availability scan was throttled); the booking is not settled
+                and should be processed again later
         """
         try:
             # Get the booking details
-            booking = self.client.get_booking(booking_id)
+            booking = self.client.get_booking_model(booking_id)
             if not booking:
                 logger.error(f"Could not retrieve booking {booking_id}")
                 return None
             
             # Check if this is already a secondary booking (avoid recursion)
-            if booking.get('customer_note', '').startswith('SYNC_BLOCK:'):
+            if booking.customer_note.startswith('SYNC_BLOCK:'):
                 logger.info(f"Booking {booking_id} is already a secondary block, skipping")
                 return None
             
@@ -43,19 +71,19 @@ class BookingSync:
                 return None
             
             # Get the primary therapist (first appointment segment)
-            segments = booking.get('appointment_segments', [])
+            segments = booking.segments
             if not segments:
                 logger.warning(f"Booking {booking_id} has no appointment segments")
                 return None
             
-            primary_therapist_id = segments[0].get('team_member_id')
+            primary_therapist_id = segments[0].team_member_id
             if not primary_therapist_id:
                 logger.warning(f"Booking {booking_id} has no team member assigned")
                 return None
             
             # Get booking details
-            start_at = booking.get('start_at')
-            duration_minutes = segments[0].get('duration_minutes', 60)
+            start_at = booking.start_at
+            duration_minutes = segments[0].duration_minutes
             
             # Check if we've already created a secondary booking for this
             if booking_id in self.booking_mappings:
@@ -66,7 +94,9 @@ class BookingSync:
             available_therapist = self.client.get_available_team_member(
                 start_at=start_at,
                 duration_minutes=duration_minutes,
-                exclude_team_member_id=primary_therapist_id
+                exclude_team_member_id=primary_therapist_id,
+                team_members=self.get_team_members(),
+                availability=self.availability
             )
             
             if not available_therapist:
@@ -80,12 +110,12 @@ class BookingSync:
             from square.client.models import AppointmentSegment
             
             original_segment = segments[0]
-            service_variation_id = original_segment.get('service_variation_id')
-            service_variation_version = original_segment.get('service_variation_version', 1)
+            service_variation_id = original_segment.service_variation_id or None
+            service_variation_version = original_segment.service_variation_version or 1
             
             secondary_segments = [
                 AppointmentSegment(
-                    team_member_id=available_therapist.get('id'),
+                    team_member_id=available_therapist.id,
                     service_variation_id=service_variation_id,
                     service_variation_version=service_variation_version,
                     duration_minutes=duration_minutes
@@ -94,18 +124,25 @@ class BookingSync:
             
             # Create blocked time for the second therapist
             secondary_booking = self.client.create_blocked_time(
-                team_member_id=available_therapist.get('id'),
+                team_member_id=available_therapist.id,
                 start_at=start_at,
                 duration_minutes=duration_minutes,
                 appointment_segments=secondary_segments
             )
             
             if secondary_booking:
-                secondary_id = secondary_booking.get('id')
+                secondary_booking = Booking.from_square(secondary_booking)
+                secondary_id = secondary_booking.id
                 self.booking_mappings[booking_id] = secondary_id
+                if self.availability is not None:
+                    # Later couple bookings in this cycle must not pick the same slot
+                    start_dt = parser.parse(start_at)
+                    self.availability.mark_busy(
+                        available_therapist.id, start_dt, start_dt + timedelta(minutes=duration_minutes)
+                    )
                 logger.info(
                     f"Created secondary booking {secondary_id} for therapist "
-                    f"{available_therapist.get('id')} linked to primary booking {booking_id}"
+                    f"{available_therapist.id} linked to primary booking {booking_id}"
                 )
                 
                 # Store the mapping in the secondary booking's note
@@ -115,6 +152,8 @@ class BookingSync:
                 logger.error(f"Failed to create secondary booking for {booking_id}")
                 return None
                 
+        except SquareRequestError:
+            raise
         except Exception as e:
             logger.error(f"Exception processing booking {booking_id}: {e}", exc_info=True)
             return None
@@ -133,10 +172,9 @@ class BookingSync:
                 logger.info(f"Cancelling secondary booking {secondary_id} for cancelled primary {booking_id}")
                 
                 # Get the secondary booking to get its version
-                secondary_booking = self.client.get_booking(secondary_id)
+                secondary_booking = self.client.get_booking_model(secondary_id)
                 if secondary_booking:
-                    version = secondary_booking.get('version', 0)
-                    self.client.cancel_booking(secondary_id, version)
+                    self.client.cancel_booking(secondary_id, secondary_booking.version or 0)
                 
                 # Remove from mappings
                 del self.booking_mappings[booking_id]
@@ -169,10 +207,9 @@ class BookingSync:
             if booking_id in self.booking_mappings:
                 # Cancel the old secondary booking
                 secondary_id = self.booking_mappings[booking_id]
-                secondary_booking = self.client.get_booking(secondary_id)
+                secondary_booking = self.client.get_booking_model(secondary_id)
                 if secondary_booking:
-                    version = secondary_booking.get('version', 0)
-                    self.client.cancel_booking(secondary_id, version)
+                    self.client.cancel_booking(secondary_id, secondary_booking.version or 0)
                 
                 # Remove the old mapping
                 del self.booking_mappings[booking_id]
@@ -182,7 +219,7 @@ class BookingSync:
                 self.process_new_booking(booking_id)
             else:
                 # Check if it's a couple's massage but no secondary exists
-                booking = self.client.get_booking(booking_id)
+                booking = self.client.get_booking_model(booking_id)
                 if booking and self.client.is_couples_massage(booking):
                     logger.info(f"Processing rescheduled couple's massage {booking_id}")
                     self.process_new_booking(booking_id)
@@ -13,6 +13,8 @@ class Config:
     SQUARE_APPLICATION_ID = os.getenv('SQUARE_APPLICATION_ID', '')
     SQUARE_LOCATION_ID = os.getenv('SQUARE_LOCATION_ID', '')
     SQUARE_ENVIRONMENT = os.getenv('SQUARE_ENVIRONMENT', 'sandbox')
+    # Overrides the environment's API URL, e.g. http://127.0.0.1:8099 for fake_square_server.py
+    SQUARE_BASE_URL = os.getenv('SQUARE_BASE_URL', '')
     
     # Webhook Configuration
     WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
@@ -32,6 +34,52 @@ class Config:
         if tid.strip()
     ]
     
+    # Room Assignment Configuration
+    # Engine: 'greedy' (first-fit by priority) or 'optimal' (fewest UNASSIGNED,
+    # keeps the best placement found so far when the time budget is exceeded,
+    # never worse than greedy)
+    ROOM_ASSIGNMENT_ENGINE = os.getenv('ROOM_ASSIGNMENT_ENGINE', 'greedy').lower()
+    ROOM_ASSIGNMENT_TIME_BUDGET_MS = int(os.getenv('ROOM_ASSIGNMENT_TIME_BUDGET_MS', '200'))
+    
+    # Location Configuration
+    # IANA timezone of the spa (e.g. America/New_York); bookings are grouped
+    # into this timezone's days. Empty uses the server's timezone.
+    LOCATION_TIMEZONE = os.getenv('LOCATION_TIMEZONE', '')
+    
+    # Team Directory Configuration
+    # Seconds before the cached team member list is refreshed (in the background)
+    TEAM_DIRECTORY_TTL_SECONDS = int(os.getenv('TEAM_DIRECTORY_TTL_SECONDS', '300'))
+    
+    # Square I/O Configuration
+    # Threads for Square calls made by the async API endpoints
+    SQUARE_IO_WORKERS = int(os.getenv('SQUARE_IO_WORKERS', '8'))
+    # Shared HTTP connection pool for all Square calls (seconds / connections)
+    SQUARE_HTTP_TIMEOUT_SECONDS = float(os.getenv('SQUARE_HTTP_TIMEOUT_SECONDS', '30'))
+    SQUARE_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('SQUARE_HTTP_CONNECT_TIMEOUT_SECONDS', '5'))
+    SQUARE_HTTP_MAX_CONNECTIONS = int(os.getenv('SQUARE_HTTP_MAX_CONNECTIONS', '16'))
+    SQUARE_HTTP_KEEPALIVE_SECONDS = float(os.getenv('SQUARE_HTTP_KEEPALIVE_SECONDS', '60'))
+    # Request scheduling: per endpoint family rate (requests/second and burst),
+    # requests in flight over all families, and retries for 429/5xx/network errors
+    SQUARE_RATE_LIMIT_PER_SECOND = float(os.getenv('SQUARE_RATE_LIMIT_PER_SECOND', '10'))
+    SQUARE_RATE_LIMIT_BURST = float(os.getenv('SQUARE_RATE_LIMIT_BURST', '20'))
+    SQUARE_MAX_CONCURRENT_REQUESTS = int(os.getenv('SQUARE_MAX_CONCURRENT_REQUESTS', '8'))
+    SQUARE_MAX_RETRIES = int(os.getenv('SQUARE_MAX_RETRIES', '3'))
+    
+    # Booking Snapshot Configuration
+    # Converted bookings per date are reused for this many seconds, then served
+    # stale (while one background refresh runs) up to the max stale age
+    BOOKING_SNAPSHOT_FRESH_SECONDS = int(os.getenv('BOOKING_SNAPSHOT_FRESH_SECONDS', '15'))
+    BOOKING_SNAPSHOT_MAX_STALE_SECONDS = int(os.getenv('BOOKING_SNAPSHOT_MAX_STALE_SECONDS', '300'))
+    
+    # Name Cache Configuration
+    # Customer and service names are looked up again after this many seconds
+    NAME_CACHE_TTL_SECONDS = int(os.getenv('NAME_CACHE_TTL_SECONDS', '3600'))
+    NAME_CACHE_MAX_ENTRIES = int(os.getenv('NAME_CACHE_MAX_ENTRIES', '5000'))
+    
+    # Catalog Index Configuration
+    # Seconds before the service variation index fetches catalog changes (in the background)
+    CATALOG_INDEX_TTL_SECONDS = int(os.getenv('CATALOG_INDEX_TTL_SECONDS', '900'))
+    
     @classmethod
     def validate(cls):
         """Validate required configuration values."""
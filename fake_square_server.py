@@ -0,0 +1,534 @@
+#!/usr/bin/env python
+"""Local stand-in for the Square endpoints this project calls, for offline load testing.
+
+Serves seeded synthetic bookings, team members, customers and catalog items
+over HTTP in Square's JSON shapes, with cursor pagination and configurable
+latency, page size and 429/5xx rates per endpoint. Point the app at it with
+SQUARE_BASE_URL=http://127.0.0.1:8099 (any SQUARE_ACCESS_TOKEN works), so
+the real SquareBookingsClient, HTTP pool, scheduler and SDK parsing are
+exercised instead of MockSquareService.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.mock_square import MockSquareService
+from config import Config
+
+ENDPOINTS = (
+    'bookings.list', 'bookings.get', 'bookings.create', 'bookings.cancel',
+    'team_members.search', 'customers.get', 'customers.bulk_retrieve',
+    'catalog.search', 'catalog.object_get'
+)
+
+# Square rejects ListBookings ranges longer than this
+MAX_LIST_WINDOW = timedelta(days=31)
+MAX_PAGE_SIZE = 100
+
+
+def _timestamp(dt: datetime) -> str:
+    """RFC 3339 in UTC, the way Square returns timestamps."""
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an RFC 3339 timestamp (naive ones are taken as UTC)."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _error(status_code: int, category: str, code: str, detail: str, headers=None) -> JSONResponse:
+    """A Square-style error response."""
+    return JSONResponse(
+        {'errors': [{'category': category, 'code': code, 'detail': detail}]},
+        status_code=status_code,
+        headers=headers
+    )
+
+
+class FakeSquareData:
+    """
+    Seeded synthetic Square data for one location.
+
+    The same seed and sizes always produce the same objects, so load test
+    runs are comparable. Bookings start on the hour or half hour between
+    9:00 and 20:00 UTC; about a fifth are couple services and a few are
+    cancelled.
+    """
+
+    def __init__(
+        self,
+        location_id: str = 'LFAKE0001',
+        start_date: Optional[str] = None,
+        days: int = 14,
+        bookings_per_day: int = 40,
+        team_members: int = 11,
+        customers: int = 500,
+        seed: int = 42
+    ):
+        """
+        Generate the data.
+
+        Args:
+            location_id: Location every object belongs to
+            start_date: First day with bookings (YYYY-MM-DD, default: a week ago)
+            days: Number of days with bookings
+            bookings_per_day: Bookings generated per day
+            team_members: Number of team members
+            customers: Number of customers
+            seed: Random seed
+        """
+        self.location_id = location_id
+        rng = random.Random(seed)
+        created_at = _timestamp(datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+        names = MockSquareService.THERAPISTS
+        self.team_members: List[Dict[str, Any]] = []
+        for i in range(team_members):
+            given_name, _, family_name = names[i % len(names)].partition(' ')
+            if i >= len(names):
+                family_name = f"{family_name} {i // len(names) + 1}".strip()
+            self.team_members.append({
+                'id': f"TMFAKE{i:04d}",
+                'given_name': given_name,
+                'family_name': family_name,
+                'status': 'ACTIVE',
+                'is_owner': False,
+                'assigned_locations': {'assignment_type': 'EXPLICIT_LOCATIONS', 'location_ids': [location_id]},
+                'created_at': created_at,
+                'updated_at': created_at
+            })
+
+        first_names = MockSquareService.CUSTOMERS
+        self.customers: Dict[str, Dict[str, Any]] = {}
+        for i in range(customers):
+            customer_id = f"CFAKE{i:06d}"
+            self.customers[customer_id] = {
+                'id': customer_id,
+                'given_name': first_names[i % len(first_names)],
+                'family_name': f"Customer{i}",
+                'email_address': f"customer{i}@example.com",
+                'phone_number': f"+1555{i:07d}",
+                'created_at': created_at,
+                'updated_at': created_at,
+                'version': 1
+            }
+
+        # One ITEM per service with a 60 and a 90 minute variation
+        self.catalog_items: List[Dict[str, Any]] = []
+        self.variations: List[Dict[str, Any]] = []
+        for i, service in enumerate(MockSquareService.SERVICES):
+            item_id = f"ITEMFAKE{i:04d}"
+            variations = [
+                {
+                    'type': 'ITEM_VARIATION',
+                    'id': f"VARFAKE{i:04d}{minutes}",
+                    'version': 1,
+                    'updated_at': created_at,
+                    'is_deleted': False,
+                    'present_at_all_locations': True,
+                    'item_variation_data': {
+                        'item_id': item_id,
+                        'name': f"{minutes} min",
+                        'service_duration': minutes * 60 * 1000,
+                        'available_for_booking': True
+                    }
+                }
+                for minutes in (60, 90)
+            ]
+            self.variations.extend(variations)
+            self.catalog_items.append({
+                'type': 'ITEM',
+                'id': item_id,
+                'version': 1,
+                'updated_at': created_at,
+                'is_deleted': False,
+                'present_at_all_locations': True,
+                'item_data': {'name': service, 'product_type': 'APPOINTMENTS_SERVICE', 'variations': variations}
+            })
+        self.catalog_objects: Dict[str, Dict[str, Any]] = {
+            obj['id']: obj for obj in self.catalog_items + self.variations
+        }
+
+        if start_date:
+            first_day = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        else:
+            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            first_day = today - timedelta(days=7)
+
+        couple_variations = [v for v in self.variations if 'couple' in self._item_name(v).lower()]
+        single_variations = [v for v in self.variations if v not in couple_variations]
+        customer_ids = list(self.customers)
+        self.bookings: Dict[str, Dict[str, Any]] = {}
+        for day in range(days):
+            day_start = first_day + timedelta(days=day)
+            for i in range(bookings_per_day):
+                start_at = day_start + timedelta(hours=rng.randint(9, 19), minutes=rng.choice([0, 30]))
+                variation = rng.choice(couple_variations if couple_variations and rng.random() < 0.2
+                                       else single_variations or couple_variations)
+                status = 'CANCELLED_BY_CUSTOMER' if rng.random() < 0.05 else 'ACCEPTED'
+                booking_id = f"BFAKE{day_start:%Y%m%d}{i:04d}"
+                self.bookings[booking_id] = {
+                    'id': booking_id,
+                    'version': 1,
+                    'status': status,
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                    'location_id': location_id,
+                    'customer_id': rng.choice(customer_ids) if customer_ids else None,
+                    'customer_note': '',
+                    'start_at': _timestamp(start_at),
+                    'all_day': False,
+                    'source': 'FIRST_PARTY_MERCHANT',
+                    'location_type': 'BUSINESS_LOCATION',
+                    'appointment_segments': [{
+                        'duration_minutes': variation['item_variation_data']['service_duration'] // 60000,
+                        'service_variation_id': variation['id'],
+                        'service_variation_version': variation['version'],
+                        'team_member_id': rng.choice(self.team_members)['id'] if self.team_members else '',
+                        'any_team_member': False,
+                        'intermission_minutes': 0
+                    }]
+                }
+        # ListBookings returns bookings in start time order
+        self.bookings = dict(sorted(self.bookings.items(), key=lambda item: (item[1]['start_at'], item[0])))
+        self._next_booking = 0
+        self._idempotency: Dict[str, Dict[str, Any]] = {}
+
+    def _item_name(self, variation: Dict[str, Any]) -> str:
+        item_id = variation['item_variation_data']['item_id']
+        return next(item['item_data']['name'] for item in self.catalog_items if item['id'] == item_id)
+
+    def list_bookings(
+        self,
+        start_at_min: datetime,
+        start_at_max: datetime,
+        location_id: Optional[str] = None,
+        team_member_id: Optional[str] = None,
+        customer_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Bookings starting in [start_at_min, start_at_max) matching the filters."""
+        matches = []
+        for booking in self.bookings.values():
+            if not start_at_min <= _parse_timestamp(booking['start_at']) < start_at_max:
+                continue
+            if location_id and booking['location_id'] != location_id:
+                continue
+            if customer_id and booking['customer_id'] != customer_id:
+                continue
+            if team_member_id and all(s['team_member_id'] != team_member_id for s in booking['appointment_segments']):
+                continue
+            matches.append(booking)
+        return matches
+
+    def create_booking(self, booking: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Store a new booking (a repeated idempotency key returns the first one)."""
+        if idempotency_key and idempotency_key in self._idempotency:
+            return self._idempotency[idempotency_key]
+        now = _timestamp(datetime.now(timezone.utc))
+        self._next_booking += 1
+        created = {
+            'status': 'ACCEPTED',
+            'location_id': self.location_id,
+            'customer_note': '',
+            'all_day': False,
+            **booking,
+            'id': f"BFAKENEW{self._next_booking:06d}",
+            'version': 0,
+            'start_at': _timestamp(_parse_timestamp(booking['start_at'])),
+            'created_at': now,
+            'updated_at': now
+        }
+        self.bookings[created['id']] = created
+        if idempotency_key:
+            self._idempotency[idempotency_key] = created
+        return created
+
+
+class FaultSettings:
+    """Latency and error rates of one endpoint."""
+
+    def __init__(self, latency_ms: float = 0.0, rate_429: float = 0.0, rate_5xx: float = 0.0):
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+
+
+def create_app(
+    data: Optional[FakeSquareData] = None,
+    page_size: int = 25,
+    faults: Optional[Dict[str, FaultSettings]] = None,
+    default_faults: Optional[FaultSettings] = None,
+    retry_after_seconds: Optional[float] = None,
+    seed: int = 42
+) -> FastAPI:
+    """
+    Build the fake Square API.
+
+    Args:
+        data: Data to serve (default: FakeSquareData())
+        page_size: Results per page for paginated endpoints (a smaller
+            ``limit`` in the request wins; at most 100)
+        faults: Endpoint name (see ENDPOINTS) -> its latency and error rates
+        default_faults: Settings for endpoints not in faults
+        retry_after_seconds: Retry-After header sent with injected 429s (none by default)
+        seed: Seed for the injected errors
+    """
+    data = data or FakeSquareData()
+    faults = faults or {}
+    default_faults = default_faults or FaultSettings()
+    fault_rng = random.Random(seed)
+    app = FastAPI(title="Fake Square API")
+    app.state.data = data
+    app.state.request_counts = {endpoint: 0 for endpoint in ENDPOINTS}
+
+    async def inject(endpoint: str) -> Optional[JSONResponse]:
+        """Count the request, wait its latency, then maybe fail it."""
+        app.state.request_counts[endpoint] += 1
+        settings = faults.get(endpoint, default_faults)
+        if settings.latency_ms:
+            await asyncio.sleep(settings.latency_ms / 1000)
+        roll = fault_rng.random()
+        if roll < settings.rate_429:
+            headers = {'Retry-After': f"{retry_after_seconds:g}"} if retry_after_seconds is not None else None
+            return _error(429, 'RATE_LIMIT_ERROR', 'RATE_LIMITED', 'Injected rate limit', headers)
+        if roll < settings.rate_429 + settings.rate_5xx:
+            status_code = fault_rng.choice([500, 503])
+            code = 'INTERNAL_SERVER_ERROR' if status_code == 500 else 'SERVICE_UNAVAILABLE'
+            return _error(status_code, 'API_ERROR', code, 'Injected server error')
+        return None
+
+    def paginate(items: List[Any], cursor: Optional[str], limit: Optional[int]):
+        """Return (page, next cursor or None); the cursor is the offset of the next page."""
+        size = min(limit or page_size, page_size, MAX_PAGE_SIZE)
+        offset = int(cursor) if cursor and cursor.isdigit() else 0
+        page = items[offset:offset + size]
+        next_offset = offset + size
+        return page, (str(next_offset) if next_offset < len(items) else None)
+
+    @app.get('/v2/bookings')
+    async def list_bookings(
+        location_id: Optional[str] = None,
+        team_member_id: Optional[str] = None,
+        customer_id: Optional[str] = None,
+        start_at_min: Optional[str] = None,
+        start_at_max: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ):
+        failure = await inject('bookings.list')
+        if failure:
+            return failure
+        range_min = _parse_timestamp(start_at_min) if start_at_min else datetime.now(timezone.utc)
+        range_max = _parse_timestamp(start_at_max) if start_at_max else range_min + MAX_LIST_WINDOW
+        if range_max - range_min > MAX_LIST_WINDOW:
+            return _error(400, 'INVALID_REQUEST_ERROR', 'INVALID_VALUE',
+                          'The time range between start_at_min and start_at_max must be at most 31 days.')
+        bookings = data.list_bookings(range_min, range_max, location_id, team_member_id, customer_id)
+        page, next_cursor = paginate(bookings, cursor, limit)
+        body = {'bookings': page, 'errors': []}
+        if next_cursor:
+            body['cursor'] = next_cursor
+        return body
+
+    @app.get('/v2/bookings/{booking_id}')
+    async def get_booking(booking_id: str):
+        failure = await inject('bookings.get')
+        if failure:
+            return failure
+        booking = data.bookings.get(booking_id)
+        if booking is None:
+            return _error(404, 'INVALID_REQUEST_ERROR', 'NOT_FOUND', f"Booking {booking_id} not found.")
+        return {'booking': booking, 'errors': []}
+
+    @app.post('/v2/bookings')
+    async def create_booking(request: Request):
+        failure = await inject('bookings.create')
+        if failure:
+            return failure
+        body = await request.json()
+        booking = body.get('booking') or {}
+        if not booking.get('start_at') or not booking.get('appointment_segments'):
+            return _error(400, 'INVALID_REQUEST_ERROR', 'MISSING_REQUIRED_PARAMETER',
+                          'start_at and appointment_segments are required.')
+        return {'booking': data.create_booking(booking, body.get('idempotency_key')), 'errors': []}
+
+    @app.post('/v2/bookings/{booking_id}/cancel')
+    async def cancel_booking(booking_id: str, request: Request):
+        failure = await inject('bookings.cancel')
+        if failure:
+            return failure
+        body = await request.json()
+        booking = data.bookings.get(booking_id)
+        if booking is None:
+            return _error(404, 'INVALID_REQUEST_ERROR', 'NOT_FOUND', f"Booking {booking_id} not found.")
+        version = body.get('booking_version')
+        if version is not None and version != booking['version']:
+            return _error(400, 'INVALID_REQUEST_ERROR', 'VERSION_MISMATCH', 'booking_version is out of date.')
+        booking.update(
+            status='CANCELLED_BY_SELLER',
+            version=booking['version'] + 1,
+            updated_at=_timestamp(datetime.now(timezone.utc))
+        )
+        return {'booking': booking, 'errors': []}
+
+    @app.post('/v2/team-members/search')
+    async def search_team_members(request: Request):
+        failure = await inject('team_members.search')
+        if failure:
+            return failure
+        body = await request.json()
+        query_filter = (body.get('query') or {}).get('filter') or {}
+        members = data.team_members
+        if query_filter.get('status'):
+            members = [m for m in members if m['status'] == query_filter['status']]
+        if query_filter.get('location_ids'):
+            wanted = set(query_filter['location_ids'])
+            members = [m for m in members if wanted & set(m['assigned_locations']['location_ids'])]
+        page, next_cursor = paginate(members, body.get('cursor'), body.get('limit'))
+        result = {'team_members': page, 'errors': []}
+        if next_cursor:
+            result['cursor'] = next_cursor
+        return result
+
+    @app.post('/v2/customers/bulk-retrieve')
+    async def bulk_retrieve_customers(request: Request):
+        failure = await inject('customers.bulk_retrieve')
+        if failure:
+            return failure
+        body = await request.json()
+        customer_ids = body.get('customer_ids') or []
+        if len(customer_ids) > 100:
+            return _error(400, 'INVALID_REQUEST_ERROR', 'INVALID_ARRAY_LENGTH', 'At most 100 customer_ids.')
+        responses = {}
+        for customer_id in customer_ids:
+            customer = data.customers.get(customer_id)
+            if customer is None:
+                responses[customer_id] = {'errors': [{
+                    'category': 'INVALID_REQUEST_ERROR', 'code': 'NOT_FOUND',
+                    'detail': f"Customer {customer_id} not found."
+                }]}
+            else:
+                responses[customer_id] = {'customer': customer}
+        return {'responses': responses}
+
+    @app.get('/v2/customers/{customer_id}')
+    async def get_customer(customer_id: str):
+        failure = await inject('customers.get')
+        if failure:
+            return failure
+        customer = data.customers.get(customer_id)
+        if customer is None:
+            return _error(404, 'INVALID_REQUEST_ERROR', 'NOT_FOUND', f"Customer {customer_id} not found.")
+        return {'customer': customer}
+
+    @app.post('/v2/catalog/search')
+    async def search_catalog(request: Request):
+        failure = await inject('catalog.search')
+        if failure:
+            return failure
+        body = await request.json()
+        object_types = set(body.get('object_types') or [])
+        objects = [
+            obj for obj in data.catalog_objects.values()
+            if (not object_types or obj['type'] in object_types)
+            and (body.get('include_deleted_objects') or not obj['is_deleted'])
+            and (not body.get('begin_time') or obj['updated_at'] >= _timestamp(_parse_timestamp(body['begin_time'])))
+        ]
+        page, next_cursor = paginate(objects, body.get('cursor'), body.get('limit'))
+        latest_time = max((obj['updated_at'] for obj in data.catalog_objects.values()), default=None)
+        result = {'objects': page, 'latest_time': latest_time}
+        if next_cursor:
+            result['cursor'] = next_cursor
+        return result
+
+    @app.get('/v2/catalog/object/{object_id}')
+    async def get_catalog_object(object_id: str, include_related_objects: bool = False):
+        failure = await inject('catalog.object_get')
+        if failure:
+            return failure
+        obj = data.catalog_objects.get(object_id)
+        if obj is None:
+            return _error(404, 'INVALID_REQUEST_ERROR', 'NOT_FOUND', f"Object {object_id} not found.")
+        result = {'object': obj}
+        if include_related_objects and obj['type'] == 'ITEM_VARIATION':
+            result['related_objects'] = [data.catalog_objects[obj['item_variation_data']['item_id']]]
+        return result
+
+    return app
+
+
+def _endpoint_setting(value: str):
+    """Parse NAME=NUMBER for the per-endpoint options."""
+    name, _, number = value.partition('=')
+    if name not in ENDPOINTS:
+        raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+    return name, float(number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--location-id', default=Config.SQUARE_LOCATION_ID or 'LFAKE0001',
+                        help='Location of the generated data (default: SQUARE_LOCATION_ID)')
+    parser.add_argument('--start-date', help='First day with bookings, YYYY-MM-DD (default: a week ago)')
+    parser.add_argument('--days', type=int, default=14, help='Days with bookings')
+    parser.add_argument('--bookings-per-day', type=int, default=40)
+    parser.add_argument('--team-members', type=int, default=11)
+    parser.add_argument('--customers', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--page-size', type=int, default=25, help='Results per page (max 100)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latency of every endpoint')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests answered 429')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='Fraction of requests answered 500/503')
+    parser.add_argument('--retry-after', type=float, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--endpoint-latency-ms', type=_endpoint_setting, action='append', default=[],
+                        metavar='ENDPOINT=MS', help='Override the latency of one endpoint')
+    parser.add_argument('--endpoint-rate-429', type=_endpoint_setting, action='append', default=[],
+                        metavar='ENDPOINT=RATE', help='Override the 429 rate of one endpoint')
+    parser.add_argument('--endpoint-rate-5xx', type=_endpoint_setting, action='append', default=[],
+                        metavar='ENDPOINT=RATE', help='Override the 5xx rate of one endpoint')
+    args = parser.parse_args()
+
+    faults = {
+        endpoint: FaultSettings(args.latency_ms, args.rate_429, args.rate_5xx)
+        for endpoint in ENDPOINTS
+    }
+    for option, attribute in (
+        (args.endpoint_latency_ms, 'latency_ms'),
+        (args.endpoint_rate_429, 'rate_429'),
+        (args.endpoint_rate_5xx, 'rate_5xx')
+    ):
+        for endpoint, value in option:
+            setattr(faults[endpoint], attribute, value)
+
+    data = FakeSquareData(
+        location_id=args.location_id,
+        start_date=args.start_date,
+        days=args.days,
+        bookings_per_day=args.bookings_per_day,
+        team_members=args.team_members,
+        customers=args.customers,
+        seed=args.seed
+    )
+    print(f"Fake Square API on http://{args.host}:{args.port} - {len(data.bookings)} bookings, "
+          f"{len(data.team_members)} team members, {len(data.customers)} customers, location {data.location_id}")
+    print(f"Run the app with SQUARE_BASE_URL=http://{args.host}:{args.port}")
+    app = create_app(data, page_size=args.page_size, faults=faults,
+                     retry_after_seconds=args.retry_after, seed=args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Sorted list of disjoint busy intervals with O(log n) overlap checks."""
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+
+class IntervalList:
+    """
+    Disjoint [start, end) intervals kept sorted by start.
+
+    Overlapping or touching intervals are merged on insert, so the ends are
+    sorted too and "is [start, end) free" is answered with one binary search.
+    Shared by the room schedule (per physical room) and the availability
+    index (per team member).
+    """
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self):
+        """Create an empty list (free at all times)."""
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start: float, end: float):
+        """Mark [start, end) busy, merging with overlapping or touching intervals."""
+        starts, ends = self.starts, self.ends
+        # Intervals in [i, j) overlap or touch the new one and get merged
+        i = bisect_left(ends, start)
+        j = bisect_right(starts, end)
+        if i < j:
+            start = min(start, starts[i])
+            end = max(end, ends[j - 1])
+        starts[i:j] = [start]
+        ends[i:j] = [end]
+
+    def blocking(self, start: float, end: float) -> Optional[Tuple[float, float]]:
+        """Return an interval that overlaps [start, end), or None if it is free."""
+        starts = self.starts
+        if not starts:
+            return None
+        ends = self.ends
+        i = bisect_right(starts, start)
+        # Interval starting at or before our start that is still running
+        if i and ends[i - 1] > start:
+            return starts[i - 1], ends[i - 1]
+        # Next interval starting before we finish
+        if i < len(starts) and starts[i] < end:
+            return starts[i], ends[i]
+        return None
+
+    def is_free(self, start: float, end: float) -> bool:
+        """Whether nothing overlaps [start, end)."""
+        return self.blocking(start, end) is None
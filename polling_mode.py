@@ -4,11 +4,12 @@ Use this if you cannot set up webhooks (e.g., local development, firewall issues
 """
 import logging
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dateutil import parser
 from config import Config
+from availability_index import AvailabilityIndex
 from booking_sync import BookingSync
-from square_client import SquareBookingsClient
+from request_scheduler import SquareRequestError
 
 logger = logging.getLogger(__name__)
 
@@ -25,47 +26,70 @@ class PollingBookingsMonitor:
         """
         self.poll_interval = poll_interval_seconds
         self.booking_sync = BookingSync()
-        self.client = SquareBookingsClient()
+        self.client = self.booking_sync.client
         self.processed_bookings = set()  # Track processed booking IDs
     
     def poll_bookings(self):
         """Poll for new bookings and process them."""
         try:
             # Get bookings from the last 24 hours and next 7 days
-            now = datetime.now()
-            start_at_min = (now - timedelta(days=1)).isoformat()
-            start_at_max = (now + timedelta(days=7)).isoformat()
+            # (RFC 3339 with an offset, as ListBookings expects)
+            now = datetime.now(timezone.utc)
+            window_start = now - timedelta(days=1)
+            window_end = now + timedelta(days=7)
+            start_at_min = window_start.isoformat()
+            start_at_max = window_end.isoformat()
             
-            bookings = self.client.list_bookings(
+            # The same scan tells us who is busy when, so finding second
+            # therapists for this cycle's couple bookings needs no more scans
+            # (slots near the window start may overlap bookings not scanned)
+            availability = AvailabilityIndex(window_start + self.client.AVAILABILITY_LOOKBACK, window_end)
+            new_booking_ids = []
+            
+            # One page at a time, so the polling window never sits in memory at once
+            checked = 0
+            for page in self.client.iter_booking_pages(
                 start_at_min=start_at_min,
                 start_at_max=start_at_max
-            )
+            ):
+                checked += len(page)
+                for booking in page:
+                    availability.add_booking(booking)
+                    booking_id = booking.id
+                    
+                    # Skip cancelled/declined bookings
+                    if booking.is_cancelled:
+                        if booking_id in self.processed_bookings:
+                            # This was previously active, now cancelled
+                            logger.info(f"Detected cancellation for booking {booking_id}")
+                            self.booking_sync.process_cancellation(booking_id)
+                            self.processed_bookings.discard(booking_id)
+                        continue
+                    
+                    # Process new bookings once the scan is complete
+                    if booking_id not in self.processed_bookings:
+                        new_booking_ids.append(booking_id)
+                    else:
+                        # Check if booking was rescheduled (compare start times)
+                        # This is a simplified check - in production you'd want to store the original start time
+                        pass
             
-            logger.info(f"Found {len(bookings)} bookings to check")
+            logger.info(f"Checked {checked} bookings")
             
-            for booking in bookings:
-                booking_id = booking.get('id')
-                booking_status = booking.get('status')
-                
-                # Skip cancelled/declined bookings
-                if booking_status in ['CANCELLED_BY_CUSTOMER', 'CANCELLED_BY_SELLER', 'DECLINED']:
-                    if booking_id in self.processed_bookings:
-                        # This was previously active, now cancelled
-                        logger.info(f"Detected cancellation for booking {booking_id}")
-                        self.booking_sync.process_cancellation(booking_id)
-                        self.processed_bookings.discard(booking_id)
-                    continue
-                
-                # Process new bookings
-                if booking_id not in self.processed_bookings:
+            self.booking_sync.availability = availability
+            try:
+                for booking_id in new_booking_ids:
                     logger.info(f"Processing new booking {booking_id}")
-                    result = self.booking_sync.process_new_booking(booking_id)
+                    try:
+                        result = self.booking_sync.process_new_booking(booking_id)
+                    except SquareRequestError as e:
+                        # Not settled: this and the remaining bookings are retried next poll
+                        logger.warning(f"Square unavailable while processing {booking_id}, retrying next poll: {e}")
+                        break
                     if result:
                         self.processed_bookings.add(booking_id)
-                else:
-                    # Check if booking was rescheduled (compare start times)
-                    # This is a simplified check - in production you'd want to store the original start time
-                    pass
+            finally:
+                self.booking_sync.availability = None
                     
         except Exception as e:
             logger.error(f"Error polling bookings: {e}", exc_info=True)
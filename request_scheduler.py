@@ -0,0 +1,185 @@
+"""Rate limiting, concurrency caps and retries for outbound Square requests."""
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class SquareRequestError(Exception):
+    """A Square request failed (as opposed to succeeding with no results)."""
+
+    def __init__(self, message: str, family: str = '', status_code: Optional[int] = None):
+        super().__init__(message)
+        self.family = family
+        self.status_code = status_code
+
+
+class SquareThrottledError(SquareRequestError):
+    """Square kept answering 429 Too Many Requests after all retries."""
+
+
+class SquareUnavailableError(SquareRequestError):
+    """Square kept failing with 5xx or network errors after all retries."""
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, with bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self, seconds: float):
+        """Hold off new requests for about ``seconds`` (after Square asked us to slow down)."""
+        with self._lock:
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+class RequestScheduler:
+    """
+    Single gate for outbound Square requests.
+
+    Each endpoint family (bookings, customers, catalog, ...) has its own
+    token bucket, and at most ``max_concurrency`` requests are in flight
+    across all families. 429s, 5xx responses and network errors are retried
+    up to ``max_retries`` times with jittered exponential backoff; a
+    Retry-After header, when present, sets the delay instead and also
+    drains the family's bucket so other threads back off too. Other errors
+    are not retried.
+
+    Failures are raised as SquareRequestError subclasses, so callers can
+    tell "no results" from "request failed". ``stats()`` reports counters
+    per family.
+    """
+
+    def __init__(
+        self,
+        rates: Dict[str, Tuple[float, float]],
+        default_rate: Tuple[float, float] = (10, 20),
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0
+    ):
+        """
+        Create a scheduler.
+
+        Args:
+            rates: Family -> (requests per second, burst size)
+            default_rate: (rate, burst) for families not in rates
+            max_concurrency: Requests in flight at once, over all families
+            max_retries: Retries after the first attempt for retryable errors
+            base_delay: Backoff before the first retry (doubled each retry)
+            max_delay: Upper bound for one backoff or Retry-After wait
+        """
+        self.default_rate = default_rate
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {family: TokenBucket(*rate) for family, rate in rates.items()}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def call(self, family: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run func(*args, **kwargs) as a request of the given family.
+
+        Raises:
+            SquareThrottledError: Still rate limited after all retries
+            SquareUnavailableError: Still failing with 5xx/network errors after all retries
+            SquareRequestError: Any other failed request (e.g. 401, 403, 404, 400)
+        """
+        bucket = self._bucket(family)
+        self._count(family, 'requests')
+        attempt = 0
+        while True:
+            bucket.acquire()
+            with self._slots:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    error = e
+            status_code = getattr(error, 'status_code', None)
+            retryable = status_code == 429 or (status_code or 0) >= 500 or isinstance(error, httpx.TransportError)
+            if status_code == 429:
+                self._count(family, 'throttles')
+
+            if not retryable:
+                self._count(family, 'failures')
+                raise SquareRequestError(f"Square {family} request failed: {error}", family, status_code) from error
+            if attempt >= self.max_retries:
+                self._count(family, 'failures')
+                error_type = SquareThrottledError if status_code == 429 else SquareUnavailableError
+                raise error_type(
+                    f"Square {family} request failed after {attempt + 1} attempts: {error}", family, status_code
+                ) from error
+
+            retry_after = self._retry_after(error)
+            if retry_after is not None:
+                delay = min(retry_after, self.max_delay)
+                bucket.drain(delay)
+            else:
+                # Full jitter: anywhere up to the exponential backoff
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            attempt += 1
+            self._count(family, 'retries')
+            logger.warning(f"Square {family} request failed ({status_code or type(error).__name__}), retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return limits and per-family counters as a JSON-friendly dict."""
+        with self._lock:
+            families = {family: dict(counters) for family, counters in self._counters.items()}
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_retries': self.max_retries,
+            'families': families
+        }
+
+    def _bucket(self, family: str) -> TokenBucket:
+        """Return the family's bucket, creating one with the default rate."""
+        bucket = self._buckets.get(family)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(family, TokenBucket(*self.default_rate))
+        return bucket
+
+    def _count(self, family: str, counter: str):
+        with self._lock:
+            counters = self._counters.setdefault(
+                family, {'requests': 0, 'retries': 0, 'throttles': 0, 'failures': 0}
+            )
+            counters[counter] += 1
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Seconds from the error's Retry-After header, if it has one in seconds."""
+        headers = getattr(error, 'headers', None) or {}
+        value = next((v for k, v in headers.items() if k.lower() == 'retry-after'), None)
+        try:
+            return max(float(value), 0.0) if value is not None else None
+        except (TypeError, ValueError):
+            return None
@@ -5,6 +5,7 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from room_assignment import RoomAssignment
 from database import init_database, update_room_assignment, get_room_assignment
+from ttl_cache import cache_stats
 
 logger = logging.getLogger(__name__)
 
@@ -104,6 +105,12 @@ def health_check():
     return jsonify({'status': 'healthy'}), 200
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Size, hit/miss and eviction counters of the lookup caches."""
+    return jsonify({'caches': cache_stats()}), 200
+
+
 @app.route('/', methods=['GET'])
 def index():
     """Serve the dashboard."""
@@ -6,6 +6,7 @@ from dateutil import parser
 from square_client import SquareBookingsClient
 from config import Config
 from database import get_assignments_for_date, save_room_assignment
+from square_models import Booking
 
 logger = logging.getLogger(__name__)
 
@@ -21,39 +22,37 @@ class RoomAssignment:
         """Initialize room assignment handler."""
         self.client = SquareBookingsClient()
     
-    def is_couple_booking(self, booking: Dict) -> bool:
+    def is_couple_booking(self, booking: Booking) -> bool:
         """Check if a booking is a couple's massage."""
         return self.client.is_couples_massage(booking)
     
-    def extract_booking_info(self, booking: Dict) -> Optional[Dict]:
+    def extract_booking_info(self, booking: Booking) -> Optional[Dict]:
         """Extract relevant information from a Square booking."""
         try:
-            segments = booking.get('appointment_segments', [])
+            segments = booking.segments
             if not segments:
                 return None
             
             segment = segments[0]
-            start_at = booking.get('start_at')
-            duration_minutes = segment.get('duration_minutes', 60)
+            duration_minutes = segment.duration_minutes
             
             # Parse times
-            start_dt = parser.parse(start_at)
+            start_dt = parser.parse(booking.start_at)
             end_dt = start_dt + timedelta(minutes=duration_minutes)
             
             # Get service name
-            service_name = segment.get('service_variation_name', '')
+            service_name = segment.service_variation_name
             
             # Get therapist
-            therapist_id = segment.get('team_member_id', '')
+            therapist_id = segment.team_member_id
             therapist_name = ''  # Could fetch from team members API if needed
             
             # Get customer name
-            customer_id = booking.get('customer_id', '')
-            customer_name = booking.get('customer_note', '') or 'Unknown'
+            customer_name = booking.customer_note or 'Unknown'
             
             return {
-                'id': booking.get('id'),
-                'start_at': start_at,
+                'id': booking.id,
+                'start_at': booking.start_at,
                 'start_dt': start_dt,
                 'end_dt': end_dt,
                 'duration_minutes': duration_minutes,
@@ -61,7 +60,7 @@ class RoomAssignment:
                 'therapist_id': therapist_id,
                 'therapist_name': therapist_name,
                 'customer_name': customer_name,
-                'status': booking.get('status'),
+                'status': booking.status,
                 'type': 'couple' if self.is_couple_booking(booking) else 'single'
             }
         except Exception as e:
@@ -188,16 +187,13 @@ class RoomAssignment:
         start_at_max = (date_obj + timedelta(days=1)).isoformat()
         
         # Fetch bookings from Square
-        bookings = self.client.list_bookings(
+        bookings = self.client.list_booking_models(
             start_at_min=start_at_min,
             start_at_max=start_at_max
         )
         
         # Filter out cancelled bookings
-        active_bookings = [
-            b for b in bookings
-            if b.get('status') not in ['CANCELLED_BY_CUSTOMER', 'CANCELLED_BY_SELLER', 'DECLINED']
-        ]
+        active_bookings = [b for b in bookings if not b.is_cancelled]
         
         # Extract booking info
         booking_infos = []
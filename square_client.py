@@ -1,26 +1,128 @@
 """Square API client for Bookings operations."""
+import atexit
 import logging
+import threading
+import uuid
+from datetime import timedelta
+import httpx
+from dateutil import parser
 from square.client import Square, SquareEnvironment
 from config import Config
+from availability_index import AvailabilityIndex
+from request_scheduler import RequestScheduler, SquareRequestError
+from single_flight import SingleFlight
+from square_models import Booking, CatalogObject, TeamMember
 
 logger = logging.getLogger(__name__)
 
+# One keep-alive connection pool for the whole process, and one SDK client
+# per (token, environment) on top of it
+_http_client = None
+_sdk_clients = {}
+_scheduler = None
+_shared_lock = threading.Lock()
+
+# Retries are left to the scheduler, which also respects the rate limits
+_NO_SDK_RETRIES = {'max_retries': 0}
+
+# Identical read requests already in flight are shared rather than repeated
+_in_flight = SingleFlight()
+
+
+def get_http_client():
+    """
+    Return the process-wide HTTP/1.1 client used for all Square calls.
+    
+    Connections are kept alive and reused (SQUARE_HTTP_MAX_CONNECTIONS,
+    SQUARE_HTTP_KEEPALIVE_SECONDS), so repeated calls skip the TCP and TLS
+    handshakes. Timeouts come from SQUARE_HTTP_TIMEOUT_SECONDS and
+    SQUARE_HTTP_CONNECT_TIMEOUT_SECONDS.
+    """
+    global _http_client
+    with _shared_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                http1=True,
+                http2=False,
+                timeout=httpx.Timeout(
+                    Config.SQUARE_HTTP_TIMEOUT_SECONDS,
+                    connect=Config.SQUARE_HTTP_CONNECT_TIMEOUT_SECONDS
+                ),
+                limits=httpx.Limits(
+                    max_connections=Config.SQUARE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.SQUARE_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=Config.SQUARE_HTTP_KEEPALIVE_SECONDS
+                )
+            )
+            atexit.register(_http_client.close)
+        return _http_client
+
+
+def get_square_sdk(token=None, environment=None):
+    """
+    Return the shared Square SDK client for a token and environment.
+    
+    SQUARE_BASE_URL, when set, replaces the environment's API URL (e.g. to
+    load test against fake_square_server.py).
+    
+    Args:
+        token: Access token (default: SQUARE_ACCESS_TOKEN)
+        environment: 'sandbox' or 'production' (default: SQUARE_ENVIRONMENT)
+    """
+    token = token or Config.SQUARE_ACCESS_TOKEN
+    environment = (environment or Config.SQUARE_ENVIRONMENT).lower()
+    http_client = get_http_client()
+    with _shared_lock:
+        sdk = _sdk_clients.get((token, environment))
+        if sdk is None:
+            sdk = Square(
+                token=token,
+                base_url=Config.SQUARE_BASE_URL or None,
+                environment=SquareEnvironment.SANDBOX if environment == 'sandbox' else SquareEnvironment.PRODUCTION,
+                timeout=Config.SQUARE_HTTP_TIMEOUT_SECONDS,
+                httpx_client=http_client
+            )
+            _sdk_clients[(token, environment)] = sdk
+        return sdk
+
+
+def get_request_scheduler():
+    """
+    Return the process-wide scheduler every Square request goes through.
+    
+    Each endpoint family gets SQUARE_RATE_LIMIT_PER_SECOND requests per
+    second (bursts of SQUARE_RATE_LIMIT_BURST), with at most
+    SQUARE_MAX_CONCURRENT_REQUESTS in flight and SQUARE_MAX_RETRIES retries.
+    """
+    global _scheduler
+    with _shared_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                rates={},
+                default_rate=(Config.SQUARE_RATE_LIMIT_PER_SECOND, Config.SQUARE_RATE_LIMIT_BURST),
+                max_concurrency=Config.SQUARE_MAX_CONCURRENT_REQUESTS,
+                max_retries=Config.SQUARE_MAX_RETRIES
+            )
+        return _scheduler
+
+
+def get_single_flight():
+    """Return the process-wide coalescer for identical in-flight Square reads."""
+    return _in_flight
+
 
 class SquareBookingsClient:
     """Client for interacting with Square Bookings API."""
     
+    # ListBookings rejects start_at ranges longer than 31 days
+    MAX_LIST_WINDOW = timedelta(days=31)
+    
+    # How far before a window availability scans look for bookings still running
+    AVAILABILITY_LOOKBACK = timedelta(hours=12)
+    
     def __init__(self):
-        """Initialize Square API client."""
-        # Map environment string to SquareEnvironment enum
-        if Config.SQUARE_ENVIRONMENT.lower() == 'sandbox':
-            environment = SquareEnvironment.SANDBOX
-        else:
-            environment = SquareEnvironment.PRODUCTION
-        
-        self.client = Square(
-            token=Config.SQUARE_ACCESS_TOKEN,
-            environment=environment
-        )
+        """Initialize Square API client (on the shared connection pool)."""
+        self.client = get_square_sdk()
         self.bookings_api = self.client.bookings
         self.team_members_api = self.client.team_members
         self.locations_api = self.client.locations
@@ -33,322 +135,449 @@ class SquareBookingsClient:
         else:
             logger.warning("Customer API not available - customer names will fall back to customer_note or customer_id")
     
+    def _call(self, family: str, func, **kwargs):
+        """Make one SDK call through the shared request scheduler (raises SquareRequestError)."""
+        return get_request_scheduler().call(family, func, request_options=_NO_SDK_RETRIES, **kwargs)
+    
+    def _read(self, family: str, func, **kwargs):
+        """
+        Make a read-only SDK call, sharing it with identical calls already in flight.
+        
+        The key is the endpoint (SDK resource and method) plus its
+        parameters, so e.g. several threads resolving the same customer or
+        listing the same day make one request. Writes must use _call.
+        """
+        key = (
+            family,
+            id(getattr(func, '__self__', None)),
+            getattr(func, '__qualname__', repr(func)),
+            tuple(sorted((name, repr(value)) for name, value in kwargs.items()))
+        )
+        return _in_flight.do(key, self._call, family, func, **kwargs)
+    
     def get_booking(self, booking_id: str):
-        """Retrieve a booking by ID."""
+        """
+        Retrieve a booking by ID (None if it does not exist).
+        
+        Raises:
+            SquareRequestError: The request failed
+        """
         try:
-            result = self.bookings_api.get(booking_id=booking_id)
-            # New SDK returns the response object directly
-            if hasattr(result, 'body'):
-                return result.body.get('booking')
-            elif hasattr(result, 'booking'):
-                return result.booking
-            else:
+            result = self._read('bookings', self.bookings_api.get, booking_id=booking_id)
+        except SquareRequestError as e:
+            if e.status_code == 404:
                 return None
-        except Exception as e:
-            logger.error(f"Exception retrieving booking {booking_id}: {e}")
-            return None
+            raise
+        return getattr(result, 'booking', None)
+    
+    def get_booking_model(self, booking_id: str):
+        """Retrieve a booking by ID as a square_models.Booking (None if not found)."""
+        booking = self.get_booking(booking_id)
+        return Booking.from_square(booking) if booking else None
     
     def list_bookings(self, start_at_min=None, start_at_max=None, team_member_id=None):
-        """List bookings with optional filters."""
+        """
+        List raw SDK bookings with optional filters ([] if the request fails).
+        
+        Kept for the diagnostic scripts; application code should use
+        iter_booking_pages or list_booking_models, which raise on failure.
+        """
         try:
-            # Build query parameters
-            query_params = {
-                'location_id': Config.SQUARE_LOCATION_ID
-            }
-            if start_at_min:
-                query_params['start_at_min'] = start_at_min
-            if start_at_max:
-                query_params['start_at_max'] = start_at_max
-            if team_member_id:
-                query_params['team_member_id'] = team_member_id
-            
-            result = self.bookings_api.list(**query_params)
-            
-            # New Square SDK returns a SyncPager object
-            # Access bookings via the 'items' property (not method)
-            # Also check for pagination via iter_pages()
-            all_bookings = []
-            
-            if hasattr(result, 'iter_pages'):
-                # Use pagination to get all results
-                try:
-                    for page in result.iter_pages():
-                        if hasattr(page, 'items'):
-                            page_items = page.items
-                            if isinstance(page_items, list):
-                                all_bookings.extend(page_items)
-                            else:
-                                all_bookings.extend(list(page_items) if page_items else [])
-                        elif hasattr(page, 'bookings'):
-                            all_bookings.extend(page.bookings or [])
-                except Exception as e:
-                    logger.warning(f"Error iterating pages, falling back to items: {e}")
-                    # Fallback to items property
-                    if hasattr(result, 'items'):
-                        items = result.items
-                        if isinstance(items, list):
-                            all_bookings = items
-                        else:
-                            all_bookings = list(items) if items else []
-            elif hasattr(result, 'items'):
-                # items is a property that returns a list of bookings
-                bookings = result.items
-                if isinstance(bookings, list):
-                    all_bookings = bookings
-                else:
-                    # Convert to list if it's iterable
-                    all_bookings = list(bookings) if bookings else []
-            
-            if all_bookings:
-                return all_bookings
-            elif hasattr(result, 'body'):
-                # Fallback: direct response with body
-                return result.body.get('bookings', [])
-            elif hasattr(result, 'bookings'):
-                # Fallback: direct response with bookings attribute
-                return result.bookings or []
-            else:
-                logger.warning(f"Could not parse bookings response: {type(result)}")
-                return []
+            query_params = self._list_params(start_at_min, start_at_max, team_member_id)
+            return [booking for page in self._iter_raw_pages(query_params) for booking in page]
         except Exception as e:
             logger.error(f"Exception listing bookings: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
             return []
     
+    def _list_params(self, start_at_min, start_at_max, team_member_id):
+        """ListBookings query parameters for this location."""
+        query_params = {'location_id': Config.SQUARE_LOCATION_ID}
+        if start_at_min:
+            query_params['start_at_min'] = start_at_min
+        if start_at_max:
+            query_params['start_at_max'] = start_at_max
+        if team_member_id:
+            query_params['team_member_id'] = team_member_id
+        return query_params
+    
+    def _iter_raw_pages(self, query_params):
+        """Yield the raw items of each ListBookings page, each page fetched through the scheduler."""
+        page = self._read('bookings', self.bookings_api.list, **query_params)
+        while page is not None:
+            if page.items:
+                yield page.items
+            if not page.has_next or page.get_next is None:
+                return
+            # Callers that shared this page also share the request for the next one
+            page = _in_flight.do(
+                ('bookings', 'next_page', id(page)), get_request_scheduler().call, 'bookings', page.get_next
+            )
+    
+    def iter_booking_pages(self, start_at_min=None, start_at_max=None, team_member_id=None):
+        """
+        Yield bookings one page at a time, normalized into square_models.Booking.
+        
+        Only the current page is held, so long scans use little memory and
+        callers can process a page before the next one is requested. A range
+        longer than MAX_LIST_WINDOW is listed in consecutive windows.
+        
+        Raises:
+            SquareRequestError: A page failed, instead of returning the
+                pages fetched so far as if they were everything
+        """
+        windows = self._list_windows(start_at_min, start_at_max)
+        seen = set()
+        for window_min, window_max in windows:
+            query_params = self._list_params(window_min, window_max, team_member_id)
+            for items in self._iter_raw_pages(query_params):
+                bookings = [Booking.from_square(booking) for booking in items]
+                if len(windows) > 1:
+                    # A booking starting exactly on a window boundary may be listed twice
+                    bookings = [b for b in bookings if b.id not in seen]
+                    seen.update(b.id for b in bookings)
+                if bookings:
+                    yield bookings
+    
+    def list_booking_models(self, start_at_min=None, start_at_max=None, team_member_id=None):
+        """
+        All pages of iter_booking_pages as one list (raises on failure).
+        
+        Application code should use this or iter_booking_pages rather than
+        list_bookings, which returns raw SDK objects and hides errors (kept
+        for the diagnostic scripts).
+        """
+        return [
+            booking
+            for page in self.iter_booking_pages(start_at_min, start_at_max, team_member_id)
+            for booking in page
+        ]
+    
+    def _list_windows(self, start_at_min, start_at_max):
+        """Split [start_at_min, start_at_max) into windows Square accepts."""
+        if not start_at_min or not start_at_max:
+            return [(start_at_min, start_at_max)]
+        window_start = parser.isoparse(start_at_min)
+        end = parser.isoparse(start_at_max)
+        if end - window_start <= self.MAX_LIST_WINDOW:
+            return [(start_at_min, start_at_max)]
+        
+        windows = []
+        while window_start < end:
+            window_end = min(window_start + self.MAX_LIST_WINDOW, end)
+            windows.append((window_start.isoformat(), window_end.isoformat()))
+            window_start = window_end
+        return windows
+    
     def create_blocked_time(self, team_member_id: str, start_at: str, duration_minutes: int, 
                            appointment_segments=None):
-        """Create blocked time for a team member."""
-        try:
-            # If appointment_segments not provided, create a default one
-            if appointment_segments is None:
-                appointment_segments = [
-                    {
-                        'team_member_id': team_member_id,
-                        'service_variation_version': 1,
-                        'duration_minutes': duration_minutes
-                    }
-                ]
-            
-            booking_data = {
-                'location_id': Config.SQUARE_LOCATION_ID,
-                'start_at': start_at,
-                'status': 'ACCEPTED',
-                'appointment_segments': appointment_segments
-            }
-            
-            result = self.bookings_api.create(booking=booking_data)
-            # New SDK returns the response object directly
-            if hasattr(result, 'body'):
-                booking = result.body.get('booking')
-            elif hasattr(result, 'booking'):
-                booking = result.booking
-            else:
-                booking = None
-            
-            if booking:
-                logger.info(f"Created blocked time for team member {team_member_id}")
-                return booking
-            else:
-                logger.error(f"Error creating blocked time: {result}")
-                return None
-        except Exception as e:
-            logger.error(f"Exception creating blocked time: {e}")
-            return None
+        """
+        Create blocked time for a team member.
+        
+        Raises:
+            SquareRequestError: The request failed (retries reuse one
+                idempotency key, so they never create a second booking)
+        """
+        # If appointment_segments not provided, create a default one
+        if appointment_segments is None:
+            appointment_segments = [
+                {
+                    'team_member_id': team_member_id,
+                    'service_variation_version': 1,
+                    'duration_minutes': duration_minutes
+                }
+            ]
+        
+        booking_data = {
+            'location_id': Config.SQUARE_LOCATION_ID,
+            'start_at': start_at,
+            'status': 'ACCEPTED',
+            'appointment_segments': appointment_segments
+        }
+        
+        result = self._call(
+            'bookings', self.bookings_api.create, booking=booking_data, idempotency_key=str(uuid.uuid4())
+        )
+        booking = getattr(result, 'booking', None)
+        if booking:
+            logger.info(f"Created blocked time for team member {team_member_id}")
+        else:
+            logger.error(f"Error creating blocked time: {result}")
+        return booking
     
     def cancel_booking(self, booking_id: str, booking_version: int):
-        """Cancel a booking."""
-        try:
-            # Get the current booking to preserve other fields
-            current_booking = self.get_booking(booking_id)
-            if not current_booking:
-                logger.error(f"Cannot cancel booking {booking_id}: booking not found")
-                return None
-            
-            # Cancel booking
-            result = self.bookings_api.cancel(
-                booking_id=booking_id,
-                booking_version=booking_version
-            )
-            # New SDK returns the response object directly
-            if hasattr(result, 'body'):
-                booking = result.body.get('booking')
-            elif hasattr(result, 'booking'):
-                booking = result.booking
-            else:
-                booking = None
-            
-            if booking:
-                logger.info(f"Cancelled booking {booking_id}")
-                return booking
-            else:
-                logger.error(f"Error cancelling booking: {result}")
-                return None
-        except Exception as e:
-            logger.error(f"Exception cancelling booking: {e}")
+        """
+        Cancel a booking (None if it does not exist).
+        
+        Raises:
+            SquareRequestError: The request failed
+        """
+        # Get the current booking to preserve other fields
+        current_booking = self.get_booking(booking_id)
+        if not current_booking:
+            logger.error(f"Cannot cancel booking {booking_id}: booking not found")
             return None
+        
+        # Cancel booking
+        result = self._call(
+            'bookings',
+            self.bookings_api.cancel,
+            booking_id=booking_id,
+            booking_version=booking_version,
+            idempotency_key=str(uuid.uuid4())
+        )
+        booking = getattr(result, 'booking', None)
+        if booking:
+            logger.info(f"Cancelled booking {booking_id}")
+        else:
+            logger.error(f"Error cancelling booking: {result}")
+        return booking
     
     def get_team_members(self):
-        """Get all team members (therapists)."""
-        try:
-            result = self.team_members_api.search(
-                query={
-                    'filter': {
-                        'location_ids': [Config.SQUARE_LOCATION_ID],
-                        'status': 'ACTIVE'
-                    }
+        """
+        Get all active team members (therapists) of the location.
+        
+        Raises:
+            SquareRequestError: The request failed (so it is not mistaken for an empty team)
+        """
+        result = self._read(
+            'team',
+            self.team_members_api.search,
+            query={
+                'filter': {
+                    'location_ids': [Config.SQUARE_LOCATION_ID],
+                    'status': 'ACTIVE'
                 }
+            }
+        )
+        return getattr(result, 'team_members', None) or []
+    
+    def get_team_member_models(self):
+        """get_team_members, normalized into square_models.TeamMember records."""
+        return [TeamMember.from_square(member) for member in self.get_team_members()]
+    
+    def build_availability_index(self, window_start, window_end):
+        """
+        Scan the location's bookings once and index who is busy when.
+        
+        Bookings starting up to AVAILABILITY_LOOKBACK before window_start are
+        included, so appointments already running at window_start count.
+        
+        Args:
+            window_start: Start of the window (aware datetime)
+            window_end: End of the window (aware datetime)
+        
+        Returns:
+            AvailabilityIndex covering [window_start, window_end)
+        """
+        bookings = (
+            booking
+            for page in self.iter_booking_pages(
+                start_at_min=(window_start - self.AVAILABILITY_LOOKBACK).isoformat(),
+                start_at_max=window_end.isoformat()
             )
-            # New SDK returns the response object directly
-            if hasattr(result, 'body'):
-                return result.body.get('team_members', [])
-            elif hasattr(result, 'team_members'):
-                return result.team_members or []
-            else:
-                return []
-        except Exception as e:
-            logger.error(f"Exception retrieving team members: {e}")
-            return []
+            for booking in page
+        )
+        return AvailabilityIndex.from_bookings(bookings, window_start, window_end)
     
     def get_available_team_member(self, start_at: str, duration_minutes: int, 
-                                  exclude_team_member_id: str):
-        """Find an available team member for the given time slot."""
-        try:
-            from datetime import datetime, timedelta
-            from dateutil import parser
-            
-            # Parse the start time
-            start_dt = parser.parse(start_at)
-            end_dt = start_dt + timedelta(minutes=duration_minutes)
-            
-            # Get all team members
-            all_members = self.get_team_members()
-            
-            # Filter to therapists if configured
-            if Config.THERAPIST_IDS:
-                members = [m for m in all_members if m.get('id') in Config.THERAPIST_IDS]
-            else:
-                members = all_members
-            
-            # Exclude the already assigned therapist
-            members = [m for m in members if m.get('id') != exclude_team_member_id]
-            
-            if not members:
-                logger.warning("No available therapists found")
-                return None
-            
-            # Check availability for each member
-            for member in members:
-                member_id = member.get('id')
-                
-                # Get existing bookings for this member in the time range
-                bookings = self.list_bookings(
-                    start_at_min=start_at,
-                    start_at_max=end_dt.isoformat(),
-                    team_member_id=member_id
-                )
-                
-                # Filter out cancelled bookings
-                active_bookings = [
-                    b for b in bookings 
-                    if b.get('status') not in ['CANCELLED_BY_CUSTOMER', 'CANCELLED_BY_SELLER', 'DECLINED']
-                ]
-                
-                # Check if this member has any conflicts
-                has_conflict = False
-                for booking in active_bookings:
-                    booking_start = parser.parse(booking.get('start_at'))
-                    booking_end = booking_start + timedelta(
-                        minutes=booking.get('appointment_segments', [{}])[0].get('duration_minutes', 0)
-                    )
-                    
-                    # Check for overlap
-                    if not (end_dt <= booking_start or start_dt >= booking_end):
-                        has_conflict = True
-                        break
-                
-                if not has_conflict:
-                    logger.info(f"Found available therapist: {member_id}")
-                    return member
-            
-            logger.warning("No available therapists found for the time slot")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Exception finding available team member: {e}")
+                                  exclude_team_member_id: str, team_members=None,
+                                  availability=None):
+        """
+        Find an available team member for the given time slot.
+        
+        Args:
+            start_at: Start of the slot (ISO 8601)
+            duration_minutes: Length of the slot
+            exclude_team_member_id: Team member who already has the booking
+            team_members: TeamMember records to consider (fetched from Square when None)
+            availability: AvailabilityIndex to answer from; when None or not
+                covering the slot, one is built with a single booking scan
+        
+        Returns:
+            The first free TeamMember, or None when nobody is free
+        
+        Raises:
+            SquareRequestError: The team list or the booking scan failed, so
+                callers can retry instead of treating the slot as taken
+        """
+        # Parse the start time
+        start_dt = parser.parse(start_at)
+        end_dt = start_dt + timedelta(minutes=duration_minutes)
+        
+        # Get all team members
+        all_members = team_members if team_members is not None else self.get_team_member_models()
+        
+        # Filter to therapists if configured
+        if Config.THERAPIST_IDS:
+            members = [m for m in all_members if m.id in Config.THERAPIST_IDS]
+        else:
+            members = all_members
+        
+        # Exclude the already assigned therapist
+        members = [m for m in members if m.id != exclude_team_member_id]
+        
+        if not members:
+            logger.warning("No available therapists found")
             return None
+        
+        # One location-wide scan instead of one list call per therapist
+        if availability is None or not availability.covers(start_dt, end_dt):
+            availability = self.build_availability_index(start_dt, end_dt)
+        
+        for member in members:
+            if availability.is_free(member.id, start_dt, end_dt):
+                logger.info(f"Found available therapist: {member.id}")
+                return member
+        
+        logger.warning("No available therapists found for the time slot")
+        return None
     
     def get_customer(self, customer_id: str):
-        """Retrieve a customer by ID."""
+        """
+        Retrieve a customer by ID (None if there is no such customer).
+        
+        Raises:
+            SquareRequestError: The request failed, e.g. 403 when the token
+                lacks CUSTOMERS_READ, or Square kept throttling
+        """
         if not self.customers_api or not customer_id:
             logger.debug(f"Customer API not available or no customer_id provided: customers_api={self.customers_api is not None}, customer_id={bool(customer_id)}")
             return None
         
         try:
-            # Use 'get' method - returns GetCustomerResponse object
             # GetCustomerResponse has: customer (Customer object or None) and errors (list or None)
-            result = self.customers_api.get(customer_id=customer_id)
-            
-            # Check for errors first
-            if hasattr(result, 'errors') and result.errors:
-                error_messages = [str(e) for e in result.errors]
-                logger.warning(f"Customer API returned errors for {customer_id[:8]}...: {', '.join(error_messages)}")
+            result = self._read('customers', self.customers_api.get, customer_id=customer_id)
+        except SquareRequestError as e:
+            if e.status_code == 404:
+                logger.warning(f"Customer {customer_id[:8]}... not found")
                 return None
-            
-            # Check if customer data exists
-            if hasattr(result, 'customer') and result.customer is not None:
-                customer = result.customer
-                logger.debug(f"Successfully retrieved customer {customer_id[:8]}...")
-                return customer
-            else:
-                logger.warning(f"Customer API returned no customer data for {customer_id[:8]}... (customer field is None)")
-                return None
-                
-        except AttributeError as e:
-            logger.warning(f"Customer API method not available (might need CUSTOMERS_READ permission): {e}")
-            return None
-        except Exception as e:
-            logger.warning(f"Exception retrieving customer {customer_id[:8]}...: {e}")
-            import traceback
-            logger.debug(traceback.format_exc())
+            raise
+        
+        # Check for errors first
+        if getattr(result, 'errors', None):
+            error_messages = [str(e) for e in result.errors]
+            logger.warning(f"Customer API returned errors for {customer_id[:8]}...: {', '.join(error_messages)}")
             return None
+        
+        customer = getattr(result, 'customer', None)
+        if customer is None:
+            logger.warning(f"Customer API returned no customer data for {customer_id[:8]}... (customer field is None)")
+        else:
+            logger.debug(f"Successfully retrieved customer {customer_id[:8]}...")
+        return customer
+    
+    def bulk_get_customers(self, customer_ids):
+        """
+        Retrieve several customers (up to 100) in one request.
+        
+        Returns:
+            Dict mapping customer_id to the customer object. IDs Square could
+            not return (e.g. NOT_FOUND) are left out.
+        
+        Raises:
+            SquareRequestError: The request itself failed (for example 403
+                when the token lacks CUSTOMERS_READ), so callers can tell a
+                failed request from missing customers.
+        """
+        if not self.customers_api or not customer_ids:
+            return {}
+        
+        result = self._read('customers', self.customers_api.bulk_retrieve_customers, customer_ids=list(customer_ids))
+        responses = getattr(result, 'responses', None) or {}
+        
+        customers = {}
+        for customer_id, response in responses.items():
+            customer = getattr(response, 'customer', None)
+            if customer is not None:
+                customers[customer_id] = customer
+            elif getattr(response, 'errors', None):
+                logger.debug(f"Customer {customer_id[:8]}... not returned: {response.errors}")
+        return customers
+    
+    def search_catalog_items(self, begin_time=None):
+        """
+        Retrieve catalog ITEMs (with their variations), following pagination.
+        
+        Args:
+            begin_time: RFC 3339 timestamp; when given, only items changed
+                since then are returned, including deleted ones
+        
+        Returns:
+            Tuple of (list of square_models.CatalogObject items, latest_time
+            reported by Square)
+        
+        Raises:
+            SquareRequestError: A request failed, so callers can keep their
+                previous catalog instead of treating it as empty.
+        """
+        objects = []
+        latest_time = None
+        cursor = None
+        while True:
+            params = {'object_types': ['ITEM'], 'include_deleted_objects': bool(begin_time)}
+            if begin_time:
+                params['begin_time'] = begin_time
+            if cursor:
+                params['cursor'] = cursor
+            result = self._read('catalog', self.client.catalog.search, **params)
+            objects.extend(CatalogObject.from_square(obj) for obj in getattr(result, 'objects', None) or [])
+            latest_time = getattr(result, 'latest_time', None) or latest_time
+            cursor = getattr(result, 'cursor', None)
+            if not cursor:
+                return objects, latest_time
+    
+    def get_catalog_object(self, object_id: str, include_related_objects: bool = False):
+        """
+        Retrieve one catalog object (raw SDK response).
+        
+        Raises:
+            SquareRequestError: The request failed
+        """
+        return self._read(
+            'catalog',
+            self.client.catalog.object.get,
+            object_id=object_id,
+            include_related_objects=include_related_objects
+        )
+    
+    def get_catalog_object_model(self, object_id: str, include_related_objects: bool = False):
+        """
+        get_catalog_object, normalized into square_models.CatalogObject records.
+        
+        Returns:
+            Tuple of (the object or None, list of related objects)
+        
+        Raises:
+            SquareRequestError: The request failed
+        """
+        result = self.get_catalog_object(object_id, include_related_objects)
+        obj = getattr(result, 'object', None)
+        related = getattr(result, 'related_objects', None) or []
+        return (
+            CatalogObject.from_square(obj) if obj is not None else None,
+            [CatalogObject.from_square(related_obj) for related_obj in related]
+        )
     
     def is_couples_massage(self, booking):
-        """Check if a booking is for a couple's massage."""
+        """Check if a booking (square_models.Booking) is for a couple's massage."""
         try:
-            # Handle both dict and Pydantic object formats
-            if isinstance(booking, dict):
-                segments = booking.get('appointment_segments', [])
-            else:
-                # Pydantic object - use attribute access
-                segments = getattr(booking, 'appointment_segments', []) or []
-            
+            segments = booking.segments
             if not segments:
                 return False
             
             # Check by service ID if configured
             if Config.COUPLES_MASSAGE_SERVICE_ID:
                 for segment in segments:
-                    if isinstance(segment, dict):
-                        service_id = segment.get('service_variation_id', '')
-                    else:
-                        service_id = getattr(segment, 'service_variation_id', '') or ''
-                    
-                    if service_id == Config.COUPLES_MASSAGE_SERVICE_ID:
+                    if segment.service_variation_id == Config.COUPLES_MASSAGE_SERVICE_ID:
                         return True
             
             # Check by service name pattern
+            pattern = Config.COUPLES_MASSAGE_SERVICE_NAME_PATTERN.lower()
             for segment in segments:
-                if isinstance(segment, dict):
-                    service_name = segment.get('service_variation_name', '').lower()
-                else:
-                    service_name = (getattr(segment, 'service_variation_name', '') or '').lower()
-                
-                if Config.COUPLES_MASSAGE_SERVICE_NAME_PATTERN.lower() in service_name:
+                if pattern in segment.service_variation_name.lower():
                     return True
             
             return False
         except Exception as e:
             logger.error(f"Exception checking if couples massage: {e}")
             return False
-
@@ -0,0 +1,198 @@
+"""Compact internal records for Square bookings, team members and catalog objects.
+
+Square responses arrive as SDK (pydantic) objects or, from older code paths
+and tests, as plain dicts. ``from_square`` reads either shape once at the
+client edge; everything downstream uses plain attributes.
+"""
+from typing import Any, Optional, Tuple
+
+CANCELLED_STATUSES = frozenset(['CANCELLED_BY_CUSTOMER', 'CANCELLED_BY_SELLER', 'DECLINED'])
+
+
+def _field(obj: Any, key: str, default: Any = None) -> Any:
+    """Read key from a dict or attribute from an SDK object (None counts as missing)."""
+    if isinstance(obj, dict):
+        value = obj.get(key)
+    else:
+        value = getattr(obj, key, None)
+    return default if value is None else value
+
+
+class Segment:
+    """One appointment segment: a service performed by a team member."""
+
+    __slots__ = (
+        'team_member_id', 'duration_minutes', 'service_variation_id',
+        'service_variation_name', 'service_variation_version'
+    )
+
+    def __init__(
+        self,
+        team_member_id: str = '',
+        duration_minutes: int = 60,
+        service_variation_id: str = '',
+        service_variation_name: str = '',
+        service_variation_version: Optional[int] = None
+    ):
+        self.team_member_id = team_member_id
+        self.duration_minutes = duration_minutes
+        self.service_variation_id = service_variation_id
+        self.service_variation_name = service_variation_name
+        self.service_variation_version = service_variation_version
+
+    @classmethod
+    def from_square(cls, segment: Any) -> 'Segment':
+        """Build a Segment from a Square appointment segment (dict or SDK object)."""
+        if isinstance(segment, cls):
+            return segment
+        return cls(
+            team_member_id=_field(segment, 'team_member_id', ''),
+            duration_minutes=_field(segment, 'duration_minutes', 60),
+            service_variation_id=_field(segment, 'service_variation_id', ''),
+            service_variation_name=_field(segment, 'service_variation_name', ''),
+            service_variation_version=_field(segment, 'service_variation_version')
+        )
+
+
+class Booking:
+    """A Square booking with the fields this project uses."""
+
+    __slots__ = ('id', 'status', 'start_at', 'customer_id', 'customer_note', 'version', 'segments')
+
+    def __init__(
+        self,
+        id: str = '',
+        status: str = 'ACCEPTED',
+        start_at: str = '',
+        customer_id: str = '',
+        customer_note: str = '',
+        version: Optional[int] = None,
+        segments: Tuple[Segment, ...] = ()
+    ):
+        self.id = id
+        self.status = status
+        self.start_at = start_at
+        self.customer_id = customer_id
+        self.customer_note = customer_note
+        self.version = version
+        self.segments = segments
+
+    @classmethod
+    def from_square(cls, booking: Any) -> 'Booking':
+        """Build a Booking from a Square booking (dict or SDK object)."""
+        if isinstance(booking, cls):
+            return booking
+        return cls(
+            id=_field(booking, 'id', ''),
+            status=_field(booking, 'status', 'ACCEPTED'),
+            start_at=str(_field(booking, 'start_at', '')),
+            customer_id=_field(booking, 'customer_id', ''),
+            customer_note=_field(booking, 'customer_note', ''),
+            version=_field(booking, 'version'),
+            segments=tuple(Segment.from_square(s) for s in _field(booking, 'appointment_segments', ()))
+        )
+
+    @property
+    def is_cancelled(self) -> bool:
+        """Whether the booking was cancelled or declined."""
+        return self.status in CANCELLED_STATUSES
+
+    @property
+    def duration_minutes(self) -> int:
+        """Total length of all segments."""
+        return sum(segment.duration_minutes for segment in self.segments)
+
+
+class TeamMember:
+    """A Square team member."""
+
+    __slots__ = ('id', 'given_name', 'family_name', 'display_name', 'status')
+
+    def __init__(
+        self,
+        id: str = '',
+        given_name: str = '',
+        family_name: str = '',
+        display_name: str = '',
+        status: str = ''
+    ):
+        self.id = id
+        self.given_name = given_name
+        self.family_name = family_name
+        self.display_name = display_name
+        self.status = status
+
+    @classmethod
+    def from_square(cls, member: Any) -> 'TeamMember':
+        """Build a TeamMember from a Square team member (dict or SDK object)."""
+        if isinstance(member, cls):
+            return member
+        return cls(
+            id=_field(member, 'id', ''),
+            given_name=_field(member, 'given_name', ''),
+            family_name=_field(member, 'family_name', ''),
+            display_name=_field(member, 'display_name', ''),
+            status=_field(member, 'status', '')
+        )
+
+    @property
+    def name(self) -> str:
+        """Display name: full name, else display name, else the id."""
+        return f"{self.given_name} {self.family_name}".strip() or self.display_name or self.id
+
+
+class CatalogObject:
+    """A catalog ITEM or ITEM_VARIATION with the fields used to name services."""
+
+    __slots__ = (
+        'id', 'type', 'is_deleted', 'present_at_all_locations', 'present_at_location_ids',
+        'absent_at_location_ids', 'name', 'item_id', 'variations'
+    )
+
+    def __init__(
+        self,
+        id: str = '',
+        type: str = '',
+        is_deleted: bool = False,
+        present_at_all_locations: bool = False,
+        present_at_location_ids: Tuple[str, ...] = (),
+        absent_at_location_ids: Tuple[str, ...] = (),
+        name: str = '',
+        item_id: str = '',
+        variations: Tuple['CatalogObject', ...] = ()
+    ):
+        self.id = id
+        self.type = type
+        self.is_deleted = is_deleted
+        self.present_at_all_locations = present_at_all_locations
+        self.present_at_location_ids = present_at_location_ids
+        self.absent_at_location_ids = absent_at_location_ids
+        self.name = name
+        self.item_id = item_id
+        self.variations = variations
+
+    @classmethod
+    def from_square(cls, obj: Any) -> 'CatalogObject':
+        """
+        Build a CatalogObject from a Square catalog object (dict or SDK object).
+
+        The name comes from item_data for an ITEM (whose variations are
+        converted too) and from item_variation_data for an ITEM_VARIATION,
+        which also records its parent item_id.
+        """
+        if isinstance(obj, cls):
+            return obj
+        item_data = _field(obj, 'item_data')
+        variation_data = _field(obj, 'item_variation_data')
+        data = item_data if item_data is not None else variation_data
+        return cls(
+            id=_field(obj, 'id', ''),
+            type=_field(obj, 'type', ''),
+            is_deleted=_field(obj, 'is_deleted', False),
+            present_at_all_locations=_field(obj, 'present_at_all_locations', False),
+            present_at_location_ids=tuple(_field(obj, 'present_at_location_ids', ())),
+            absent_at_location_ids=tuple(_field(obj, 'absent_at_location_ids', ())),
+            name=_field(data, 'name', ''),
+            item_id=_field(variation_data, 'item_id', ''),
+            variations=tuple(cls.from_square(v) for v in _field(item_data, 'variations', ()))
+        )
@@ -186,6 +186,20 @@ async function loadDay() {
     }
 }
 
+/**
+ * Merge changed events from PUT /api/room into the current day and re-render
+ */
+function applyChangedEvents(changedEvents) {
+    const changedById = new Map(changedEvents.map(e => [e.booking_id, e]));
+    currentData.events = currentData.events.map(e => changedById.get(e.booking_id) || e);
+    
+    renderCalendar(currentData);
+    showUnassigned(currentData.events);
+    setTimeout(() => {
+        updateCurrentTimeLine();
+    }, 200);
+}
+
 function refreshDay() {
     loadDay();
 }
@@ -647,13 +661,20 @@ function createAppointmentBlock(appointment, timeSlot, slotIndex, allTimeSlots,
                     
                     const result = await response.json();
                     console.log(`[ROOM UPDATE] Success:`, result);
-                    console.log(`[ROOM UPDATE] Reloading calendar...`);
                     
-                    // Reload the calendar to show updated assignments
-                    // Use a small delay to ensure server has processed the update
-                    await new Promise(resolve => setTimeout(resolve, 100));
-                    await loadDay();
-                    console.log(`[ROOM UPDATE] Calendar reloaded`);
+                    if (result.incremental && currentData) {
+                        // Server repaired the day in place - patch only the changed events
+                        applyChangedEvents(result.changed_events || []);
+                        console.log(`[ROOM UPDATE] Patched ${(result.changed_events || []).length} events`);
+                    } else {
+                        console.log(`[ROOM UPDATE] Reloading calendar...`);
+                        
+                        // Reload the calendar to show updated assignments
+                        // Use a small delay to ensure server has processed the update
+                        await new Promise(resolve => setTimeout(resolve, 100));
+                        await loadDay();
+                        console.log(`[ROOM UPDATE] Calendar reloaded`);
+                    }
                     
                 } catch (error) {
                     console.error('[ROOM UPDATE] Error:', error);
@@ -55,7 +55,7 @@ def test_list_bookings():
         client = SquareBookingsClient()
         
         # Try to list recent bookings
-        bookings = client.list_bookings()
+        bookings = client.list_booking_models()
         print(f"[OK] Successfully retrieved bookings API")
         print(f"[OK] Found {len(bookings)} booking(s) in recent time range")
         
@@ -1,10 +1,24 @@
 """Test cases for room assignment logic."""
+import asyncio
 import sys
+import time
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
+from dateutil import parser
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.database import Base
-from app.room_assigner import RoomAssigner
+from app.booking_record import BookingRecord, parse_timestamp
+from app.booking_snapshots import BookingSnapshots
+from app.catalog_index import CatalogIndex
+from app.lookup_store import LookupStore
+from app.assignment_engines import GreedyEngine, OptimalEngine
+from app.models import RoomAssignment
+from app.room_assigner import RoomAssigner, planning_pool
+from app.room_schedule import RoomSchedule, find_room_conflicts
+from app.square_service import SquareService
+from app.team_directory import TeamDirectory
+from square_models import Booking, CatalogObject, Segment, TeamMember
+from ttl_cache import TTLCache, cache_stats
 
 
 def create_test_db():
@@ -359,12 +373,1408 @@ def test_02d_blocks_both_rooms():
     print("[PASS] Test: 02D blocks both rooms PASSED")
 
 
+def test_manager_override_only_blocks_its_own_time():
+    """Test that a later manager override doesn't block the room earlier in the day"""
+    print("\n=== Test: Manager override only blocks its own time ===")
+    db = create_test_db()
+    assigner = RoomAssigner(db)
+    
+    date = "2026-01-06"
+    base_time = datetime(2026, 1, 6, 10, 0, 0)
+    
+    # Manager put the 15:00 couple in room 5
+    db.add(RoomAssignment(booking_id='c_late', room='5', assigned_by='manager', date=date))
+    db.commit()
+    
+    bookings = [
+        {
+            'booking_id': 'c_late',
+            'therapist': 'Katy',
+            'start_at': (base_time + timedelta(hours=5)).isoformat(),
+            'end_at': (base_time + timedelta(hours=6)).isoformat(),
+            'customer': 'CoupleLate',
+            'service': "Couple's Massage",
+            'type': 'couple'
+        },
+        {
+            'booking_id': 'c_early',
+            'therapist': 'May',
+            'start_at': (base_time + timedelta(hours=0)).isoformat(),
+            'end_at': (base_time + timedelta(hours=1)).isoformat(),
+            'customer': 'CoupleEarly',
+            'service': "Couple's Massage",
+            'type': 'couple'
+        },
+        {
+            'booking_id': 'c_overlap',
+            'therapist': 'Jenny',
+            'start_at': (base_time + timedelta(hours=4, minutes=30)).isoformat(),
+            'end_at': (base_time + timedelta(hours=5, minutes=30)).isoformat(),
+            'customer': 'CoupleOverlap',
+            'service': "Couple's Massage",
+            'type': 'couple'
+        },
+    ]
+    
+    assigned = {b['booking_id']: b['room'] for b in assigner.assign_rooms(bookings, date)}
+    
+    print(f"Rooms assigned: {assigned}")
+    
+    assert assigned['c_late'] == '5', f"Manager override should be kept, got {assigned['c_late']}"
+    # 10:00-11:00 doesn't touch the 15:00-16:00 override, so room 5 is still usable
+    assert assigned['c_early'] == '5', f"Early couple should get room 5, got {assigned['c_early']}"
+    # 14:30-15:30 overlaps the override and must move on to room 6
+    assert assigned['c_overlap'] == '6', f"Overlapping couple should get room 6, got {assigned['c_overlap']}"
+    print("[PASS] Test: Manager override only blocks its own time PASSED")
+
+
+def test_room_schedule_intervals():
+    """Test RoomSchedule free/busy queries, merging and 02D expansion"""
+    print("\n=== Test: RoomSchedule intervals ===")
+    schedule = RoomSchedule()
+    
+    schedule.mark_busy('1', 100, 200)
+    schedule.mark_busy('1', 300, 400)
+    assert schedule.is_free('1', 200, 300), "Gap between intervals should be free"
+    assert not schedule.is_free('1', 150, 160), "Inside an interval should be busy"
+    assert not schedule.is_free('1', 50, 101), "Overlapping the start should be busy"
+    assert not schedule.is_free('1', 250, 350), "Overlapping the next interval should be busy"
+    
+    # Merging keeps intervals disjoint
+    schedule.mark_busy('1', 180, 320)
+    assert schedule.blocking_interval('1', 250, 260) == (100, 400)
+    
+    # 02D occupies both 0 and 2
+    schedule.mark_busy('02D', 100, 200)
+    assert not schedule.is_free('0', 100, 200)
+    assert not schedule.is_free('2', 100, 200)
+    schedule.mark_busy('0', 500, 600)
+    assert not schedule.is_free('02D', 550, 560), "02D needs room 0 free too"
+    assert schedule.is_free('2', 550, 560)
+    print("[PASS] Test: RoomSchedule intervals PASSED")
+
+
+def test_booking_record_parsing():
+    """Test BookingRecord parses UTC 'Z' and offset times to the same epoch seconds"""
+    print("\n=== Test: BookingRecord parsing ===")
+    record = BookingRecord.from_dict({
+        'booking_id': 'b1',
+        'therapist': 'Katy',
+        'start_at': '2026-01-06T18:00:00Z',
+        'end_at': '2026-01-06T19:00:00+00:00',
+        'type': 'couple'
+    })
+    
+    assert record.start == parse_timestamp('2026-01-06T10:00:00-08:00')
+    assert record.end - record.start == 3600, f"Expected 1 hour, got {record.end - record.start}s"
+    assert record.is_couple and record.type == 'couple'
+    assert isinstance(record.start, int) and isinstance(record.end, int)
+    print("[PASS] Test: BookingRecord parsing PASSED")
+
+
+def test_find_room_conflicts():
+    """Test sweep-line conflict detection per physical room, with 02D expanded"""
+    print("\n=== Test: find_room_conflicts ===")
+    
+    def record(booking_id, start, end):
+        return BookingRecord(booking_id, start, end, False, '', {})
+    
+    a = record('a', 100, 200)
+    b = record('b', 150, 250)
+    c = record('c', 200, 300)  # touches a, overlaps b
+    d = record('d', 120, 180)
+    e = record('e', 130, 140)
+    
+    conflicts = find_room_conflicts([
+        ('1', a), ('1', b), ('1', c),
+        ('02D', d), ('02D', e),  # collide in both 0 and 2, reported once
+        ('0', record('f', 500, 600)), ('02D', record('g', 550, 650)),
+        ('UNASSIGNED', record('h', 100, 300)),
+    ])
+    pairs = [(room, first.booking_id, second.booking_id) for room, first, second in conflicts]
+    
+    print(f"Conflicts: {pairs}")
+    assert pairs == [
+        ('1', 'a', 'b'),
+        ('0', 'd', 'e'),
+        ('1', 'b', 'c'),
+        ('0', 'f', 'g'),
+    ], f"Unexpected conflicts: {pairs}"
+    print("[PASS] Test: find_room_conflicts PASSED")
+
+
+def test_overlapping_manager_assignments_keep_first():
+    """Test that two overlapping manager assignments keep the earlier booking"""
+    print("\n=== Test: Overlapping manager assignments ===")
+    db = create_test_db()
+    assigner = RoomAssigner(db)
+    
+    date = "2026-01-06"
+    base_time = datetime(2026, 1, 6, 10, 0, 0)
+    
+    db.add(RoomAssignment(booking_id='m1', room='02D', assigned_by='manager', date=date))
+    db.add(RoomAssignment(booking_id='m2', room='2', assigned_by='manager', date=date))
+    db.commit()
+    
+    bookings = [
+        {
+            'booking_id': 'm2',
+            'therapist': 'May',
+            'start_at': (base_time + timedelta(minutes=30)).isoformat(),
+            'end_at': (base_time + timedelta(hours=1, minutes=30)).isoformat(),
+            'customer': 'Single1',
+            'service': 'Swedish Massage',
+            'type': 'single'
+        },
+        {
+            'booking_id': 'm1',
+            'therapist': 'Katy',
+            'start_at': (base_time + timedelta(hours=0)).isoformat(),
+            'end_at': (base_time + timedelta(hours=1)).isoformat(),
+            'customer': 'Couple1',
+            'service': "Couple's Massage",
+            'type': 'couple'
+        },
+    ]
+    
+    assigned = {b['booking_id']: b for b in assigner.assign_rooms(bookings, date)}
+    
+    print(f"Rooms assigned: {({k: v['room'] for k, v in assigned.items()})}")
+    assert assigned['m1']['room'] == '02D', f"Earlier manager booking should keep 02D, got {assigned['m1']['room']}"
+    assert assigned['m2']['room'] == 'UNASSIGNED', f"Later manager booking should be unassigned, got {assigned['m2']['room']}"
+    assert 'm1' in assigned['m2']['reason']
+    print("[PASS] Test: Overlapping manager assignments PASSED")
+
+
+def test_assignment_query_count_is_constant():
+    """Test that assign_rooms issues the same number of SQL statements for any day size"""
+    print("\n=== Test: Constant query count ===")
+    
+    def run_day(num_bookings):
+        db = create_test_db()
+        date = "2026-01-06"
+        base_time = datetime(2026, 1, 6, 9, 0, 0)
+        bookings = [
+            {
+                'booking_id': f'b{i}',
+                'therapist': 'Katy',
+                'start_at': (base_time + timedelta(minutes=20 * i)).isoformat(),
+                'end_at': (base_time + timedelta(minutes=20 * i + 60)).isoformat(),
+                'customer': f'Customer{i}',
+                'service': 'Swedish Massage',
+                'type': 'couple' if i % 3 == 0 else 'single'
+            }
+            for i in range(num_bookings)
+        ]
+        # Two overlapping manager overrides so the conflict path runs too
+        db.add(RoomAssignment(booking_id='b1', room='1', assigned_by='manager', date=date))
+        db.add(RoomAssignment(booking_id='b2', room='1', assigned_by='manager', date=date))
+        db.commit()
+        
+        statements = []
+        event.listen(db.get_bind(), 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        RoomAssigner(db).assign_rooms(bookings, date)
+        count = len(statements)
+        
+        rows = {row.booking_id: row for row in db.query(RoomAssignment).all()}
+        assert rows['b1'].assigned_by == 'manager' and rows['b1'].room == '1'
+        assert 'b2' not in rows, "Conflict loser should have been deleted"
+        assert rows['b0'].assigned_by == 'auto'
+        
+        # Running again updates auto rows in place and keeps manager rows
+        assigned = RoomAssigner(db).assign_rooms([dict(b) for b in bookings], date)
+        rooms = {b['booking_id']: b['room'] for b in assigned}
+        db.expire_all()
+        rows = {row.booking_id: row for row in db.query(RoomAssignment).all()}
+        assert rows['b1'].assigned_by == 'manager'
+        assert all(rows[b].room == room for b, room in rooms.items() if room != 'UNASSIGNED')
+        return count
+    
+    small = run_day(5)
+    large = run_day(60)
+    print(f"Statements for 5 bookings: {small}, for 60 bookings: {large}")
+    assert small == large, f"Query count grew with booking count: {small} vs {large}"
+    print("[PASS] Test: Constant query count PASSED")
+
+
+def test_unchanged_day_skips_recompute_and_writes():
+    """Test that rerunning an unchanged day reuses the cached result and writes nothing"""
+    print("\n=== Test: Unchanged day skips recompute ===")
+    db = create_test_db()
+    RoomAssigner.clear_cache()
+    
+    date = "2026-01-07"
+    base_time = datetime(2026, 1, 7, 10, 0, 0)
+    
+    def make_bookings(version):
+        return [
+            {
+                'booking_id': f'b{i}',
+                'therapist': 'Katy',
+                'start_at': (base_time + timedelta(minutes=30 * i)).isoformat(),
+                'end_at': (base_time + timedelta(minutes=30 * i + 60)).isoformat(),
+                'customer': f'Customer{i}',
+                'service': 'Swedish Massage',
+                'type': 'single',
+                'version': version
+            }
+            for i in range(6)
+        ]
+    
+    first = RoomAssigner(db).assign_rooms(make_bookings(1), date)
+    
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    second = RoomAssigner(db).assign_rooms(make_bookings(1), date)
+    
+    print(f"Statements on unchanged rerun: {statements}")
+    assert [b['room'] for b in second] == [b['room'] for b in first]
+    assert len(statements) == 1 and statements[0].lstrip().upper().startswith('SELECT'), \
+        f"Expected a single SELECT, got {statements}"
+    
+    # A manager override changes the fingerprint and forces a recompute
+    row = db.query(RoomAssignment).filter(RoomAssignment.booking_id == 'b1').first()
+    row.room = '6'
+    row.assigned_by = 'manager'
+    db.commit()
+    third = {b['booking_id']: b['room'] for b in RoomAssigner(db).assign_rooms(make_bookings(1), date)}
+    assert third['b1'] == '6', f"Manager override should apply, got {third['b1']}"
+    print("[PASS] Test: Unchanged day skips recompute PASSED")
+
+
+def test_incremental_override_repair():
+    """Test that a manager override only moves the bookings it collides with"""
+    print("\n=== Test: Incremental override repair ===")
+    db = create_test_db()
+    RoomAssigner.clear_cache()
+    
+    date = "2026-01-08"
+    base_time = datetime(2026, 1, 8, 10, 0, 0)
+    bookings = [
+        {
+            'booking_id': f's{i}',
+            'therapist': 'Katy',
+            'start_at': base_time.isoformat(),
+            'end_at': (base_time + timedelta(hours=1)).isoformat(),
+            'customer': f'Single{i}',
+            'service': 'Swedish Massage',
+            'type': 'single'
+        }
+        for i in range(1, 4)
+    ]
+    
+    # No state yet: caller must do a full recompute
+    assert RoomAssigner(db).apply_override(date, 's3', '1') is None
+    
+    before = {b['booking_id']: b['room'] for b in RoomAssigner(db).assign_rooms(bookings, date)}
+    assert before == {'s1': '1', 's2': '3', 's3': '4'}, f"Unexpected initial rooms: {before}"
+    
+    # Manager moves s3 into room 1 (saved first, like PUT /api/room does)
+    row = db.query(RoomAssignment).filter(RoomAssignment.booking_id == 's3').first()
+    row.room = '1'
+    row.assigned_by = 'manager'
+    db.commit()
+    
+    class RecordingEngine(GreedyEngine):
+        def __init__(self):
+            self.placed = []
+        
+        def place(self, records, schedule, trace=None):
+            self.placed.append([record.booking_id for record in records])
+            return super().place(records, schedule, trace)
+    
+    engine = RecordingEngine()
+    changed = RoomAssigner(db, engine=engine).apply_override(date, 's3', '1')
+    changed_rooms = {b['booking_id']: b['room'] for b in changed}
+    
+    print(f"Changed events: {changed_rooms}")
+    assert changed_rooms == {'s3': '1', 's1': '4'}, f"Unexpected changes: {changed_rooms}"
+    assert engine.placed == [['s1']], f"Evicted bookings should go through the engine, got {engine.placed}"
+    db.expire_all()
+    rows = {row.booking_id: row.room for row in db.query(RoomAssignment).all()}
+    assert rows == {'s1': '4', 's2': '3', 's3': '1'}, f"Unexpected stored rooms: {rows}"
+    
+    # The repaired state is what the next unchanged GET returns
+    after = {b['booking_id']: b['room'] for b in RoomAssigner(db).assign_rooms([dict(b) for b in bookings], date)}
+    assert after == rows, f"Expected repaired state to be reused, got {after}"
+    print("[PASS] Test: Incremental override repair PASSED")
+
+
+def test_optimal_engine_beats_greedy():
+    """Test that the optimal engine recovers a booking greedy first-fit leaves unassigned"""
+    print("\n=== Test: Optimal engine beats greedy ===")
+    RoomAssigner.clear_cache()
+    
+    date = "2026-01-09"
+    base_time = datetime(2026, 1, 9, 10, 0, 0)
+    spans = {'c1': (0, 120), 'c2': (0, 120), 'c3': (0, 90), 'c4': (0, 60), 'c5': (60, 150)}
+    
+    def make_bookings():
+        return [
+            {
+                'booking_id': booking_id,
+                'therapist': 'Katy',
+                'start_at': (base_time + timedelta(minutes=start)).isoformat(),
+                'end_at': (base_time + timedelta(minutes=end)).isoformat(),
+                'customer': f'Couple {booking_id}',
+                'service': 'Couples Massage',
+                'type': 'couple'
+            }
+            for booking_id, (start, end) in spans.items()
+        ]
+    
+    greedy = {b['booking_id']: b['room'] for b in RoomAssigner(create_test_db()).assign_rooms(make_bookings(), date)}
+    optimal = {
+        b['booking_id']: b['room']
+        for b in RoomAssigner(create_test_db(), engine=OptimalEngine(time_budget_ms=1000)).assign_rooms(make_bookings(), date)
+    }
+    
+    print(f"Greedy: {greedy}")
+    print(f"Optimal: {optimal}")
+    assert list(greedy.values()).count('UNASSIGNED') == 2, f"Expected greedy to leave 2 unassigned: {greedy}"
+    assert list(optimal.values()).count('UNASSIGNED') == 1, f"Expected optimal to leave 1 unassigned: {optimal}"
+    assert optimal['c4'] != 'UNASSIGNED' and optimal['c5'] == optimal['c4'], f"Expected c4 and c5 to share a room: {optimal}"
+    
+    # A day the engine cannot search falls back to the greedy result
+    RoomAssigner.clear_cache()
+    OptimalEngine.MAX_CLUSTER_SIZE, saved = 0, OptimalEngine.MAX_CLUSTER_SIZE
+    try:
+        fallback = {
+            b['booking_id']: b['room']
+            for b in RoomAssigner(create_test_db(), engine=OptimalEngine()).assign_rooms(make_bookings(), date)
+        }
+    finally:
+        OptimalEngine.MAX_CLUSTER_SIZE = saved
+    assert fallback == greedy, f"Expected greedy fallback, got {fallback}"
+    
+    # Out of budget before searching: the greedy placement is kept
+    RoomAssigner.clear_cache()
+    no_budget = {
+        b['booking_id']: b['room']
+        for b in RoomAssigner(create_test_db(), engine=OptimalEngine(time_budget_ms=0)).assign_rooms(make_bookings(), date)
+    }
+    assert no_budget == greedy, f"Expected the greedy placement without budget, got {no_budget}"
+    print("[PASS] Test: Optimal engine beats greedy PASSED")
+
+
+def test_assign_range_matches_single_days():
+    """Test that assign_range gives the per-day results with one load and one commit"""
+    print("\n=== Test: Multi-day assignment ===")
+    RoomAssigner.clear_cache()
+    
+    def make_day(day):
+        base_time = datetime(2026, 1, day, 10, 0, 0)
+        return [
+            {
+                'booking_id': f'd{day}_b{i}',
+                'therapist': 'Katy',
+                'start_at': (base_time + timedelta(minutes=30 * i)).isoformat(),
+                'end_at': (base_time + timedelta(minutes=30 * i + 90)).isoformat(),
+                'customer': f'Customer{i}',
+                'service': 'Swedish Massage',
+                'type': 'couple' if (i + day) % 2 == 0 else 'single'
+            }
+            for i in range(6)
+        ]
+    
+    dates = {f"2026-01-{day:02d}": day for day in (12, 13, 14)}
+    
+    expected = {}
+    for date, day in dates.items():
+        assigned = RoomAssigner(create_test_db()).assign_rooms(make_day(day), date)
+        expected[date] = [(b['booking_id'], b['room']) for b in assigned]
+    
+    RoomAssigner.clear_cache()
+    db = create_test_db()
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    commits = []
+    event.listen(db, 'after_commit', lambda session: commits.append(session))
+    
+    results = RoomAssigner(db).assign_range({date: make_day(day) for date, day in dates.items()})
+    got = {date: [(b['booking_id'], b['room']) for b in assigned] for date, assigned in results.items()}
+    
+    print(f"Statements: {len(statements)}, commits: {len(commits)}")
+    assert list(got) == list(dates), f"Dates out of order: {list(got)}"
+    assert got == expected, f"Range results differ from single days: {got} vs {expected}"
+    assert len(statements) == 2, f"Expected one SELECT and one upsert, got {statements}"
+    assert len(commits) == 1, f"Expected a single commit, got {len(commits)}"
+    stored_dates = {row.date for row in db.query(RoomAssignment).all()}
+    assert stored_dates == set(dates), f"Unexpected stored dates: {stored_dates}"
+    
+    # The optimal engine plans the days in the shared spawned worker pool, reused across calls
+    optimal = {}
+    for attempt in range(2):
+        RoomAssigner.clear_cache()
+        results = RoomAssigner(create_test_db(), engine=OptimalEngine(time_budget_ms=1000)).assign_range(
+            {date: make_day(day) for date, day in dates.items()}
+        )
+        optimal[attempt] = {date: [(b['booking_id'], b['room']) for b in assigned] for date, assigned in results.items()}
+        pool = planning_pool()
+        assert pool._mp_context.get_start_method() == 'spawn', "Planning workers must not be forked"
+        if attempt:
+            assert pool is first_pool, "Expected the planning pool to be reused"
+        first_pool = pool
+    RoomAssigner.clear_cache()
+    in_process = RoomAssigner(create_test_db(), engine=OptimalEngine(time_budget_ms=1000)).assign_range(
+        {date: make_day(day) for date, day in dates.items()}, max_workers=1
+    )
+    assert optimal[0] == optimal[1] == {
+        date: [(b['booking_id'], b['room']) for b in assigned] for date, assigned in in_process.items()
+    }, f"Pool results differ from planning in process: {optimal}"
+    print("[PASS] Test: Multi-day assignment PASSED")
+
+
+def test_decision_trace():
+    """Test that ?trace=1 style tracing records rejected rooms without changing results"""
+    print("\n=== Test: Decision trace ===")
+    db = create_test_db()
+    RoomAssigner.clear_cache()
+    
+    date = "2026-01-15"
+    base_time = datetime(2026, 1, 15, 10, 0, 0)
+    bookings = [
+        {
+            'booking_id': f's{i}',
+            'therapist': 'Katy',
+            'start_at': base_time.isoformat(),
+            'end_at': (base_time + timedelta(hours=1)).isoformat(),
+            'customer': f'Single{i}',
+            'service': 'Swedish Massage',
+            'type': 'single'
+        }
+        for i in range(1, 4)
+    ]
+    db.add(RoomAssignment(booking_id='s1', room='3', assigned_by='manager', date=date))
+    db.commit()
+    
+    assigner = RoomAssigner(db)
+    plain = {b['booking_id']: b['room'] for b in assigner.assign_rooms([dict(b) for b in bookings], date)}
+    assert assigner.traces == {}, "No trace should be collected unless requested"
+    
+    # Traced run of an unchanged day still plans it (and agrees with the cached result)
+    traced = {b['booking_id']: b['room'] for b in assigner.assign_rooms([dict(b) for b in bookings], date, trace=True)}
+    assert traced == plain, f"Tracing changed the result: {traced} vs {plain}"
+    
+    entries = {entry['booking_id']: entry for entry in assigner.traces[date]}
+    print(f"Trace: {entries}")
+    assert entries['s1']['decided_by'] == 'manager' and entries['s1']['room'] == '3'
+    assert entries['s2']['rejected'] == [], f"s2 should get room 1 first try: {entries['s2']}"
+    assert entries['s3']['rejected'] == [
+        {'room': '1', 'busy': '10:00-11:00'},
+        {'room': '3', 'busy': '10:00-11:00'}
+    ], f"Unexpected rejections for s3: {entries['s3']['rejected']}"
+    assert entries['s3']['room'] == '4' and entries['s3']['decided_by'] == 'greedy'
+    print("[PASS] Test: Decision trace PASSED")
+
+
+def test_team_directory():
+    """Test that the team directory loads once, indexes names and refreshes in the background"""
+    print("\n=== Test: Team directory ===")
+    calls = []
+    team = [
+        {'id': 'TM1', 'given_name': 'Katy', 'family_name': 'M'},
+        {'id': 'TM2', 'given_name': '', 'family_name': '', 'display_name': 'May L'},
+    ]
+    
+    def loader():
+        calls.append(1)
+        return list(team)
+    
+    directory = TeamDirectory(loader, ttl_seconds=3600, min_refresh_interval=3600)
+    assert directory.get_name('TM1') == 'Katy M'
+    assert directory.get_name('TM2') == 'May L'
+    assert directory.find_id('  katy   m ') == 'TM1'
+    assert sorted(directory.names()) == ['Katy M', 'May L']
+    assert directory.get_name('TM9') is None
+    assert len(calls) == 1, f"Expected a single team search, got {len(calls)}"
+    
+    # A stale snapshot is still served while the refresh runs in the background
+    team.append({'id': 'TM3', 'given_name': 'Jenny', 'family_name': 'L'})
+    directory.ttl_seconds = 0
+    directory.get_name('TM1')
+    directory._refresh_thread.join(timeout=5)
+    directory.ttl_seconds = 3600
+    assert directory.get_name('TM3') == 'Jenny L'
+    assert len(calls) == 2
+    
+    # A failed refresh (the client returns []) keeps the last good snapshot
+    team.clear()
+    directory.refresh()
+    assert directory.get_name('TM3') == 'Jenny L'
+    print("[PASS] Test: Team directory PASSED")
+
+
+def test_bulk_customer_names():
+    """A day's customers are fetched in one bulk call; misses and 403s are not retried"""
+    print("\n=== Test: Bulk customer names ===")
+    
+    class Customer:
+        def __init__(self, given_name):
+            self.given_name = given_name
+            self.family_name = 'Test'
+    
+    class PermissionDenied(Exception):
+        status_code = 403
+    
+    class FakeClient:
+        customers_api = object()
+        
+        def __init__(self):
+            self.bulk_calls = []
+            self.single_calls = []
+            self.denied = False
+        
+        def bulk_get_customers(self, customer_ids):
+            self.bulk_calls.append(list(customer_ids))
+            if self.denied:
+                raise PermissionDenied('CUSTOMERS_READ missing')
+            return {cid: Customer(cid.upper()) for cid in customer_ids if cid != 'gone'}
+        
+        def get_customer(self, customer_id):
+            self.single_calls.append(customer_id)
+            return None
+    
+    service = SquareService()
+    client = FakeClient()
+    service.client = client
+    
+    bookings = [Booking(customer_id=cid) for cid in ['c1', 'c2', 'c1', 'gone', 'c3']]
+    assert service.resolve_customer_names(bookings) == 3
+    assert client.bulk_calls == [['c1', 'c2', 'gone', 'c3']]
+    assert service.get_customer_name(Booking(customer_id='c2')) == 'C2 Test'
+    
+    # The missing customer is not looked up again, in bulk or one by one
+    assert service.get_customer_name(Booking(customer_id='gone')) == 'Customer gone'
+    service.resolve_customer_names(bookings)
+    assert len(client.bulk_calls) == 1
+    assert client.single_calls == []
+    
+    # A permission error stops all customer lookups for a while
+    client.denied = True
+    assert service.resolve_customer_names([Booking(customer_id='c4'), Booking(customer_id='c5')]) == 0
+    assert service.resolve_customer_names([Booking(customer_id='c6')]) == 0
+    assert service.get_customer_name(Booking(customer_id='c6', customer_note='Walk-in')) == 'Walk-in'
+    assert len(client.bulk_calls) == 2
+    assert client.single_calls == []
+    print("[PASS] Test: Bulk customer names PASSED")
+
+
+def test_catalog_index():
+    """Service variations come from one catalog search and are patched incrementally"""
+    print("\n=== Test: Catalog index ===")
+    
+    def item(item_id, name, variations, **extra):
+        data = {
+            'id': item_id,
+            'present_at_all_locations': True,
+            'item_data': {
+                'name': name,
+                'variations': [
+                    {'id': vid, 'present_at_all_locations': True, 'item_variation_data': {'name': vname}}
+                    for vid, vname in variations
+                ]
+            }
+        }
+        data.update(extra)
+        return CatalogObject.from_square(data)
+    
+    catalog = [
+        item('I1', 'Swedish Massage', [('V1', '60 min'), ('V2', '90 min')]),
+        item('I2', 'Couples Massage', [('V3', '60 min')]),
+        item('I3', 'Other Location Facial', [('V4', '')],
+             present_at_all_locations=False, present_at_location_ids=['ELSEWHERE']),
+    ]
+    calls = []
+    
+    def loader(begin_time):
+        calls.append(begin_time)
+        if begin_time is None:
+            return list(catalog), 'T1'
+        # Changed since T1: I1 renamed and lost V2, I2 deleted, I5 added
+        return [
+            item('I1', 'Swedish Massage', [('V1', 'Swedish 60')]),
+            CatalogObject.from_square({'id': 'I2', 'is_deleted': True}),
+            item('I5', 'Hot Stone', [('V5', '')]),
+        ], 'T2'
+    
+    index = CatalogIndex(loader, location_id='LOC', couple_pattern='Couple', ttl_seconds=3600)
+    assert index.get('V1').name == '60 min'
+    assert index.get('V1').item_name == 'Swedish Massage'
+    assert index.get('V3').is_couple
+    assert not index.get('V1').is_couple
+    assert index.get('V4') is None, "Items not sold at the location are not indexed"
+    assert calls == [None], f"Expected one full load, got {calls}"
+    
+    index.refresh()
+    assert calls == [None, 'T1']
+    assert index.get('V1').name == 'Swedish 60'
+    assert index.get('V2') is None
+    assert index.get('V3') is None
+    assert index.get('V5').name == 'Hot Stone'
+    assert len(index) == 2
+    
+    # A failed refresh keeps the current index
+    def failing_loader(begin_time):
+        raise RuntimeError('catalog unavailable')
+    index._loader = failing_loader
+    index.refresh()
+    assert index.get('V5').name == 'Hot Stone'
+    print("[PASS] Test: Catalog index PASSED")
+
+
+def test_ttl_cache():
+    """Entries expire, the least recently used entry is evicted, and lookups are counted"""
+    print("\n=== Test: TTL cache ===")
+    
+    cache = TTLCache('test.ttl_cache', max_size=2, ttl_seconds=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1          # 'a' is now the most recently used
+    cache.set('c', 3)                   # evicts 'b'
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    
+    cache.set('d', 4, ttl_seconds=0)    # expires immediately
+    assert cache.get('d') is None
+    
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 2), stats
+    assert stats['evictions'] == 2, stats    # 'b', then 'a' when 'd' was added
+    assert stats['expirations'] == 1, stats
+    assert stats['size'] == 1
+    assert any(entry['name'] == 'test.ttl_cache' for entry in cache_stats())
+    print("[PASS] Test: TTL cache PASSED")
+
+
+def test_lookup_store_warm_start():
+    """Cached names and the team directory survive a restart, with their TTLs"""
+    print("\n=== Test: Lookup store warm start ===")
+    session_factory = sessionmaker(bind=create_test_db().get_bind())
+    
+    # First run: resolve some names, write them behind
+    store = LookupStore(session_factory, flush_interval=3600)
+    names = TTLCache('test.warm_names', ttl_seconds=600)
+    store.attach(names)
+    names.set('C1', 'Brian K')
+    names.set('C2', 'Expired', ttl_seconds=0)
+    directory = TeamDirectory(lambda: [{'id': 'TM1', 'given_name': 'Katy', 'family_name': 'M'}])
+    store.attach_snapshot('test.team', directory)
+    assert directory.get_name('TM1') == 'Katy M'
+    assert store.flush() == 3
+    assert store.flush() == 0, "Nothing pending after a flush"
+    
+    # Second run: everything comes from the table, no loader calls
+    store = LookupStore(session_factory, flush_interval=3600)
+    names = TTLCache('test.warm_names', ttl_seconds=600)
+    assert store.attach(names) == 1
+    assert names.get('C1') == 'Brian K'
+    assert names.get('C2') is None, "Expired entries are not restored"
+    
+    def offline_loader():
+        raise AssertionError("Team directory should come from the snapshot")
+    directory = TeamDirectory(offline_loader, ttl_seconds=3600)
+    assert store.attach_snapshot('test.team', directory)
+    assert directory.get_name('TM1') == 'Katy M'
+    assert directory.find_id('katy m') == 'TM1'
+    print("[PASS] Test: Lookup store warm start PASSED")
+
+
+def test_async_square_fetch_is_concurrent():
+    """Async fetch runs the bookings, team and catalog calls at once, off the event loop"""
+    print("\n=== Test: Async Square fetch ===")
+    
+    class SlowClient:
+        customers_api = None
+        
+        def iter_booking_pages(self, start_at_min, start_at_max):
+            time.sleep(0.2)
+            yield [Booking(
+                id='B1',
+                start_at='2026-01-06T12:00:00',
+                customer_note='Brian',
+                segments=(Segment(team_member_id='TM1', service_variation_name='Swedish Massage'),)
+            )]
+        
+        def is_couples_massage(self, booking):
+            return False
+    
+    def slow_team():
+        time.sleep(0.2)
+        return [{'id': 'TM1', 'given_name': 'Katy', 'family_name': 'M'}]
+    
+    def slow_catalog(begin_time):
+        time.sleep(0.2)
+        return [], None
+    
+    service = SquareService()
+    service.client = SlowClient()
+    service.team_directory = TeamDirectory(slow_team)
+    service.catalog_index = CatalogIndex(slow_catalog)
+    
+    async def fetch_while_ticking():
+        ticks = 0
+        task = asyncio.ensure_future(service.get_bookings_for_range_async('2026-01-06', '2026-01-06'))
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return await task, ticks
+    
+    started = time.perf_counter()
+    bookings_by_date, ticks = asyncio.run(fetch_while_ticking())
+    elapsed = time.perf_counter() - started
+    
+    bookings = [b for day in bookings_by_date.values() for b in day]
+    assert [b['therapist'] for b in bookings] == ['Katy M'], bookings
+    assert elapsed < 0.5, f"Square calls ran one after another ({elapsed:.2f}s)"
+    assert ticks >= 10, f"Event loop was blocked (only {ticks} ticks)"
+    print("[PASS] Test: Async Square fetch PASSED")
+
+
+def test_booking_snapshots():
+    """Dashboards on one date share fetches; stale copies are served while one refresh runs"""
+    print("\n=== Test: Booking snapshots ===")
+    fetches = []
+    failing = [False]
+    
+    async def fetch(date):
+        fetches.append(date)
+        await asyncio.sleep(0.02)
+        if failing[0]:
+            raise RuntimeError('Square unavailable')
+        return [{'id': f'B{len(fetches)}', 'date': date}]
+    
+    async def scenario():
+        snapshots = BookingSnapshots(fetch, fresh_seconds=0.05, max_stale_seconds=60)
+        
+        # Ten dashboards opening the same cold date: one fetch
+        results = await asyncio.gather(*[snapshots.get('2026-01-06') for _ in range(10)])
+        assert len(fetches) == 1 and all(r == results[0] for r in results)
+        
+        # Fresh: served without fetching
+        assert (await snapshots.get('2026-01-06'))[0]['id'] == 'B1'
+        assert len(fetches) == 1
+        
+        # Stale: the old copy is served at once, one background refresh replaces it
+        await asyncio.sleep(0.06)
+        stale = await asyncio.gather(*[snapshots.get('2026-01-06') for _ in range(5)])
+        assert all(r[0]['id'] == 'B1' for r in stale)
+        await asyncio.sleep(0.05)
+        assert len(fetches) == 2
+        assert (await snapshots.get('2026-01-06'))[0]['id'] == 'B2'
+        
+        # A local write invalidates the date: the next get fetches again
+        snapshots.invalidate('2026-01-06')
+        assert (await snapshots.get('2026-01-06'))[0]['id'] == 'B3'
+        
+        # A failed background refresh keeps serving the stale copy
+        await asyncio.sleep(0.06)
+        failing[0] = True
+        assert (await snapshots.get('2026-01-06'))[0]['id'] == 'B3'
+        await asyncio.sleep(0.05)
+        assert (await snapshots.get('2026-01-06'))[0]['id'] == 'B3'
+        assert snapshots.stats()['fetch_errors'] == 1
+        
+        # A failed cold fetch is raised, not served as a day without bookings
+        try:
+            await snapshots.get('2026-01-07')
+            assert False, "Failed fetch was served as []"
+        except RuntimeError:
+            pass
+        assert snapshots.stats()['dates'] == 1
+    
+    asyncio.run(scenario())
+    print("[PASS] Test: Booking snapshots PASSED")
+
+
+def test_square_models():
+    """Square responses (dicts or SDK objects) normalize into the same slotted records"""
+    print("\n=== Test: Square models ===")
+    
+    class SdkObject:
+        def __init__(self, **fields):
+            self.__dict__.update(fields)
+    
+    raw_dict = {
+        'id': 'B1',
+        'status': 'CANCELLED_BY_SELLER',
+        'start_at': '2026-01-06T12:00:00Z',
+        'customer_id': None,
+        'version': 3,
+        'appointment_segments': [
+            {'team_member_id': 'TM1', 'duration_minutes': 60, 'service_variation_id': 'V1'},
+            {'team_member_id': 'TM1', 'duration_minutes': 30, 'service_variation_name': 'Hot Stones'}
+        ]
+    }
+    raw_sdk = SdkObject(
+        id='B1', status='CANCELLED_BY_SELLER', start_at='2026-01-06T12:00:00Z', customer_id=None,
+        customer_note=None, version=3,
+        appointment_segments=[
+            SdkObject(team_member_id='TM1', duration_minutes=60, service_variation_id='V1', service_variation_name=None),
+            SdkObject(team_member_id='TM1', duration_minutes=30, service_variation_name='Hot Stones')
+        ]
+    )
+    
+    for raw in (raw_dict, raw_sdk):
+        booking = Booking.from_square(raw)
+        assert (booking.id, booking.customer_id, booking.customer_note, booking.version) == ('B1', '', '', 3)
+        assert booking.is_cancelled
+        assert booking.duration_minutes == 90
+        assert [s.service_variation_name for s in booking.segments] == ['', 'Hot Stones']
+        assert Booking.from_square(booking) is booking
+        assert not hasattr(booking, '__dict__')
+    
+    assert TeamMember.from_square({'id': 'TM1', 'given_name': 'Katy', 'family_name': 'M'}).name == 'Katy M'
+    assert TeamMember.from_square(SdkObject(id='TM2', display_name='May')).name == 'May'
+    assert TeamMember.from_square({'id': 'TM3'}).name == 'TM3'
+    print("[PASS] Test: Square models PASSED")
+
+
+def test_location_day_range():
+    """Range fetches use the location's timezone for days and stay within Square's 31-day window"""
+    print("\n=== Test: Location day range ===")
+    from config import Config
+    from square.core.pagination import SyncPager
+    from square_client import SquareBookingsClient
+    
+    saved_timezone = Config.LOCATION_TIMEZONE
+    Config.LOCATION_TIMEZONE = 'America/Los_Angeles'
+    try:
+        bookings_by_date, start_at_min, start_at_max = SquareService._range_window('2026-03-07', '2026-03-08')
+        assert list(bookings_by_date) == ['2026-03-07', '2026-03-08']
+        # Midnight Pacific, across the switch to daylight saving time
+        assert (start_at_min, start_at_max) == ('2026-03-07T08:00:00Z', '2026-03-09T07:00:00Z')
+        
+        # 7pm Pacific on the 7th is already the 8th in UTC
+        converted = [{'id': 'late', 'start_at': '2026-03-08T03:00:00+00:00'},
+                     {'id': 'early', 'start_at': '2026-03-07T17:00:00+00:00'}]
+        SquareService._split_by_day(converted, bookings_by_date)
+        assert [b['id'] for b in bookings_by_date['2026-03-07']] == ['early', 'late']
+        assert bookings_by_date['2026-03-08'] == []
+    finally:
+        Config.LOCATION_TIMEZONE = saved_timezone
+    
+    class BookingsApi:
+        def list(self, location_id, start_at_min, start_at_max, request_options=None):
+            windows.append((start_at_min, start_at_max))
+            # The same booking on the boundary of both windows
+            return SyncPager(get_next=None, has_next=False, items=[{'id': 'B1'}], response=None)
+    
+    client = SquareBookingsClient.__new__(SquareBookingsClient)
+    client.bookings_api = BookingsApi()
+    windows = []
+    bookings = client.list_booking_models('2026-01-01T00:00:00Z', '2026-02-10T00:00:00Z')
+    assert windows == [
+        ('2026-01-01T00:00:00+00:00', '2026-02-01T00:00:00+00:00'),
+        ('2026-02-01T00:00:00+00:00', '2026-02-10T00:00:00+00:00')
+    ], windows
+    assert [b.id for b in bookings] == ['B1']
+    
+    windows.clear()
+    client.list_booking_models('2026-01-01T00:00:00Z', '2026-01-31T00:00:00Z')
+    assert windows == [('2026-01-01T00:00:00Z', '2026-01-31T00:00:00Z')]
+    print("[PASS] Test: Location day range PASSED")
+
+
+def test_streaming_booking_pages():
+    """Bookings stream page by page, conversion overlaps fetching, and page errors surface"""
+    print("\n=== Test: Streaming booking pages ===")
+    from square.core.pagination import SyncPager
+    from request_scheduler import SquareRequestError
+    from square_client import SquareBookingsClient
+    
+    class PageFailed(Exception):
+        pass
+    
+    fetched = []
+    
+    def pager(number, last=3, fail_at=None):
+        if number == fail_at:
+            raise PageFailed(f"page {number}")
+        fetched.append(number)
+        items = [{
+            'id': f'B{number}',
+            'start_at': f'2026-01-06T1{number}:00:00',
+            'appointment_segments': [{'team_member_id': 'TM1', 'service_variation_name': 'Swedish Massage'}]
+        }]
+        return SyncPager(
+            get_next=lambda: pager(number + 1, last, fail_at),
+            has_next=number < last,
+            items=items,
+            response=None
+        )
+    
+    class BookingsApi:
+        fail_at = None
+        
+        def list(self, **query_params):
+            time.sleep(0.1)
+            return pager(1, fail_at=self.fail_at)
+    
+    client = SquareBookingsClient.__new__(SquareBookingsClient)
+    client.bookings_api = BookingsApi()
+    client.customers_api = None
+    
+    # Pages are requested only as they are consumed
+    pages = client.iter_booking_pages('2026-01-06T00:00:00Z', '2026-01-07T00:00:00Z')
+    assert [b.id for b in next(pages)] == ['B1']
+    assert fetched == [1]
+    assert [[b.id for b in page] for page in pages] == [['B2'], ['B3']]
+    
+    # A failing page is raised, not turned into a short list
+    client.bookings_api.fail_at = 2
+    try:
+        client.list_booking_models('2026-01-06T00:00:00Z', '2026-01-07T00:00:00Z')
+        assert False, "Pagination error was hidden"
+    except SquareRequestError as e:
+        assert isinstance(e.__cause__, PageFailed)
+    
+    service = SquareService()
+    service.client = client
+    service.team_directory = TeamDirectory(lambda: [{'id': 'TM1', 'given_name': 'Katy'}])
+    service.catalog_index = CatalogIndex(lambda begin_time: ([], None))
+    try:
+        asyncio.run(service.get_bookings_for_range_async('2026-01-06', '2026-01-06', raise_errors=True))
+        assert False, "Pagination error was hidden"
+    except SquareRequestError:
+        pass
+    
+    client.bookings_api.fail_at = None
+    bookings = asyncio.run(service.get_bookings_for_range_async('2026-01-06', '2026-01-06'))['2026-01-06']
+    assert [b['id'] for b in bookings] == ['B1', 'B2', 'B3']
+    assert service.get_bookings_for_range('2026-01-06', '2026-01-06')['2026-01-06'] == bookings
+    print("[PASS] Test: Streaming booking pages PASSED")
+
+
+def test_availability_index():
+    """Second-therapist search answers from one location-wide scan, per segment"""
+    print("\n=== Test: Availability index ===")
+    from square.core.pagination import SyncPager
+    from availability_index import AvailabilityIndex
+    from square_client import SquareBookingsClient
+    
+    scans = []
+    
+    class BookingsApi:
+        def list(self, **query_params):
+            scans.append(query_params)
+            items = [
+                # 10:00-11:00 with TM1, then 11:00-11:30 handed over to TM2
+                {'id': 'B1', 'start_at': '2026-01-06T10:00:00Z', 'appointment_segments': [
+                    {'team_member_id': 'TM1', 'duration_minutes': 60},
+                    {'team_member_id': 'TM2', 'duration_minutes': 30}
+                ]},
+                {'id': 'B2', 'start_at': '2026-01-06T09:00:00Z', 'status': 'CANCELLED_BY_CUSTOMER',
+                 'appointment_segments': [{'team_member_id': 'TM3', 'duration_minutes': 180}]}
+            ]
+            return SyncPager(get_next=None, has_next=False, items=items, response=None)
+    
+    client = SquareBookingsClient.__new__(SquareBookingsClient)
+    client.bookings_api = BookingsApi()
+    members = [TeamMember(id=member_id) for member_id in ('TM0', 'TM1', 'TM2', 'TM3')]
+    
+    # TM1 is busy in the first segment, TM2 only in the second, TM3's booking was cancelled
+    found = client.get_available_team_member('2026-01-06T10:30:00Z', 60, 'TM0', team_members=members)
+    assert found.id == 'TM3'
+    assert len(scans) == 1
+    assert scans[0]['start_at_min'] == '2026-01-05T22:30:00+00:00'
+    
+    window_start = parser.parse('2026-01-06T08:00:00Z')
+    availability = client.build_availability_index(window_start, window_start + timedelta(hours=12))
+    assert availability.is_free('TM2', parser.parse('2026-01-06T10:00:00Z'), parser.parse('2026-01-06T11:00:00Z'))
+    assert not availability.is_free('TM2', parser.parse('2026-01-06T10:00:00Z'), parser.parse('2026-01-06T11:01:00Z'))
+    
+    # A shared index answers later lookups without scanning again, including blocks made since
+    scans.clear()
+    found = client.get_available_team_member(
+        '2026-01-06T10:30:00Z', 60, 'TM0', team_members=members, availability=availability
+    )
+    assert found.id == 'TM3'
+    availability.mark_busy('TM3', parser.parse('2026-01-06T10:30:00Z'), parser.parse('2026-01-06T11:30:00Z'))
+    assert client.get_available_team_member(
+        '2026-01-06T10:30:00Z', 60, 'TM0', team_members=members, availability=availability
+    ) is None
+    assert scans == []
+    
+    # Outside the indexed window a fresh scan is made
+    client.get_available_team_member('2026-01-07T10:30:00Z', 60, 'TM0', team_members=members, availability=availability)
+    assert len(scans) == 1
+    
+    # A failed scan is raised, not reported as "nobody free"
+    from request_scheduler import SquareRequestError
+    
+    def forbidden(**query_params):
+        error = Exception("forbidden")
+        error.status_code = 403
+        raise error
+    
+    client.bookings_api.list = forbidden
+    try:
+        client.get_available_team_member('2026-01-08T10:30:00Z', 60, 'TM0', team_members=members)
+        assert False, "Failed scan was reported as no free therapist"
+    except SquareRequestError as e:
+        assert e.status_code == 403
+    print("[PASS] Test: Availability index PASSED")
+
+
+def test_shared_square_http_client():
+    """Every Square client in the process shares one SDK client and keep-alive pool"""
+    print("\n=== Test: Shared Square HTTP client ===")
+    from config import Config
+    from square_client import SquareBookingsClient, get_http_client, get_square_sdk
+    
+    first = SquareBookingsClient()
+    second = SquareBookingsClient()
+    assert first.client is second.client
+    assert first.client._client_wrapper.httpx_client.httpx_client is get_http_client()
+    
+    # Another token gets its own SDK client, but the same connections
+    other = get_square_sdk(token='other-token', environment='sandbox')
+    assert other is not first.client
+    assert other._client_wrapper.httpx_client.httpx_client is get_http_client()
+    assert get_http_client().timeout.connect == Config.SQUARE_HTTP_CONNECT_TIMEOUT_SECONDS
+    print("[PASS] Test: Shared Square HTTP client PASSED")
+
+
+def test_request_scheduler():
+    """Square calls are retried on 429/5xx (honouring Retry-After) and failures are typed"""
+    print("\n=== Test: Request scheduler ===")
+    from request_scheduler import RequestScheduler, SquareRequestError, SquareThrottledError
+    
+    class ApiError(Exception):
+        def __init__(self, status_code, headers=None):
+            super().__init__(f"status {status_code}")
+            self.status_code = status_code
+            self.headers = headers or {}
+    
+    scheduler = RequestScheduler(rates={'bookings': (1000, 1000)}, max_retries=2, base_delay=0.01)
+    attempts = []
+    
+    def flaky(responses):
+        def call():
+            attempts.append(time.perf_counter())
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return call
+    
+    # Throttled once (with Retry-After), then a 503, then success
+    result = scheduler.call('bookings', flaky([ApiError(429, {'Retry-After': '0.1'}), ApiError(503), 'ok']))
+    assert result == 'ok'
+    assert attempts[1] - attempts[0] >= 0.1, "Retry-After was not honoured"
+    counters = scheduler.stats()['families']['bookings']
+    assert (counters['requests'], counters['retries'], counters['throttles'], counters['failures']) == (1, 2, 1, 0)
+    
+    # Still throttled after all retries: a typed error, not an empty result
+    try:
+        scheduler.call('bookings', flaky([ApiError(429)] * 3))
+        assert False, "Throttling was hidden"
+    except SquareThrottledError as e:
+        assert e.status_code == 429 and e.family == 'bookings'
+    
+    # Client errors are not retried
+    attempts.clear()
+    try:
+        scheduler.call('customers', flaky([ApiError(403)]))
+        assert False, "Permission error was hidden"
+    except SquareRequestError as e:
+        assert not isinstance(e, SquareThrottledError) and e.status_code == 403
+    assert len(attempts) == 1
+    assert scheduler.stats()['families']['customers']['failures'] == 1
+    print("[PASS] Test: Request scheduler PASSED")
+
+
+def test_single_flight_reads():
+    """Identical Square reads in flight at the same time make one request and share its result"""
+    print("\n=== Test: Single-flight reads ===")
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from request_scheduler import SquareRequestError
+    from square_client import SquareBookingsClient
+    
+    requests = []
+    release = threading.Event()
+    
+    class CustomersApi:
+        def get(self, customer_id, request_options=None):
+            requests.append(customer_id)
+            release.wait(1)
+            if customer_id == 'C403':
+                error = Exception("forbidden")
+                error.status_code = 403
+                raise error
+            return {'customer': customer_id}
+    
+    client = SquareBookingsClient.__new__(SquareBookingsClient)
+    client.customers_api = CustomersApi()
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(client._read, 'customers', client.customers_api.get, customer_id=customer_id)
+                   for customer_id in ['C1'] * 5 + ['C2'] * 2]
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in futures]
+    assert sorted(requests) == ['C1', 'C2'], requests
+    assert results == [{'customer': 'C1'}] * 5 + [{'customer': 'C2'}] * 2
+    
+    # Nothing is cached: a later identical read makes a new request
+    client._read('customers', client.customers_api.get, customer_id='C1')
+    assert requests.count('C1') == 2
+    
+    # A failure reaches every caller that shared the request
+    release.clear()
+    requests.clear()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(client.get_customer, 'C403') for _ in range(3)]
+        time.sleep(0.1)
+        release.set()
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except SquareRequestError as e:
+                errors.append(e.status_code)
+    assert requests == ['C403'] and errors == [403] * 3
+    print("[PASS] Test: Single-flight reads PASSED")
+
+
+def test_fake_square_server():
+    """The real client pages through the fake Square API, and the fake injects errors"""
+    print("\n=== Test: Fake Square server ===")
+    from fastapi.testclient import TestClient
+    from square.client import Square
+    from config import Config
+    from fake_square_server import FakeSquareData, FaultSettings, create_app
+    from square_client import SquareBookingsClient
+    
+    data = FakeSquareData(location_id=Config.SQUARE_LOCATION_ID, start_date='2026-01-05', days=3,
+                          bookings_per_day=20, team_members=4, customers=30, seed=7)
+    app = create_app(data, page_size=6)
+    sdk = Square(token='fake', base_url='http://testserver', httpx_client=TestClient(app))
+    client = SquareBookingsClient.__new__(SquareBookingsClient)
+    client.client = sdk
+    client.bookings_api = sdk.bookings
+    client.team_members_api = sdk.team_members
+    client.customers_api = sdk.customers
+    
+    # A day's bookings arrive over several pages, parsed by the SDK
+    bookings = client.list_booking_models('2026-01-06T00:00:00Z', '2026-01-07T00:00:00Z')
+    assert sorted(b.id for b in bookings) == sorted(b for b in data.bookings if b.startswith('BFAKE20260106'))
+    assert app.state.request_counts['bookings.list'] == 4
+    assert all(b.segments and b.segments[0].team_member_id.startswith('TMFAKE') for b in bookings)
+    
+    assert len(client.get_team_member_models()) == 4
+    customer_ids = [b.customer_id for b in bookings[:3]]
+    assert client.get_customer(customer_ids[0]).id == customer_ids[0]
+    assert client.get_customer('CMISSING') is None
+    assert set(client.bulk_get_customers(customer_ids + ['CMISSING'])) == set(customer_ids)
+    items, _ = client.search_catalog_items()
+    assert len(items) == len(data.catalog_items)
+    variation, related = client.get_catalog_object_model(
+        bookings[0].segments[0].service_variation_id, include_related_objects=True
+    )
+    assert variation.type == 'ITEM_VARIATION' and related[0].id == variation.item_id and related[0].name
+    service = SquareService()
+    service.client = client
+    service.catalog_index = CatalogIndex(lambda begin_time: ([], None))
+    assert service._get_service_name_from_catalog(variation.id) == variation.name
+    assert all(item.variations for item in items)
+    
+    created = client.create_blocked_time('TMFAKE0001', '2026-01-06T10:00:00Z', 60)
+    assert client.get_booking_model(created.id).start_at.startswith('2026-01-06T10:00:00')
+    assert client.cancel_booking(created.id, created.version).status == 'CANCELLED_BY_SELLER'
+    
+    # Injected errors come back as Square error responses
+    faulty = TestClient(create_app(data, faults={'customers.get': FaultSettings(rate_429=1.0)},
+                                   retry_after_seconds=2))
+    response = faulty.get(f"/v2/customers/{customer_ids[0]}")
+    assert response.status_code == 429 and response.headers['retry-after'] == '2'
+    assert response.json()['errors'][0]['code'] == 'RATE_LIMITED'
+    assert faulty.post('/v2/customers/bulk-retrieve', json={'customer_ids': customer_ids}).status_code == 200
+    print("[PASS] Test: Fake Square server PASSED")
+
+
+def outage_app(make_error):
+    """
+    app.main wired to a Square client whose booking pages fail with make_error().
+    
+    Returns (TestClient, restore); call restore() to put the real service back.
+    """
+    from fastapi.testclient import TestClient
+    import app.database as database
+    
+    # app.main creates its tables and lookup store on import; keep them out of the repo's database file
+    engine = create_engine('sqlite:///:memory:', connect_args={'check_same_thread': False})
+    repo_database = database.engine, database.SessionLocal
+    database.engine, database.SessionLocal = engine, sessionmaker(bind=engine)
+    try:
+        import app.main as main
+    finally:
+        database.engine, database.SessionLocal = repo_database
+    
+    class FailingClient:
+        customers_api = None
+        
+        def iter_booking_pages(self, start_at_min, start_at_max):
+            raise make_error()
+            yield
+    
+    service = SquareService()
+    service.client = FailingClient()
+    service.team_directory = TeamDirectory(lambda: [])
+    service.catalog_index = CatalogIndex(lambda begin_time: ([], None))
+    
+    db = create_test_db()
+    
+    saved = (main.get_square_service, main.booking_snapshots)
+    main.get_square_service = lambda: service
+    main.booking_snapshots = BookingSnapshots(main.fetch_square_bookings)
+    main.app.dependency_overrides[main.get_db] = lambda: db
+    
+    def restore():
+        main.get_square_service, main.booking_snapshots = saved
+        main.app.dependency_overrides.clear()
+    
+    return TestClient(main.app), restore
+
+
+def test_range_outage_is_503():
+    """A failed Square range fetch is a 503, and no empty days are stored as snapshots"""
+    print("\n=== Test: Range outage is 503 ===")
+    from request_scheduler import SquareUnavailableError
+    
+    client, restore = outage_app(lambda: SquareUnavailableError('Square down', 'bookings', 503))
+    import app.main as main
+    try:
+        response = client.get('/api/range?start=2026-01-06&end=2026-01-08')
+        assert response.status_code == 503, response.text
+        assert main.booking_snapshots.stats()['dates'] == 0
+        # The next single-day request fetches again instead of serving an empty day
+        assert client.get('/api/day?date=2026-01-06').status_code == 503
+        assert main.booking_snapshots.stats()['misses'] == 1
+    finally:
+        restore()
+    print("[PASS] Test: Range outage is 503 PASSED")
+
+
+def test_day_outage_is_503():
+    """When Square keeps failing after all retries, /api/day is a 503 rather than an empty schedule"""
+    print("\n=== Test: Day outage is 503 ===")
+    from request_scheduler import RequestScheduler, SquareUnavailableError
+    
+    class ApiError(Exception):
+        status_code = 503
+    
+    def unavailable():
+        def list_page():
+            raise ApiError("Service Unavailable")
+        scheduler = RequestScheduler(rates={}, max_retries=2, base_delay=0.001)
+        try:
+            scheduler.call('bookings', list_page)
+        except SquareUnavailableError as e:
+            assert scheduler.stats()['families']['bookings']['retries'] == 2
+            return e
+    
+    client, restore = outage_app(unavailable)
+    import app.main as main
+    try:
+        response = client.get('/api/day?date=2026-01-06')
+        assert response.status_code == 503, response.text
+        assert main.booking_snapshots.stats()['dates'] == 0
+        
+        # The sync fetch raises too when asked, and keeps returning empty days for the scripts
+        service = main.get_square_service()
+        try:
+            service.get_bookings_for_range('2026-01-06', '2026-01-07', raise_errors=True)
+            assert False, "Failed pages were returned as empty days"
+        except SquareUnavailableError:
+            pass
+        assert service.get_bookings_for_date('2026-01-06') == []
+    finally:
+        restore()
+    print("[PASS] Test: Day outage is 503 PASSED")
+
+
+def test_recalculate_day_rewrites_cached_day():
+    """A full recalculation writes the auto rows back even when the day's result is cached"""
+    print("\n=== Test: Recalculate day rewrites cached day ===")
+    RoomAssigner.clear_cache()
+    date = "2026-01-06"
+    base_time = datetime(2026, 1, 6, 10, 0, 0)
+    bookings = [
+        {
+            'id': f'r{i}',
+            'therapist': 'Katy M',
+            'start_at': base_time.isoformat(),
+            'end_at': (base_time + timedelta(hours=1)).isoformat(),
+            'customer': f'Customer{i}',
+            'service': 'Swedish Massage',
+            'type': 'single',
+            'version': 1
+        }
+        for i in range(3)
+    ]
+    
+    async def fetch(day):
+        return [dict(booking) for booking in bookings]
+    
+    client, restore = outage_app(lambda: AssertionError('Square should not be called'))
+    import app.main as main
+    try:
+        main.booking_snapshots = BookingSnapshots(fetch)
+        db = main.app.dependency_overrides[main.get_db]()
+        RoomAssigner(db, engine=main.assignment_engine).assign_rooms(main.to_assignment_bookings(bookings), date)
+        assert db.query(RoomAssignment).filter(RoomAssignment.assigned_by == 'auto').count() == 3
+        
+        assigned = asyncio.run(main.recalculate_day(db, date))
+        rows = {row.booking_id: row.room for row in db.query(RoomAssignment).all()}
+        print(f"Rows after recalculation: {rows}")
+        assert rows == {b['booking_id']: b['room'] for b in assigned}, f"Auto rows missing: {rows}"
+    finally:
+        restore()
+    print("[PASS] Test: Recalculate day rewrites cached day PASSED")
+
+
 if __name__ == "__main__":
     try:
         test_case_1()
         test_case_2()
         test_case_3()
         test_02d_blocks_both_rooms()
+        test_manager_override_only_blocks_its_own_time()
+        test_room_schedule_intervals()
+        test_booking_record_parsing()
+        test_find_room_conflicts()
+        test_overlapping_manager_assignments_keep_first()
+        test_assignment_query_count_is_constant()
+        test_unchanged_day_skips_recompute_and_writes()
+        test_incremental_override_repair()
+        test_optimal_engine_beats_greedy()
+        test_assign_range_matches_single_days()
+        test_decision_trace()
+        test_team_directory()
+        test_bulk_customer_names()
+        test_catalog_index()
+        test_ttl_cache()
+        test_lookup_store_warm_start()
+        test_async_square_fetch_is_concurrent()
+        test_booking_snapshots()
+        test_square_models()
+        test_location_day_range()
+        test_streaming_booking_pages()
+        test_availability_index()
+        test_shared_square_http_client()
+        test_request_scheduler()
+        test_single_flight_reads()
+        test_fake_square_server()
+        test_range_outage_is_503()
+        test_day_outage_is_503()
+        test_recalculate_day_rewrites_cached_day()
         print("\n[SUCCESS] All tests PASSED!")
     except AssertionError as e:
         print(f"\n[FAILED] Test FAILED: {e}")
@@ -0,0 +1,137 @@
+"""Bounded in-memory cache with per-entry TTL, LRU eviction and hit/miss counters."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+# Every cache created in this process, by name, for the stats endpoints
+_registry: Dict[str, 'TTLCache'] = {}
+_registry_lock = threading.Lock()
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache with a maximum size and per-entry expiry.
+
+    Entries expire ``ttl_seconds`` after they were set (or after the ttl passed
+    to ``set``). When the cache is full, the least recently used entry is
+    evicted. ``get`` counts hits and misses; ``in`` checks do not, so a
+    membership test followed by ``get`` is only counted once.
+
+    Caches register themselves by name; a new cache with the same name (for
+    example after a service is re-initialized) replaces the old one in
+    ``cache_stats()``.
+
+    If ``listener`` is set, it is called as ``listener(cache, key, value,
+    ttl_seconds)`` after every ``set`` (used to persist entries).
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl_seconds: Optional[float] = 300):
+        """
+        Create a cache.
+
+        Args:
+            name: Name shown in cache_stats()
+            max_size: Maximum number of entries before LRU eviction
+            ttl_seconds: Default entry lifetime (None keeps entries until evicted)
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.listener: Optional[Callable[['TTLCache', Hashable, Any, Optional[float]], None]] = None
+        with _registry_lock:
+            _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key, or default if it is missing or expired."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Store value under key, expiring after ttl_seconds (default: the cache's ttl)."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if self.listener is not None:
+            self.listener(self, key, value, ttl)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key and return its value (default if missing or expired)."""
+        with self._lock:
+            value = self._lookup(key)
+            self._entries.pop(key, None)
+            return default if value is _MISSING else value
+
+    def clear(self):
+        """Remove all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._lookup(key) is not _MISSING
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, limits and counters as a JSON-friendly dict."""
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Return the live value for key or _MISSING, dropping it if expired (caller holds _lock)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return _MISSING
+        return value
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Return stats() of every cache created in this process, sorted by name."""
+    with _registry_lock:
+        caches = sorted(_registry.values(), key=lambda cache: cache.name)
+    return [cache.stats() for cache in caches]
@@ -5,6 +5,7 @@ import hashlib
 from flask import Flask, request, jsonify
 from config import Config
 from booking_sync import BookingSync
+from ttl_cache import cache_stats
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +106,12 @@ def health_check():
     return jsonify({'status': 'healthy'}), 200
 
 
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Size, hit/miss and eviction counters of the lookup caches."""
+    return jsonify({'caches': cache_stats()}), 200
+
+
 def run_webhook_server():
     """Run the webhook server."""
     logger.info(f"Starting webhook server on port {Config.WEBHOOK_PORT}")